@@ -0,0 +1,32 @@
+"""add products keyset pagination indexes
+
+Revision ID: 5b1e0c7d2a91
+Revises: 8800b47ce720
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e0c7d2a91'
+down_revision: Union[str, None] = '8800b47ce720'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_products_name_id', 'products', ['name', 'id'], unique=False)
+    op.create_index(
+        'ix_products_category_id_name_id', 'products', ['category_id', 'name', 'id'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_products_category_id_name_id', table_name='products')
+    op.drop_index('ix_products_name_id', table_name='products')
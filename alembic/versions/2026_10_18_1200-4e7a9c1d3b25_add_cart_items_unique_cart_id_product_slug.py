@@ -0,0 +1,49 @@
+"""add unique index on cart_items (cart_id, product_slug)
+
+Revision ID: 4e7a9c1d3b25
+Revises: 9d3f6a2b8c14
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4e7a9c1d3b25'
+down_revision: Union[str, None] = '9d3f6a2b8c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Дубли одного товара в корзине сливаются в позицию с наименьшим id
+    op.execute("""
+        WITH merged AS (
+            SELECT min(id) AS keep_id, cart_id, product_slug, sum(quantity) AS quantity
+            FROM cart_items
+            GROUP BY cart_id, product_slug
+            HAVING count(*) > 1
+        ),
+        updated AS (
+            UPDATE cart_items
+            SET quantity = merged.quantity
+            FROM merged
+            WHERE cart_items.id = merged.keep_id
+        )
+        DELETE FROM cart_items
+        USING merged
+        WHERE cart_items.cart_id = merged.cart_id
+          AND cart_items.product_slug = merged.product_slug
+          AND cart_items.id <> merged.keep_id
+    """)
+    op.create_index(
+        'ix_cart_items_cart_id_product_slug', 'cart_items', ['cart_id', 'product_slug'], unique=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_cart_items_cart_id_product_slug', table_name='cart_items')
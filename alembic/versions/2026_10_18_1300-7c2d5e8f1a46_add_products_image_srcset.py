@@ -0,0 +1,28 @@
+"""add products image_srcset
+
+Revision ID: 7c2d5e8f1a46
+Revises: 4e7a9c1d3b25
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d5e8f1a46'
+down_revision: Union[str, None] = '4e7a9c1d3b25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('products', sa.Column('image_srcset', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('products', 'image_srcset')
@@ -0,0 +1,114 @@
+"""
+Сравнение попаданий в кэш: декодирование и повторная валидация результата
+против отдачи готовых байтов (cache(raw=True)).
+
+Поднимает приложение с двумя одинаковыми маршрутами страницы товаров,
+прогревает кэш и замеряет обработку запроса целиком через ASGI.
+БД и Redis не нужны.
+
+    python -m benchmarks.cache_raw_response --items 200 --repeat 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, UTC
+
+from fastapi import FastAPI
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.cache.coder import CompactJsonCoder
+from src.cache.decorator import cache
+from src.cache.key_builder import ParamsKeyBuilder
+from src.products.schemas import ProductOutSchema, ProductPageSchema
+
+
+def make_page(items: int) -> ProductPageSchema:
+    now = datetime.now(UTC)
+    return ProductPageSchema(
+        items=[
+            ProductOutSchema(
+                id=i, name=f"Чай масала {i}", slug=f"masala-tea-{i}",
+                description="Синтетический товар для бенчмарка кэша " * 3,
+                price=199.99, stock=i % 50, rating=4.5, is_active=True,
+                category_id=None, category=None, image_url=None,
+                created_at=now, updated_at=now,
+            )
+            for i in range(items)
+        ],
+        next_cursor="bench",
+    )
+
+
+def make_app(page: ProductPageSchema) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/decoded")
+    @cache(expire=600, namespace="decoded")
+    async def decoded() -> ProductPageSchema:
+        return page
+
+    @app.get("/raw")
+    @cache(expire=600, namespace="raw", raw=True)
+    async def raw() -> ProductPageSchema:
+        return page
+
+    return app
+
+
+async def request(app: FastAPI, path: str, accept_encoding: bytes) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [(b"host", b"bench"), (b"accept-encoding", accept_encoding)],
+    }
+    size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def measure(app: FastAPI, path: str, repeat: int, accept_encoding: bytes) -> tuple[float, int]:
+    size = await request(app, path, accept_encoding)  # прогрев кэша
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await request(app, path, accept_encoding)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, size
+
+
+async def main(items: int, repeat: int) -> None:
+    backend = InMemoryBackend()
+    await backend.clear(namespace="bench")
+    FastAPICache.reset()
+    FastAPICache.init(backend, prefix="bench", key_builder=ParamsKeyBuilder(), coder=CompactJsonCoder)
+    app = make_app(make_page(items))
+
+    print(f"{'path':<24}{'hit, ms':>10}{'bytes':>10}")
+    for path, accept_encoding in (
+        ("/decoded", b"identity"),
+        ("/raw", b"identity"),
+        ("/raw", b"gzip"),
+    ):
+        hit_ms, size = await measure(app, path, repeat, accept_encoding)
+        label = f"{path} ({accept_encoding.decode()})"
+        print(f"{label:<24}{hit_ms:>10.2f}{size:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat))
@@ -0,0 +1,109 @@
+"""
+Синтетический cache stampede: много одновременных запросов к истёкшей записи кэша.
+
+Эндпоинт имитирует запрос ProductDAO задержкой и считает, сколько раз он
+выполнился. Сравнивается декоратор cache с объединением промахов
+(single_flight=True) и без него. БД и Redis не нужны.
+
+Затем проверяется промах, пришедший, пока ещё идёт фоновое обновление
+устаревшей записи (stale_ttl): он должен вычислить значение сам, а не ждать
+результата обновления.
+
+    python -m benchmarks.cache_stampede --concurrency 200 --query-ms 20
+"""
+import argparse
+import asyncio
+import time
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+from src.cache.decorator import cache
+from src.cache.key_builder import ParamsKeyBuilder
+
+
+class QueryCounter:
+    def __init__(self, query_ms: float):
+        self.query_ms = query_ms
+        self.queries = 0
+        self.peak = 0
+        self._active = 0
+
+    async def run(self, slug: str) -> dict:
+        self.queries += 1
+        self._active += 1
+        self.peak = max(self.peak, self._active)
+        try:
+            await asyncio.sleep(self.query_ms / 1000)
+        finally:
+            self._active -= 1
+        return {"slug": slug, "name": slug.title()}
+
+
+async def stampede(single_flight: bool, concurrency: int, keys: int, query_ms: float) -> None:
+    backend = InMemoryBackend()
+    # Хранилище InMemoryBackend общее для всех экземпляров
+    await backend.clear(namespace="bench")
+    FastAPICache.reset()
+    FastAPICache.init(backend, prefix="bench", key_builder=ParamsKeyBuilder())
+    counter = QueryCounter(query_ms)
+
+    @cache(expire=60, namespace="product", single_flight=single_flight)
+    async def get_product(slug: str) -> dict:
+        return await counter.run(slug)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        get_product(slug=f"product-{i % keys}") for i in range(concurrency)
+    ))
+    elapsed = (time.perf_counter() - started) * 1000
+
+    print(
+        f"single_flight={single_flight!s:<5}  запросов к БД: {counter.queries:>5}  "
+        f"одновременно: {counter.peak:>5}  время: {elapsed:.1f} мс"
+    )
+
+
+async def stale_refresh_then_miss() -> None:
+    backend = InMemoryBackend()
+    await backend.clear(namespace="bench")
+    FastAPICache.reset()
+    FastAPICache.init(backend, prefix="bench", key_builder=ParamsKeyBuilder())
+    counter = QueryCounter(query_ms=0)
+
+    @cache(expire=1, namespace="stale", stale_ttl=1)
+    async def get_product(slug: str) -> dict:
+        return await counter.run(slug)
+
+    # InMemoryBackend считает время целыми секундами: запись с начала секунды
+    # устаревает через 2 с и истекает через 3 с
+    await asyncio.sleep(1.1 - time.time() % 1)
+    await get_product(slug="stale")
+    await asyncio.sleep(2.2)
+    # Устаревшая копия отдаётся сразу, обновление идёт в фоне и не успевает
+    # закончиться до полного истечения записи
+    counter.query_ms = 3000
+    await get_product(slug="stale")
+    await asyncio.sleep(1.0)
+    counter.query_ms = 0
+    result = await get_product(slug="stale")
+    if result != {"slug": "stale", "name": "Stale"}:
+        raise SystemExit(f"промах во время фонового обновления вернул {result!r}")
+    print("промах во время фонового обновления: ok")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--keys", type=int, default=2, help="число разных ключей в потоке запросов")
+    parser.add_argument("--query-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{args.concurrency} одновременных промахов по {args.keys} ключам")
+    for single_flight in (False, True):
+        await stampede(single_flight, args.concurrency, args.keys, args.query_ms)
+    await stale_refresh_then_miss()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
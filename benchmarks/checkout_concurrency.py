@@ -0,0 +1,138 @@
+"""
+Параллельные заказы одного «горячего» товара: прежнее списание остатка
+(прочитать, проверить в Python, записать) против условного UPDATE в
+OrderDAO.create_order.
+
+Создаёт пользователя и товар с остатком --stock, запускает --orders попыток
+заказа по одной штуке в --concurrency параллельных сессиях и считает
+перепроданные единицы. После замера тестовые данные удаляются.
+Требует применённых миграций и доступной БД из .env.
+
+    python -m benchmarks.checkout_concurrency --stock 100 --orders 300 --concurrency 15
+"""
+import argparse
+import asyncio
+import time
+from decimal import Decimal
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete
+
+from src.database import async_session
+from src.orders.dao import OrderDAO
+from src.orders.models import Order, OrderItem, OrderEnum
+from src.orders.schemas import OrderCreateSchema, OrderItemSchema
+from src.products.models import Product
+from src.users.models import User
+
+BENCH_EMAIL = "checkout-bench@example.com"
+BENCH_SLUG = "checkout-bench-hot-product"
+
+
+async def legacy_checkout(db, user: User, slug: str) -> None:
+    """
+    Прежний алгоритм OrderDAO.create_order для одной позиции.
+    """
+    order = Order(user_id=user.id, total_price=Decimal("0.00"), status=OrderEnum.pending)
+    db.add(order)
+    await db.flush()
+
+    product = (await db.execute(select(Product).where(Product.slug == slug))).scalar_one()
+    if product.stock < 1:
+        raise HTTPException(status_code=400, detail="Недостаточно товара в остатках")
+    product.stock -= 1
+
+    db.add(OrderItem(
+        order_id=order.id, product_slug=slug, product_name_snapshot=product.name,
+        quantity=1, price_at_time=product.price,
+    ))
+    order.total_price = product.price
+    await db.commit()
+
+
+async def atomic_checkout(db, user: User, slug: str) -> None:
+    await OrderDAO.create_order(
+        db=db, user=user,
+        new_order=OrderCreateSchema(order_items=[OrderItemSchema(product_slug=slug, quantity=1)]),
+    )
+
+
+async def setup(stock: int) -> int:
+    async with async_session() as db:
+        await cleanup()
+        user = User(
+            email=BENCH_EMAIL, hashed_password="-", first_name="Bench",
+            last_name="Bench", phone_number="+70000000000",
+        )
+        db.add(user)
+        db.add(Product(
+            name="Checkout bench hot product", slug=BENCH_SLUG, price=Decimal("100.00"),
+            stock=stock, rating=0, is_active=True,
+        ))
+        await db.commit()
+        return user.id
+
+
+async def reset_stock(stock: int, user_id: int) -> None:
+    async with async_session() as db:
+        await db.execute(delete(Order).where(Order.user_id == user_id))
+        product = (await db.execute(select(Product).where(Product.slug == BENCH_SLUG))).scalar_one()
+        product.stock = stock
+        await db.commit()
+
+
+async def cleanup() -> None:
+    async with async_session() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.execute(delete(Product).where(Product.slug == BENCH_SLUG))
+        await db.commit()
+
+
+async def run(checkout, user_id: int, stock: int, orders: int, concurrency: int) -> None:
+    await reset_stock(stock, user_id)
+    attempts = iter(range(orders))
+    succeeded = rejected = 0
+
+    async def worker() -> None:
+        nonlocal succeeded, rejected
+        for _ in attempts:
+            async with async_session() as db:
+                user = await db.get(User, user_id)
+                try:
+                    await checkout(db, user, BENCH_SLUG)
+                    succeeded += 1
+                except HTTPException:
+                    rejected += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    async with async_session() as db:
+        final_stock = (await db.execute(
+            select(Product.stock).where(Product.slug == BENCH_SLUG)
+        )).scalar_one()
+
+    print(
+        f"{checkout.__name__:<18}{succeeded:>8}{rejected:>8}{final_stock:>8}"
+        f"{max(succeeded - stock, 0):>10}{orders / elapsed:>14.0f}"
+    )
+
+
+async def main(stock: int, orders: int, concurrency: int) -> None:
+    user_id = await setup(stock)
+    try:
+        print(f"{'checkout':<18}{'ok':>8}{'reject':>8}{'stock':>8}{'oversold':>10}{'attempts/s':>14}")
+        for checkout in (legacy_checkout, atomic_checkout):
+            await run(checkout, user_id, stock, orders, concurrency)
+    finally:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--stock", type=int, default=100)
+    parser.add_argument("--orders", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=15)
+    args = parser.parse_args()
+    asyncio.run(main(args.stock, args.orders, args.concurrency))
@@ -0,0 +1,140 @@
+"""
+Число обращений к БД и время оформления заказа из корзины: прежняя цепочка
+(get_cart, create_order, повторное чтение заказа, clear_cart) против одного
+запроса OrderDAO.create_order_from_cart.
+
+Обращения считаются по событиям движка: каждый SQL-запрос и каждые
+BEGIN/COMMIT/ROLLBACK. Создаёт пользователя, товары и корзину из --items
+позиций, после замера удаляет их.
+Требует применённых миграций и доступной БД из .env.
+
+    python -m benchmarks.checkout_round_trips --items 5 --repeat 20
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+
+from sqlalchemy import delete, event
+
+from src.cart.dao import CartDAO
+from src.cart.models import Cart, CartItem
+from src.database import async_engine, async_session
+from src.orders.dao import OrderDAO
+from src.orders.schemas import OrderCreateSchema, OrderItemSchema
+from src.products.models import Product
+from src.users.models import User
+
+BENCH_EMAIL = "checkout-round-trips@example.com"
+BENCH_SLUG_PREFIX = "checkout-round-trips-"
+
+
+class RoundTripCounter:
+    def __init__(self) -> None:
+        self.count = 0
+        engine = async_engine.sync_engine
+        event.listen(engine, "before_cursor_execute", self._increment)
+        for name in ("begin", "commit", "rollback"):
+            event.listen(engine, name, self._increment)
+
+    def _increment(self, *args, **kwargs) -> None:
+        self.count += 1
+
+
+async def legacy_checkout(db, user: User) -> None:
+    """
+    Прежний OrderDAO.create_order_from_cart.
+    """
+    cart = await CartDAO.get_cart(db=db, user=user)
+    new_order = OrderCreateSchema(order_items=[
+        OrderItemSchema(product_slug=item.product_slug, quantity=item.quantity)
+        for item in cart.cart_items
+    ])
+    await OrderDAO.create_order(db=db, user=user, new_order=new_order)
+    await CartDAO.clear_cart(db=db, user=user, cart=cart)
+
+
+async def single_statement_checkout(db, user: User) -> None:
+    await OrderDAO.create_order_from_cart(db=db, user=user)
+
+
+async def setup(items: int) -> int:
+    await cleanup()
+    async with async_session() as db:
+        user = User(
+            email=BENCH_EMAIL, hashed_password="-", first_name="Bench",
+            last_name="Bench", phone_number="+70000000000",
+        )
+        db.add(user)
+        db.add_all(
+            Product(
+                name=f"Round trips product {i}", slug=f"{BENCH_SLUG_PREFIX}{i}",
+                price=Decimal("10.00"), stock=1_000_000, rating=0, is_active=True,
+            )
+            for i in range(items)
+        )
+        await db.flush()
+        db.add(Cart(user_id=user.id))
+        await db.commit()
+        return user.id
+
+
+async def fill_cart(user_id: int, items: int) -> None:
+    async with async_session() as db:
+        cart = await CartDAO.get_cart(db=db, user=await db.get(User, user_id))
+        db.add_all(
+            CartItem(
+                cart_id=cart.id, product_slug=f"{BENCH_SLUG_PREFIX}{i}",
+                product_name_snapshot=f"Round trips product {i}", quantity=1,
+                price_at_time=Decimal("10.00"),
+            )
+            for i in range(items)
+        )
+        await db.commit()
+
+
+async def cleanup() -> None:
+    async with async_session() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.execute(delete(Product).where(Product.slug.startswith(BENCH_SLUG_PREFIX)))
+        await db.commit()
+
+
+async def measure(checkout, user_id: int, items: int, repeat: int, counter: RoundTripCounter) -> None:
+    round_trips, timings = [], []
+    for _ in range(repeat):
+        await fill_cart(user_id, items)
+        async with async_session() as db:
+            user = await db.get(User, user_id)
+            await db.commit()
+
+            counter.count = 0
+            started = time.perf_counter()
+            await checkout(db, user)
+            timings.append(time.perf_counter() - started)
+            round_trips.append(counter.count)
+
+    print(
+        f"{checkout.__name__:<28}{statistics.median(round_trips):>12.0f}"
+        f"{statistics.median(timings) * 1000:>12.2f}"
+    )
+
+
+async def main(items: int, repeat: int) -> None:
+    counter = RoundTripCounter()
+    user_id = await setup(items)
+    try:
+        print(f"{'checkout':<28}{'round trips':>12}{'ms':>12}")
+        for checkout in (legacy_checkout, single_statement_checkout):
+            await measure(checkout, user_id, items, repeat, counter)
+    finally:
+        await cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.items, args.repeat))
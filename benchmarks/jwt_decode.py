@@ -0,0 +1,60 @@
+"""
+Пропускная способность decode_jwt на одном ядре: PEM-строка, которую PyJWT
+разбирает при каждом вызове, против ключа, разобранного один раз
+(JWTKeyManager), и против повторной проверки того же токена из кэша.
+
+Использует ключи из certificates/, БД не нужна.
+
+    python -m benchmarks.jwt_decode --tokens 1000 --seconds 2
+"""
+import argparse
+import time
+
+import jwt
+
+from src.config import auth_jwt
+from src.users.auth import JWTKeyManager, encode_jwt
+
+
+def throughput(decode, tokens: list[str], seconds: float) -> float:
+    calls = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        for token in tokens:
+            decode(token)
+        calls += len(tokens)
+    return calls / (time.perf_counter() - started)
+
+
+def main(tokens_count: int, seconds: float) -> None:
+    public_pem = auth_jwt.public_key_path.read_text()
+    tokens = [encode_jwt({"sub": str(i), "email": f"user{i}@example.com"}) for i in range(tokens_count)]
+
+    def pem_string(token: str) -> dict:
+        return jwt.decode(token, key=public_pem, algorithms=[auth_jwt.algorithm])
+
+    parsed = JWTKeyManager.from_config(auth_jwt)
+    parsed.cache_size = 0
+
+    def parsed_key(token: str) -> dict:
+        return parsed.decode(token)
+
+    cached = JWTKeyManager.from_config(auth_jwt)
+    cached.cache_size = tokens_count
+    for token in tokens:
+        cached.decode(token)
+
+    def cached_result(token: str) -> dict:
+        return cached.decode(token)
+
+    print(f"{'decode':<16}{'tokens/s':>12}")
+    for decode in (pem_string, parsed_key, cached_result):
+        print(f"{decode.__name__:<16}{throughput(decode, tokens, seconds):>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+    main(args.tokens, args.seconds)
@@ -0,0 +1,85 @@
+"""
+Стоимость сериализации большого списка на один элемент: model_validate по
+элементам плюс повторная валидация response_model в FastAPI против
+json_response (один проход TypeAdapter и dump_json).
+
+ORM-объекты Product/Category создаются в памяти, БД не нужна.
+
+    python -m benchmarks.list_serialization --rows 10000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, UTC
+from decimal import Decimal
+
+from fastapi import FastAPI, Response
+
+from benchmarks.cache_raw_response import request
+from src.categories.models import Category
+from src.products.models import Product
+from src.products.schemas import ProductOutSchema, ProductPageSchema
+from src.utils.responses import json_response
+
+
+def make_products(rows: int) -> list[Product]:
+    now = datetime.now(UTC)
+    categories = [
+        Category(id=i, name=f"Категория {i}", slug=f"category-{i}", created_at=now, updated_at=now)
+        for i in range(10)
+    ]
+    return [
+        Product(
+            id=i, name=f"Чай масала {i}", slug=f"masala-tea-{i}",
+            description="Синтетический товар для бенчмарка сериализации",
+            price=Decimal("199.99"), image_url=None, stock=i % 50, rating=4.5,
+            category_id=i % 10, category=categories[i % 10], is_active=True,
+            created_at=now, updated_at=now,
+        )
+        for i in range(rows)
+    ]
+
+
+def make_app(products: list[Product]) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/validated")
+    async def validated() -> ProductPageSchema:
+        return ProductPageSchema(
+            items=[ProductOutSchema.model_validate(product) for product in products],
+            next_cursor=None,
+        )
+
+    @app.get("/json-response", response_model=ProductPageSchema)
+    async def fast() -> Response:
+        return json_response(ProductPageSchema, {"items": products, "next_cursor": None})
+
+    return app
+
+
+async def measure(app: FastAPI, path: str, repeat: int) -> float:
+    await request(app, path, b"identity")
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await request(app, path, b"identity")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+async def main(rows: int, repeat: int) -> None:
+    app = make_app(make_products(rows))
+
+    print(f"{'path':<18}{'total, ms':>12}{'per item, µs':>15}")
+    for path in ("/validated", "/json-response"):
+        elapsed = await measure(app, path, repeat)
+        print(f"{path:<18}{elapsed * 1000:>12.1f}{elapsed / rows * 1_000_000:>15.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
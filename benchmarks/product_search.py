@@ -0,0 +1,83 @@
+"""
+Сравнение поиска товаров: ilike по названию против полнотекстового/триграммного поиска.
+
+Заполняет таблицу products синтетическим каталогом внутри транзакции,
+замеряет запросы ProductDAO.get_filtered_products и откатывает транзакцию.
+Требует применённых миграций и доступной БД из .env.
+
+    python -m benchmarks.product_search --rows 1000000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from src.database import async_session
+from src.products.dao import ProductDAO
+from src.products.schemas import ProductFilters
+from src.utils.pagination import PaginationParams
+
+SEED_SQL = text("""
+    INSERT INTO products (name, slug, description, price, stock, rating, is_active)
+    SELECT
+        (ARRAY['Чай', 'Масала', 'Рис', 'Гхи', 'Карри', 'Tea', 'Spice', 'Rice', 'Chutney', 'Ладду'])[1 + i % 10]
+            || ' ' || (ARRAY['басмати', 'ассам', 'дарджилинг', 'garam', 'tikka', 'mango', 'кокосовый', 'острый'])[1 + i % 8]
+            || ' ' || i,
+        'bench-product-' || i,
+        'Синтетический товар для бенчмарка поиска, partia ' || (i % 1000),
+        (i % 5000) + 0.99,
+        i % 50,
+        (i % 50) / 10.0,
+        TRUE
+    FROM generate_series(1, :rows) AS i
+""")
+
+QUERIES = ["басмати", "масала острый", "mango chutney", "дарджилинг"]
+
+
+def make_filters(**kwargs) -> ProductFilters:
+    params = dict(
+        q=None, name=None, min_price=None, max_price=None, category_slug=None,
+        in_stock=None, is_active=None, min_rating=None,
+    )
+    params.update(kwargs)
+    return ProductFilters(**params)
+
+
+async def measure(db, filters: ProductFilters, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await ProductDAO.get_filtered_products(
+            db=db,
+            product_filters=filters,
+            pagination=PaginationParams(cursor=None, limit=50),
+        )
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+async def main(rows: int, repeat: int) -> None:
+    async with async_session() as db:
+        started = time.perf_counter()
+        await db.execute(SEED_SQL, {"rows": rows})
+        await db.execute(text("ANALYZE products"))
+        print(f"seeded {rows} rows in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'query':<20}{'ilike, ms':>12}{'search, ms':>12}")
+        for query in QUERIES:
+            ilike_ms = await measure(db, make_filters(name=query), repeat)
+            search_ms = await measure(db, make_filters(q=query), repeat)
+            print(f"{query:<20}{ilike_ms:>12.1f}{search_ms:>12.1f}")
+
+        await db.rollback()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,139 @@
+"""
+Число запросов к БД на один запрос к API корзины и заказов: без кэшей,
+с контекстом запроса (REQUEST_IDENTITY_CACHE: пользователь, корзина и товары
+загружаются один раз за запрос) и дополнительно с кэшем пользователей
+по токену (principal_cache: пользователь не загружается вовсе).
+
+Запросы считаются счётчиком RequestContext.queries сессии из get_db.
+Перед замером в каждом режиме выполняется прогревочный запрос.
+Создаёт пользователя и товар, после замера удаляет их.
+Требует применённых миграций и доступной БД из .env.
+
+    python -m benchmarks.request_queries
+"""
+import argparse
+import asyncio
+import json
+from decimal import Decimal
+
+from fastapi import FastAPI
+from sqlalchemy import delete
+
+from src.cart.router import router as cart_router
+from src.orders.router import router as order_router
+from src.dao.context import RequestContext, attach_request_context
+from src.database import async_session, get_db
+from src.products.models import Product
+from src.users.auth import encode_jwt
+from src.users.models import User
+from src.users.principal import principal_cache
+
+BENCH_EMAIL = "request-queries@example.com"
+BENCH_SLUG = "request-queries-product"
+
+OPERATIONS = (
+    ("GET", "/cart/", None),
+    ("POST", "/cart/", {"product_slug": BENCH_SLUG, "quantity": 1}),
+    ("PATCH", "/cart/", {"product_slug": BENCH_SLUG, "quantity": 2}),
+    ("PUT", "/cart/items", {"mode": "delta", "items": [{"product_slug": BENCH_SLUG, "quantity": 1}]}),
+    ("DELETE", f"/cart/{BENCH_SLUG}", None),
+    ("GET", "/orders/", None),
+)
+
+# (название, контекст запроса, кэш пользователей по токену)
+MODES = (
+    ("none", False, False),
+    ("identity", True, False),
+    ("principal", True, True),
+)
+
+
+def make_app(enabled: bool, contexts: list[RequestContext]) -> FastAPI:
+    app = FastAPI()
+    app.include_router(cart_router)
+    app.include_router(order_router)
+
+    async def counted_db():
+        async with async_session() as session:
+            contexts.append(attach_request_context(session, enabled=enabled))
+            yield session
+
+    app.dependency_overrides[get_db] = counted_db
+    return app
+
+
+async def request(app: FastAPI, method: str, path: str, body: dict | None, token: str) -> int:
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("bench", 80), "client": ("bench", 1),
+        "headers": [
+            (b"host", b"bench"),
+            (b"content-type", b"application/json"),
+            (b"cookie", f"access_token={token}".encode()),
+        ],
+    }
+    status_code = 0
+
+    async def receive():
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status_code
+        if message["type"] == "http.response.start":
+            status_code = message["status"]
+
+    await app(scope, receive, send)
+    return status_code
+
+
+async def setup() -> int:
+    await cleanup()
+    async with async_session() as db:
+        user = User(
+            email=BENCH_EMAIL, hashed_password="-", first_name="Bench",
+            last_name="Bench", phone_number="+70000000000",
+        )
+        db.add(user)
+        db.add(Product(
+            name="Request queries product", slug=BENCH_SLUG, price=Decimal("10.00"),
+            stock=1_000, rating=0, is_active=True,
+        ))
+        await db.commit()
+        return user.id
+
+
+async def cleanup() -> None:
+    async with async_session() as db:
+        await db.execute(delete(User).where(User.email == BENCH_EMAIL))
+        await db.execute(delete(Product).where(Product.slug == BENCH_SLUG))
+        await db.commit()
+
+
+async def main() -> None:
+    user_id = await setup()
+    token = encode_jwt({"sub": str(user_id)})
+    try:
+        results = {}
+        for _, identity_enabled, principal_enabled in MODES:
+            principal_cache.clear()
+            principal_cache.enabled = principal_enabled
+            contexts: list[RequestContext] = []
+            app = make_app(identity_enabled, contexts)
+            await request(app, "GET", "/cart/", None, token)
+            for method, path, body in OPERATIONS:
+                await request(app, method, path, body, token)
+                results.setdefault(f"{method} {path}", []).append(contexts[-1].queries)
+
+        print(f"{'request':<40}" + "".join(f"{name:>12}" for name, _, _ in MODES))
+        for name, counts in results.items():
+            print(f"{name:<40}" + "".join(f"{count:>12}" for count in counts))
+    finally:
+        principal_cache.clear()
+        await cleanup()
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__).parse_args()
+    asyncio.run(main())
@@ -0,0 +1,339 @@
+import abc
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Iterable, Optional, Tuple
+
+from fastapi_cache.backends.redis import RedisBackend
+from fastapi_cache.types import Backend
+
+if TYPE_CHECKING:
+    from src.cache.metrics import CacheStats
+
+logger = logging.getLogger(__name__)
+
+# Удаляет блокировку, только если она всё ещё принадлежит владельцу токена
+RELEASE_LOCK_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Добавляет ключ записи ARGV[1] со временем истечения ARGV[2] ("inf" — без срока)
+# в множества тегов (KEYS), удаляет из них истёкшие к ARGV[3] ключи и продлевает
+# каждое множество до истечения самой долгой записи в нём
+TAG_ENTRY_LUA = """
+for _, tag in ipairs(KEYS) do
+    redis.call('ZADD', tag, ARGV[2], ARGV[1])
+    redis.call('ZREMRANGEBYSCORE', tag, '-inf', ARGV[3])
+    local last = tonumber(redis.call('ZRANGE', tag, -1, -1, 'WITHSCORES')[2])
+    if last == math.huge then
+        redis.call('PERSIST', tag)
+    else
+        redis.call('EXPIREAT', tag, math.ceil(last))
+    end
+end
+"""
+
+# Удаляет все ключи из множеств тегов (KEYS) и сами множества, возвращает удалённые ключи.
+# Ключи записей берутся из множеств, а не из KEYS, поэтому скрипт работает
+# только на одном узле Redis (не в Redis Cluster)
+INVALIDATE_TAGS_LUA = """
+local deleted = {}
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('ZRANGE', tag, 0, -1)
+    for i = 1, #members, 500 do
+        local chunk = {unpack(members, i, math.min(i + 499, #members))}
+        redis.call('DEL', unpack(chunk))
+        for _, key in ipairs(chunk) do
+            table.insert(deleted, key)
+        end
+    end
+    redis.call('DEL', tag)
+end
+return deleted
+"""
+
+
+class TaggedBackend(Backend):
+    """
+    Backend, связывающий записи кэша с тегами (surrogate keys) и
+    удаляющий по тегу все зависящие от него записи.
+    """
+
+    @abc.abstractmethod
+    async def set_with_tags(
+        self, key: str, value: bytes, expire: Optional[int], tags: Iterable[str]
+    ) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def invalidate_tags(self, tags: Iterable[str]) -> list[str]:
+        raise NotImplementedError
+
+    async def acquire_lock(self, key: str, timeout: int) -> Optional[str]:
+        """
+        Берёт блокировку вычисления значения key, общую для всех воркеров.
+        Возвращает токен блокировки или None, если она занята.
+        Backend без общего хранилища блокировок всегда её выдаёт.
+        """
+        return uuid.uuid4().hex
+
+    async def release_lock(self, key: str, token: str) -> None:
+        return None
+
+
+class TaggedRedisBackend(RedisBackend, TaggedBackend):
+    """
+    RedisBackend с тегами: для каждого тега хранится sorted set "{prefix}:tags:{tag}"
+    с ключами записей, оценка — время истечения записи. При каждой записи
+    из множеств её тегов удаляются истёкшие ключи, так что множество часто
+    используемого тега не растёт без предела, а живёт оно до истечения
+    самой долгой записи. Запись значения и её тегов,
+    как и инвалидация, выполняются за одно обращение к Redis.
+
+    Рассчитан на один узел Redis: скрипт инвалидации удаляет ключи,
+    не переданные в KEYS, что в Redis Cluster недопустимо.
+    """
+
+    def __init__(self, redis, prefix: str):
+        super().__init__(redis)
+        self.prefix = prefix
+        self._invalidate_script = redis.register_script(INVALIDATE_TAGS_LUA)
+        self._tag_entry_script = redis.register_script(TAG_ENTRY_LUA)
+        self._release_lock_script = redis.register_script(RELEASE_LOCK_LUA)
+
+    def tag_key(self, tag: str) -> str:
+        return f"{self.prefix}:tags:{tag}"
+
+    async def set_with_tags(
+        self, key: str, value: bytes, expire: Optional[int], tags: Iterable[str]
+    ) -> None:
+        tag_keys = [self.tag_key(tag) for tag in set(tags)]
+        now = time.time()
+        expires_at = now + expire if expire else "inf"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, value, ex=expire)
+            if tag_keys:
+                await self._tag_entry_script(keys=tag_keys, args=[key, expires_at, now], client=pipe)
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> list[str]:
+        tag_keys = [self.tag_key(tag) for tag in set(tags)]
+        if not tag_keys:
+            return []
+        deleted = await self._invalidate_script(keys=tag_keys)
+        return [key.decode() if isinstance(key, bytes) else key for key in deleted]
+
+    def lock_key(self, key: str) -> str:
+        return f"{key}:lock"
+
+    async def acquire_lock(self, key: str, timeout: int) -> Optional[str]:
+        token = uuid.uuid4().hex
+        acquired = await self.redis.set(self.lock_key(key), token, nx=True, ex=timeout)
+        return token if acquired else None
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self._release_lock_script(keys=[self.lock_key(key)], args=[token])
+
+
+class LocalLRUCache:
+    """
+    Ограниченный по числу записей и объёму LRU-кэш значений с TTL в памяти процесса.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries: OrderedDict[str, tuple[float, Optional[float], bytes]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[tuple[int, bytes]]:
+        """
+        Возвращает (оставшийся срок жизни исходной записи, значение); -1 — запись без срока.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, record_expires_at, value = entry
+        now = time.monotonic()
+        if expires_at <= now:
+            self.delete(key)
+            return None
+
+        self._entries.move_to_end(key)
+        if record_expires_at is None:
+            return -1, value
+        return int(record_expires_at - now), value
+
+    def set(self, key: str, value: bytes, ttl: float, record_ttl: Optional[float] = None) -> None:
+        """
+        :param ttl: Сколько хранить локальную копию.
+        :param record_ttl: Срок жизни исходной записи, его возвращает get.
+        """
+        if ttl <= 0 or len(value) > self.max_bytes:
+            self.delete(key)
+            return
+
+        self.delete(key)
+        now = time.monotonic()
+        record_expires_at = now + record_ttl if record_ttl is not None else None
+        self._entries[key] = (now + ttl, record_expires_at, value)
+        self.size += len(value)
+
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, _, evicted) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+
+    def delete_prefix(self, prefix: str) -> None:
+        for key in [key for key in self._entries if key.startswith(prefix)]:
+            self.delete(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class TwoTierBackend(TaggedBackend):
+    """
+    Локальный LRU-кэш процесса перед Redis.
+
+    Попадание в локальный кэш не требует обращения к Redis и декодирования ответа
+    сети. Локальная копия живёт не дольше local_ttl и не дольше записи в Redis,
+    а get_with_ttl возвращает оставшийся срок жизни записи в Redis.
+    Удаления и перезаписи рассылаются через pub/sub канал, и каждый воркер
+    удаляет у себя локальные копии (см. listen).
+    """
+
+    def __init__(
+        self,
+        remote: TaggedRedisBackend,
+        channel: str,
+        max_entries: int,
+        max_bytes: int,
+        local_ttl: int,
+        stats: "CacheStats | None" = None,
+    ):
+        self.remote = remote
+        self.channel = channel
+        self.local = LocalLRUCache(max_entries=max_entries, max_bytes=max_bytes)
+        self.local_ttl = local_ttl
+        self.stats = stats
+        self.node_id = uuid.uuid4().hex
+        # Растёт при каждом удалении локальных копий: чтение из Redis,
+        # во время которого что-то удалили, не кладёт значение в локальный кэш
+        self._generation = 0
+
+    def _record(self, tier: str, hit: bool) -> None:
+        if self.stats is not None:
+            self.stats.record_tier(tier, hit)
+            self.stats.set_gauge("local_entries", len(self.local))
+            self.stats.set_gauge("local_bytes", self.local.size)
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        local = self.local.get(key)
+        self._record("local", hit=local is not None)
+        if local is not None:
+            return local
+
+        generation = self._generation
+        ttl, value = await self.remote.get_with_ttl(key)
+        self._record("redis", hit=value is not None)
+        # Пока шло чтение, пришла инвалидация: прочитанное значение может быть устаревшим
+        if value is not None and generation == self._generation:
+            # ttl < 0 — запись в Redis без срока жизни
+            if ttl < 0:
+                self.local.set(key, value, self.local_ttl)
+            else:
+                self.local.set(key, value, min(ttl, self.local_ttl), record_ttl=ttl)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        _, value = await self.get_with_ttl(key)
+        return value
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.remote.set(key, value, expire)
+        self.local.set(key, value, min(expire or self.local_ttl, self.local_ttl), record_ttl=expire)
+        await self._broadcast(keys=[key])
+
+    async def set_with_tags(
+        self, key: str, value: bytes, expire: Optional[int], tags: Iterable[str]
+    ) -> None:
+        await self.remote.set_with_tags(key, value, expire, tags)
+        self.local.set(key, value, min(expire or self.local_ttl, self.local_ttl), record_ttl=expire)
+        await self._broadcast(keys=[key])
+
+    async def acquire_lock(self, key: str, timeout: int) -> Optional[str]:
+        return await self.remote.acquire_lock(key, timeout)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self.remote.release_lock(key, token)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> list[str]:
+        deleted = await self.remote.invalidate_tags(tags)
+        self._evict(keys=deleted)
+        await self._broadcast(keys=deleted)
+        return deleted
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        count = await self.remote.clear(namespace, key)
+        if namespace:
+            self._evict(namespace=namespace)
+            await self._broadcast(namespace=namespace)
+        elif key:
+            self._evict(keys=[key])
+            await self._broadcast(keys=[key])
+        return count
+
+    def _evict(self, keys: Iterable[str] = (), namespace: Optional[str] = None) -> None:
+        self._generation += 1
+        for key in keys:
+            self.local.delete(key)
+        if namespace:
+            self.local.delete_prefix(f"{namespace}:")
+
+    async def _broadcast(self, keys: Iterable[str] = (), namespace: Optional[str] = None) -> None:
+        keys = list(keys)
+        if not keys and not namespace:
+            return
+        message = json.dumps({"node": self.node_id, "keys": keys, "namespace": namespace})
+        try:
+            await self.remote.redis.publish(self.channel, message)
+        except Exception:
+            logger.warning("Error publishing cache invalidation", exc_info=True)
+
+    async def listen(self) -> None:
+        """
+        Слушает канал инвалидации и удаляет локальные копии, удалённые
+        или перезаписанные другими воркерами. Запускается фоновой задачей в lifespan.
+        """
+        while True:
+            pubsub = self.remote.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Пока не было подписки, сообщения могли быть пропущены
+                self.local = LocalLRUCache(self.local.max_entries, self.local.max_bytes)
+                self._generation += 1
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data.get("node") != self.node_id:
+                        self._evict(keys=data.get("keys") or (), namespace=data.get("namespace"))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cache invalidation listener failed, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
@@ -0,0 +1,28 @@
+import json
+from typing import Any
+
+from fastapi_cache.coder import JsonCoder, JsonEncoder
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.responses import JSONResponse
+
+
+class CompactJsonCoder(JsonCoder):
+    """
+    JsonCoder, кодирующий так же, как JSONResponse Starlette: без экранирования
+    не-ASCII символов и без пробелов. Закэшированные байты можно отдавать
+    клиенту как есть, а кириллица в них не занимает по 6 байт на символ.
+
+    Схемы pydantic сериализуются их собственным сериализатором за один проход,
+    без промежуточного jsonable_encoder.
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, JSONResponse):
+            return value.body
+        if isinstance(value, BaseModel):
+            return to_json(value)
+        return json.dumps(
+            value, cls=JsonEncoder, ensure_ascii=False, separators=(",", ":")
+        ).encode()
@@ -0,0 +1,408 @@
+import asyncio
+import gzip
+import hashlib
+import logging
+import time
+from contextlib import AsyncExitStack
+from functools import wraps
+from inspect import Parameter
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from fastapi import Request, Response
+from fastapi.dependencies.utils import get_typed_return_annotation, get_typed_signature
+from fastapi_cache import FastAPICache
+from fastapi_cache.types import Backend, KeyBuilder
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.status import HTTP_304_NOT_MODIFIED
+
+from src.cache.backends import TaggedBackend
+from src.database import async_session
+
+logger = logging.getLogger(__name__)
+
+INJECTED_REQUEST = "__cache_request"
+INJECTED_RESPONSE = "__cache_response"
+
+# Пауза между проверками кэша, пока значение вычисляет другой воркер
+LOCK_POLL_INTERVAL = 0.05
+
+TagsBuilder = Callable[[Any], Iterable[str]]
+
+# Готовые ответы меньше этого размера не сжимаются
+GZIP_MIN_SIZE = 1024
+
+# Фоновое обновление устаревшей записи дольше этого времени считается медленным
+REFRESH_SLOW_SECONDS = 1.0
+# Пределы паузы между фоновыми обновлениями после медленного или неудачного
+REFRESH_BACKOFF_MIN = 1.0
+REFRESH_BACKOFF_MAX = 60.0
+
+# Вычисления, идущие сейчас в этом воркере, по ключу кэша
+_in_flight: dict[str, asyncio.Future] = {}
+# Фоновые обновления устаревших записей. Хранятся отдельно от _in_flight:
+# они ничего не возвращают, и промах не может дождаться от них результата
+_refreshing: dict[str, asyncio.Future] = {}
+# Ключ -> (когда можно снова обновлять, текущая пауза)
+_refresh_backoff: dict[str, tuple[float, float]] = {}
+
+
+def _find_param(signature, annotation: type) -> Optional[Parameter]:
+    return next(
+        (p for p in signature.parameters.values() if p.annotation is annotation), None
+    )
+
+
+def _uncacheable(request: Optional[Request]) -> bool:
+    if not FastAPICache.get_enable():
+        return True
+    if request is None:
+        return False
+    if request.method != "GET":
+        return True
+    return request.headers.get("Cache-Control") == "no-store"
+
+
+def _etag(value: bytes) -> str:
+    return f'W/"{hashlib.sha1(value).hexdigest()}"'
+
+
+def _gzip_key(key: str) -> str:
+    return f"{key}:gzip"
+
+
+def _accepts_gzip(request: Request) -> bool:
+    return "gzip" in request.headers.get("accept-encoding", "")
+
+
+async def _store(
+    backend: Backend, key: str, value: bytes, expire: int, tags: Optional[Iterable[str]]
+) -> None:
+    if tags is not None and isinstance(backend, TaggedBackend):
+        await backend.set_with_tags(key, value, expire, tags)
+    else:
+        await backend.set(key, value, expire)
+
+
+async def _encoded_response(
+    backend: Backend, key: str, body: bytes, request: Request, headers: dict[str, str]
+) -> Response:
+    """
+    Отдаёт закэшированный JSON как есть, без декодирования и повторной
+    валидации FastAPI. Клиенту, принимающему gzip, отдаётся сжатый вариант.
+    """
+    headers = {**headers, "Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and _accepts_gzip(request):
+        try:
+            compressed = await backend.get(_gzip_key(key))
+        except Exception:
+            logger.warning("Error retrieving cache key '%s' from backend", key, exc_info=True)
+            compressed = None
+        if compressed is not None:
+            headers["Content-Encoding"] = "gzip"
+            body = compressed
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _compute_with_lock(
+    backend: Backend,
+    key: str,
+    compute: Callable[[], Awaitable[tuple[Any, bytes]]],
+    decode: Callable[[bytes], Any],
+    lock_timeout: int,
+) -> tuple[Any, bytes]:
+    """
+    Вычисляет значение под блокировкой, общей для воркеров. Пока блокировка
+    занята другим воркером, ждёт появления его результата в кэше; если за
+    lock_timeout результата нет, вычисляет сам.
+    """
+    if not isinstance(backend, TaggedBackend):
+        return await compute()
+
+    token = await backend.acquire_lock(key, lock_timeout)
+    deadline = time.monotonic() + lock_timeout
+    while token is None and time.monotonic() < deadline:
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+        cached = await backend.get(key)
+        if cached is not None:
+            return decode(cached), cached
+        token = await backend.acquire_lock(key, lock_timeout)
+
+    try:
+        return await compute()
+    finally:
+        if token is not None:
+            await backend.release_lock(key, token)
+
+
+async def _coalesce(
+    backend: Backend,
+    key: str,
+    compute: Callable[[], Awaitable[tuple[Any, bytes]]],
+    decode: Callable[[bytes], Any],
+    lock_timeout: int,
+) -> tuple[Any, bytes]:
+    """
+    Одновременные промахи по одному ключу внутри воркера ждут одно вычисление.
+    Вычисление защищено от отмены запроса, который его начал, чтобы
+    остальные ожидающие получили результат; поэтому compute не должен
+    использовать сессию БД этого запроса.
+    """
+    task = _in_flight.get(key)
+    if task is None:
+        task = _start_flight(_in_flight, key, _compute_with_lock(backend, key, compute, decode, lock_timeout))
+    return await asyncio.shield(task)
+
+
+def _start_flight(flights: dict[str, asyncio.Future], key: str, coro: Awaitable[Any]) -> asyncio.Future:
+    task = asyncio.ensure_future(coro)
+    flights[key] = task
+
+    def forget(done: asyncio.Future) -> None:
+        if flights.get(key) is done:
+            del flights[key]
+        if not done.cancelled():
+            done.exception()
+
+    task.add_done_callback(forget)
+    return task
+
+
+def _schedule_refresh(
+    backend: Backend,
+    key: str,
+    compute: Callable[[], Awaitable[tuple[Any, bytes]]],
+    lock_timeout: int,
+) -> None:
+    """
+    Запускает фоновое обновление устаревшей записи, если по ключу ещё ничего
+    не вычисляется в этом воркере и не действует пауза после медленного обновления.
+    """
+    if key in _in_flight or key in _refreshing:
+        return
+    backoff = _refresh_backoff.get(key)
+    if backoff is not None and time.monotonic() < backoff[0]:
+        return
+    _start_flight(_refreshing, key, _refresh(backend, key, compute, lock_timeout))
+
+
+async def _refresh(
+    backend: Backend,
+    key: str,
+    compute: Callable[[], Awaitable[tuple[Any, bytes]]],
+    lock_timeout: int,
+) -> None:
+    """
+    Обновляет запись в фоне. Если блокировку держит другой воркер, обновление
+    уже идёт там. Медленное или неудачное обновление откладывает следующее
+    с экспоненциально растущей паузой, чтобы не нагружать и без того медленную БД.
+    """
+    token = None
+    if isinstance(backend, TaggedBackend):
+        token = await backend.acquire_lock(key, lock_timeout)
+        if token is None:
+            return
+
+    started = time.monotonic()
+    failed = False
+    try:
+        await compute()
+    except Exception:
+        failed = True
+        logger.warning("Error refreshing stale cache key '%s'", key, exc_info=True)
+    finally:
+        if token is not None:
+            await backend.release_lock(key, token)
+
+    elapsed = time.monotonic() - started
+    if failed or elapsed > REFRESH_SLOW_SECONDS:
+        _, delay = _refresh_backoff.get(key, (0.0, REFRESH_BACKOFF_MIN / 2))
+        delay = min(delay * 2, REFRESH_BACKOFF_MAX)
+        _refresh_backoff[key] = (time.monotonic() + delay, delay)
+    else:
+        _refresh_backoff.pop(key, None)
+
+
+def cache(
+    expire: Optional[int] = None,
+    namespace: str = "",
+    key_builder: Optional[KeyBuilder] = None,
+    tags: Optional[TagsBuilder] = None,
+    single_flight: bool = True,
+    lock_timeout: int = 10,
+    stale_ttl: Optional[int] = None,
+    raw: bool = False,
+):
+    """
+    Кэширует результат асинхронного эндпоинта в backend FastAPICache.
+
+    Повторяет поведение fastapi_cache.decorator.cache (ключ, заголовки
+    Cache-Control/ETag, ответ 304) и дополнительно поддерживает теги:
+    tags(result) возвращает теги записи, по которым её затем удаляет
+    invalidate_tags.
+
+    :param expire: Время жизни записи в секундах.
+    :param namespace: Namespace ключей.
+    :param key_builder: Построитель ключа, по умолчанию — заданный в FastAPICache.init.
+    :param tags: Функция, возвращающая теги для результата эндпоинта.
+    :param single_flight: Объединять одновременные промахи по одному ключу в одно
+        вычисление (внутри воркера и, через блокировку в Redis, между воркерами).
+    :param lock_timeout: Сколько секунд держится межпроцессная блокировка вычисления.
+    :param stale_ttl: Окно stale-while-revalidate в секундах: запись хранится
+        expire + stale_ttl, и после expire её устаревшая копия отдаётся сразу,
+        а обновляется фоновой задачей с отдельной сессией БД.
+    :param raw: Хранить готовое тело ответа (и его gzip-вариант) и при вызове
+        эндпоинта маршрутом отдавать его как Response без работы pydantic.
+        При вызове функции как зависимости результат декодируется как обычно.
+    """
+
+    def wrapper(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        signature = get_typed_signature(func)
+        return_type = get_typed_return_annotation(func)
+
+        injected = []
+        request_param = _find_param(signature, Request)
+        if request_param is None:
+            request_param = Parameter(INJECTED_REQUEST, Parameter.KEYWORD_ONLY, annotation=Request)
+            injected.append(request_param)
+        response_param = _find_param(signature, Response)
+        if response_param is None:
+            response_param = Parameter(INJECTED_RESPONSE, Parameter.KEYWORD_ONLY, annotation=Response)
+            injected.append(response_param)
+
+        @wraps(func)
+        async def inner(*args, **kwargs):
+            request: Optional[Request] = kwargs.get(request_param.name)
+            response: Optional[Response] = kwargs.get(response_param.name)
+            for param in injected:
+                kwargs.pop(param.name, None)
+
+            if _uncacheable(request):
+                return await func(*args, **kwargs)
+
+            coder = FastAPICache.get_coder()
+            backend = FastAPICache.get_backend()
+            status_header = FastAPICache.get_cache_status_header()
+            ttl = expire or FastAPICache.get_expire()
+
+            key = (key_builder or FastAPICache.get_key_builder())(
+                func,
+                f"{FastAPICache.get_prefix()}:{namespace}",
+                request=request,
+                response=response,
+                args=args,
+                kwargs={k: v for k, v in kwargs.items() if k not in (request_param.name, response_param.name)},
+            )
+
+            try:
+                cached_ttl, cached = await backend.get_with_ttl(key)
+            except Exception:
+                logger.warning("Error retrieving cache key '%s' from backend", key, exc_info=True)
+                cached_ttl, cached = 0, None
+
+            store_ttl = ttl + stale_ttl if stale_ttl else ttl
+            # Готовый ответ отдаётся, только когда функцию вызвал сам маршрут
+            as_endpoint = raw and request is not None and request.scope.get("endpoint") is inner
+
+            async def compute(call_kwargs: dict[str, Any] = kwargs) -> tuple[Any, bytes]:
+                result = await func(*args, **call_kwargs)
+                encoded = coder.encode(result)
+
+                try:
+                    result_tags = tags(result) if tags is not None else None
+                    await _store(backend, key, encoded, store_ttl, result_tags)
+                    if raw and len(encoded) >= GZIP_MIN_SIZE:
+                        await _store(backend, _gzip_key(key), gzip.compress(encoded), store_ttl, result_tags)
+                except Exception:
+                    logger.warning("Error setting cache key '%s' in backend", key, exc_info=True)
+                return result, encoded
+
+            async def compute_detached() -> tuple[Any, bytes]:
+                # Сессия запроса закроется вместе с ним, а фоновое обновление
+                # и общее для нескольких запросов вычисление его переживают
+                async with AsyncExitStack() as stack:
+                    call_kwargs = {
+                        name: await stack.enter_async_context(async_session())
+                        if isinstance(value, AsyncSession) else value
+                        for name, value in kwargs.items()
+                    }
+                    return await compute(call_kwargs)
+
+            no_cache = request is not None and request.headers.get("Cache-Control") == "no-cache"
+            if cached is not None and not no_cache:
+                # ttl < 0 — запись без срока жизни
+                stale = bool(stale_ttl) and 0 <= cached_ttl < stale_ttl
+                if stale:
+                    _schedule_refresh(backend, key, compute_detached, lock_timeout)
+
+                etag = _etag(cached)
+                if stale:
+                    cache_control = f"max-age=0, stale-while-revalidate={cached_ttl}"
+                else:
+                    cache_control = f"max-age={max(cached_ttl - (stale_ttl or 0), 0)}"
+                headers = {
+                    "Cache-Control": cache_control,
+                    "ETag": etag,
+                    status_header: "STALE" if stale else "HIT",
+                }
+                if request is not None and request.headers.get("if-none-match") == etag:
+                    if as_endpoint:
+                        return Response(status_code=HTTP_304_NOT_MODIFIED, headers=headers)
+                    if response is not None:
+                        response.headers.update(headers)
+                        response.status_code = HTTP_304_NOT_MODIFIED
+                        return response
+                if as_endpoint:
+                    return await _encoded_response(backend, key, cached, request, headers)
+                if response is not None:
+                    response.headers.update(headers)
+                return coder.decode_as_type(cached, type_=return_type)
+
+            if single_flight and not no_cache:
+                result, encoded = await _coalesce(
+                    backend,
+                    key,
+                    compute_detached,
+                    decode=lambda value: coder.decode_as_type(value, type_=return_type),
+                    lock_timeout=lock_timeout,
+                )
+            else:
+                result, encoded = await compute()
+
+            headers = {
+                "Cache-Control": f"max-age={ttl}",
+                "ETag": _etag(encoded),
+                status_header: "MISS",
+            }
+            if as_endpoint:
+                return Response(content=encoded, media_type="application/json", headers=headers)
+            if response is not None:
+                response.headers.update(headers)
+            return result
+
+        inner.__signature__ = signature.replace(
+            parameters=[*signature.parameters.values(), *injected]
+        )
+        return inner
+
+    return wrapper
+
+
+async def invalidate_tags(*tags: str) -> list[str]:
+    """
+    Удаляет из кэша все записи, помеченные любым из тегов.
+    Возвращает удалённые ключи. Без инициализированного кэша ничего не делает.
+    """
+    if not tags:
+        return []
+    try:
+        backend = FastAPICache.get_backend()
+    except AssertionError:
+        return []
+    if not isinstance(backend, TaggedBackend):
+        return []
+
+    try:
+        return await backend.invalidate_tags(tags)
+    except Exception:
+        logger.warning("Error invalidating cache tags %s", tags, exc_info=True)
+        return []
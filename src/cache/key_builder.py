@@ -0,0 +1,81 @@
+import hashlib
+from datetime import date
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Awaitable, Dict, Iterable, Iterator, Optional, Tuple, Union
+
+from fastapi import BackgroundTasks, Request, Response
+from fastapi_cache import KeyBuilder
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database import Base
+
+# Значения, которые FastAPI внедряет как зависимости, а не берёт из пути или строки запроса
+SKIPPED_TYPES = (AsyncSession, Request, Response, BackgroundTasks, Base)
+SCALAR_TYPES = (str, int, float, bool, Decimal, date, Enum)
+
+# Ключи длиннее этого значения заменяются хэшем
+MAX_KEY_LENGTH = 200
+
+
+class ParamsKeyBuilder(KeyBuilder):
+    """
+    Ключ кэша из параметров пути и строки запроса эндпоинта.
+
+    Сессии, пользователи (и другие ORM-объекты), Request и Response
+    пропускаются. Классы параметров (ProductFilters, PaginationParams)
+    и pydantic-модели раскладываются на поля. Незаданные значения
+    отбрасываются, остальные сортируются по имени, поэтому один и тот же
+    набор параметров всегда даёт один и тот же ключ.
+
+    :param params: Если задан, в ключ попадают только параметры с этими именами.
+    """
+
+    def __init__(self, params: Iterable[str] | None = None):
+        self.params = set(params) if params is not None else None
+
+    def __call__(
+            self,
+            func: Any,
+            namespace: str = "",
+            *,
+            request: Optional[Request] = None,
+            response: Optional[Response] = None,
+            args: Tuple[Any, ...],
+            kwargs: Dict[str, Any],
+    ) -> Union[Awaitable[str], str]:
+        params = sorted(
+            (name, self.normalize(value))
+            for name, value in self._flatten(kwargs)
+            if self.params is None or name.split(".")[0] in self.params
+        )
+        return f"{namespace}:{self.format_key(params)}"
+
+    def normalize(self, value: Any) -> str:
+        if isinstance(value, Enum):
+            value = value.value
+        return str(value)
+
+    def format_key(self, params: list[tuple[str, str]]) -> str:
+        if not params:
+            return "default"
+
+        canonical = "&".join(f"{name}={value}" for name, value in params)
+        if len(canonical) > MAX_KEY_LENGTH:
+            return hashlib.sha256(canonical.encode()).hexdigest()
+        return canonical
+
+    def _flatten(self, values: Dict[str, Any], prefix: str = "") -> Iterator[tuple[str, Any]]:
+        for name, value in values.items():
+            if value is None or isinstance(value, SKIPPED_TYPES):
+                continue
+
+            if isinstance(value, SCALAR_TYPES):
+                yield f"{prefix}{name}", value
+            elif isinstance(value, (list, tuple, set, frozenset)):
+                yield f"{prefix}{name}", ",".join(sorted(self.normalize(item) for item in value))
+            elif isinstance(value, BaseModel):
+                yield from self._flatten(value.model_dump(), prefix=f"{prefix}{name}.")
+            elif hasattr(value, "__dict__"):
+                yield from self._flatten(vars(value), prefix=f"{prefix}{name}.")
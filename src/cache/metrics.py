@@ -0,0 +1,108 @@
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from fastapi_cache.types import Backend
+
+from src.cache.backends import TaggedBackend
+
+
+class CacheStats:
+    """
+    Счётчики попаданий и промахов кэша по namespace в рамках процесса.
+    """
+
+    def __init__(self) -> None:
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self.tier_hits: Counter[str] = Counter()
+        self.tier_misses: Counter[str] = Counter()
+        self.gauges: dict[str, int] = {}
+
+    def record(self, namespace: str, hit: bool) -> None:
+        (self.hits if hit else self.misses)[namespace] += 1
+
+    def record_tier(self, tier: str, hit: bool) -> None:
+        (self.tier_hits if hit else self.tier_misses)[tier] += 1
+
+    def set_gauge(self, name: str, value: int) -> None:
+        self.gauges[name] = value
+
+    @staticmethod
+    def _ratios(hits: Counter[str], misses: Counter[str]) -> dict[str, dict[str, float]]:
+        result = {}
+        for name in sorted(hits.keys() | misses.keys()):
+            result[name] = {
+                "hits": hits[name],
+                "misses": misses[name],
+                "hit_ratio": round(hits[name] / (hits[name] + misses[name]), 4),
+            }
+        return result
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        return self._ratios(self.hits, self.misses)
+
+    def tiers_snapshot(self) -> dict[str, dict[str, float]]:
+        return self._ratios(self.tier_hits, self.tier_misses)
+
+    def reset(self) -> None:
+        self.hits.clear()
+        self.misses.clear()
+        self.tier_hits.clear()
+        self.tier_misses.clear()
+
+
+cache_stats = CacheStats()
+
+
+class MeteredBackend(TaggedBackend):
+    """
+    Обёртка над backend FastAPICache, считающая попадания и промахи по namespace.
+
+    Ключи имеют вид "{prefix}:{namespace}:...", namespace берётся из ключа.
+    Теги передаются обёрнутому backend, если он их поддерживает.
+    """
+
+    def __init__(self, backend: Backend, prefix: str, stats: CacheStats = cache_stats):
+        self.backend = backend
+        self.prefix = prefix
+        self.stats = stats
+
+    def namespace_of(self, key: str) -> str:
+        key = key.removeprefix(f"{self.prefix}:")
+        return key.split(":", 1)[0]
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        ttl, value = await self.backend.get_with_ttl(key)
+        self.stats.record(self.namespace_of(key), hit=value is not None)
+        return ttl, value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.backend.get(key)
+
+    async def set(self, key: str, value: bytes, expire: Optional[int] = None) -> None:
+        await self.backend.set(key, value, expire)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        return await self.backend.clear(namespace, key)
+
+    async def set_with_tags(
+        self, key: str, value: bytes, expire: Optional[int], tags: Iterable[str]
+    ) -> None:
+        if isinstance(self.backend, TaggedBackend):
+            await self.backend.set_with_tags(key, value, expire, tags)
+        else:
+            await self.backend.set(key, value, expire)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> list[str]:
+        if isinstance(self.backend, TaggedBackend):
+            return await self.backend.invalidate_tags(tags)
+        return []
+
+    async def acquire_lock(self, key: str, timeout: int) -> Optional[str]:
+        if isinstance(self.backend, TaggedBackend):
+            return await self.backend.acquire_lock(key, timeout)
+        return await super().acquire_lock(key, timeout)
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if isinstance(self.backend, TaggedBackend):
+            await self.backend.release_lock(key, token)
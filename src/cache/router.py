@@ -0,0 +1,20 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, status
+
+from src.cache.metrics import cache_stats
+from src.users.dependencies import check_user_is_admin
+from src.users.schemas import UserPrincipalSchema
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@router.get("/stats", status_code=status.HTTP_200_OK)
+async def get_cache_stats(
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+) -> dict:
+    return {
+        "namespaces": cache_stats.snapshot(),
+        "tiers": cache_stats.tiers_snapshot(),
+        "memory": cache_stats.gauges,
+    }
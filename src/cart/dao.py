@@ -1,17 +1,20 @@
 from fastapi import HTTPException, status
-from sqlalchemy import select, and_, delete
+from sqlalchemy import select, and_, delete, update, func, literal, inspect
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import selectinload
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.cart.models import Cart, CartItem
-from src.cart.schemas import CartItemChangeSchema
+from src.cart.schemas import CartItemChangeSchema, CartItemsUpdateSchema
+from src.dao.context import get_request_context
 from src.products.models import Product
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
 
 
 class CartDAO:
     @classmethod
-    async def _check_cart_owner(cls, cart: Cart, user: User):
+    async def _check_cart_owner(cls, cart: Cart, user: UserPrincipalSchema):
         """
         Проверяет, принадлежит ли корзина текущему пользователю.
 
@@ -25,6 +28,14 @@ class CartDAO:
                 detail="Невозможно изменить корзину другого пользователя"
             )
 
+    @classmethod
+    def _expire_items(cls, db: AsyncSession, cart: Cart) -> None:
+        """
+        Помечает позиции корзины устаревшими после изменения, чтобы
+        запомненная в контексте запроса корзина перечитала их в get_cart.
+        """
+        db.expire(cart, ["cart_items"])
+
     @classmethod
     async def _get_cart_item(cls, db: AsyncSession, cart_id: int, slug: str) -> CartItem | None:
         """
@@ -51,6 +62,10 @@ class CartDAO:
         :return: Объект Product.
         :raises HTTPException: 404, если продукт не найден.
         """
+        context = get_request_context(db)
+        if context is not None and slug in context.products:
+            return context.products[slug]
+
         stmt = select(Product).where(Product.slug == slug)
         result = await db.execute(stmt)
         product = result.scalar_one_or_none()
@@ -59,10 +74,45 @@ class CartDAO:
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Товар по slug '{slug}' не найден"
             )
+        if context is not None:
+            context.products[slug] = product
         return product
 
     @classmethod
-    async def get_cart(cls, db: AsyncSession, user: User) -> Cart:
+    async def _get_products_for_quantities(cls, db: AsyncSession, quantities: dict[str, int]) -> dict[str, Product]:
+        """
+        Загружает товары одним запросом и проверяет остатки.
+
+        :param db: Сессия базы данных.
+        :param quantities: Требуемое количество по slug товара.
+        :return: Товары по slug.
+        :raises HTTPException: 404, если часть товаров не найдена, 400 — если не хватает остатка.
+        """
+        if not quantities:
+            return {}
+        result = await db.execute(select(Product).where(Product.slug.in_(quantities)))
+        products = {product.slug: product for product in result.scalars()}
+
+        missing_slugs = [slug for slug in quantities if slug not in products]
+        if missing_slugs:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Товары с такими slugs не найдены: {', '.join(missing_slugs)}"
+            )
+
+        short_slugs = [slug for slug in quantities if products[slug].stock < quantities[slug]]
+        if short_slugs:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Недостаточно товара в остатках: " + ", ".join(
+                    f"{products[slug].name} (запрошено {quantities[slug]}, остаток {products[slug].stock})"
+                    for slug in short_slugs
+                )
+            )
+        return products
+
+    @classmethod
+    async def get_cart(cls, db: AsyncSession, user: UserPrincipalSchema) -> Cart:
         """
          Получает корзину пользователя. Если корзины нет — создаёт новую.
 
@@ -70,6 +120,11 @@ class CartDAO:
          :param user: Текущий пользователь.
          :return: Объект Cart с подгруженными товарами.
          """
+        context = get_request_context(db)
+        cart = context.carts.get(user.id) if context is not None else None
+        if cart is not None and "cart_items" not in inspect(cart).unloaded:
+            return cart
+
         stmt = (
             select(Cart)
             .options(selectinload(Cart.cart_items))
@@ -79,22 +134,30 @@ class CartDAO:
         cart = result.scalar_one_or_none()
 
         if not cart:
-            cart = Cart(user_id=user.id)
-            db.add(cart)
+            db.add(Cart(user_id=user.id))
             await db.commit()
-            await db.refresh(cart)
+            # Перечитывается тем же запросом: после refresh cart_items остались бы
+            # незагруженными, а ленивая загрузка в async-сессии невозможна
+            cart = (await db.execute(stmt)).scalar_one()
 
+        if context is not None:
+            context.carts[user.id] = cart
         return cart
 
     @classmethod
     async def add_item_to_cart(cls,
                                db: AsyncSession,
-                               user: User,
+                               user: UserPrincipalSchema,
                                cart: Cart,
                                item: CartItemChangeSchema) -> CartItem:
         """
         Добавляет товар в корзину или увеличивает его количество, если он уже есть.
 
+        Вставка позиции, увеличение количества и проверка остатка по products
+        выполняются одним INSERT ... ON CONFLICT DO UPDATE по уникальному
+        индексу (cart_id, product_slug). Если запрос не вернул строку,
+        причина выясняется отдельными запросами.
+
         :param db: Сессия базы данных.
         :param user: Текущий пользователь.
         :param cart: Корзина пользователя.
@@ -105,54 +168,51 @@ class CartDAO:
         # Проверка на принадлежность корзины пользователю
         await cls._check_cart_owner(cart, user)
 
-        # Загрузка товара
-        product = await cls._get_product(db=db, slug=item.product_slug)
-
-        # Проверка на наличие аналогичного товара в корзине
-        existing_item = await cls._get_cart_item(db=db,
-                                                 cart_id=cart.id,
-                                                 slug=item.product_slug)
-
-        total_quantity = item.quantity
-        if existing_item:
-            total_quantity += existing_item.quantity
-
-        # Проверка, что общее количество не превышает остаток на складе
-        if total_quantity > product.stock:
+        stmt = insert(CartItem).from_select(
+            ["cart_id", "product_slug", "product_name_snapshot", "quantity", "price_at_time"],
+            select(
+                literal(cart.id), Product.slug, Product.name, literal(item.quantity), Product.price
+            ).where(and_(Product.slug == item.product_slug, Product.stock >= item.quantity)),
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[CartItem.cart_id, CartItem.product_slug],
+            set_={
+                "quantity": CartItem.quantity + stmt.excluded.quantity,
+                "updated_at": func.now(),
+            },
+            # Общее количество не должно превышать остаток на складе
+            where=CartItem.quantity + stmt.excluded.quantity <= (
+                select(Product.stock).where(Product.slug == item.product_slug).scalar_subquery()
+            ),
+        ).returning(CartItem)
+
+        result = await db.execute(stmt, execution_options={"populate_existing": True})
+        cart_item = result.scalar_one_or_none()
+        if cart_item is None:
+            product = await cls._get_product(db=db, slug=item.product_slug)
+            existing_item = await cls._get_cart_item(db=db, cart_id=cart.id, slug=item.product_slug)
+            total_quantity = item.quantity + (existing_item.quantity if existing_item else 0)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Товара в наличии {product.stock} шт. Вы пытаетесь заказать {total_quantity}"
             )
 
-        if existing_item:
-            existing_item.quantity += item.quantity
-            await db.commit()
-            await db.refresh(existing_item)
-
-            return existing_item
-
-        # Создание нового CartItem
-        new_item = CartItem(cart_id=cart.id,
-                            product_slug=item.product_slug,
-                            product_name_snapshot=product.name,
-                            quantity=item.quantity,
-                            price_at_time=product.price
-                            )
-        db.add(new_item)
         await db.commit()
-        await db.refresh(new_item)
-
-        return new_item
+        cls._expire_items(db, cart)
+        return cart_item
 
     @classmethod
     async def change_item_in_cart(cls,
                                   db: AsyncSession,
-                                  user: User,
+                                  user: UserPrincipalSchema,
                                   cart: Cart,
                                   item: CartItemChangeSchema) -> CartItem | dict[str, str]:
         """
         Изменяет количество товара в корзине. Если количество = 0 — удаляет товар.
 
+        Изменение выполняется одним UPDATE ... FROM products с проверкой
+        остатка, удаление — одним DELETE ... RETURNING.
+
         :param db: Сессия базы данных.
         :param user: Текущий пользователь.
         :param cart: Корзина пользователя.
@@ -163,46 +223,121 @@ class CartDAO:
         # Проверка на принадлежность корзины пользователю
         await cls._check_cart_owner(cart, user)
 
-        # Проверка на наличие товара в корзине
-        existing_item = await cls._get_cart_item(db=db,
-                                                 cart_id=cart.id,
-                                                 slug=item.product_slug)
-        if not existing_item:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Товар '{item.product_slug}' не найден в корзине."
-            )
+        item_filter = and_(CartItem.cart_id == cart.id, CartItem.product_slug == item.product_slug)
 
         # Если количество = 0 — удаляем товар из корзины и возвращаем удаленную модель с количеством 0
         if item.quantity == 0:
-            await db.delete(existing_item)
-            await db.commit()
-
-            existing_item.quantity = 0
-            return existing_item
-
-        # Получаем товар, чтобы проверить stock
-        product = await cls._get_product(db=db, slug=item.product_slug)
+            stmt = delete(CartItem).where(item_filter).returning(CartItem)
+        else:
+            stmt = (
+                update(CartItem)
+                .where(and_(
+                    item_filter,
+                    Product.slug == CartItem.product_slug,
+                    # Проверка: новое количество не больше чем есть в наличии
+                    Product.stock >= item.quantity,
+                ))
+                .values(quantity=item.quantity, updated_at=func.now())
+                .returning(CartItem)
+            )
 
-        # Проверка: новое количество не больше чем есть в наличии
-        if item.quantity > product.stock:
+        result = await db.execute(stmt, execution_options={"populate_existing": True})
+        cart_item = result.scalar_one_or_none()
+        if cart_item is None:
+            existing_item = await cls._get_cart_item(db=db, cart_id=cart.id, slug=item.product_slug)
+            if not existing_item:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Товар '{item.product_slug}' не найден в корзине."
+                )
+            product = await cls._get_product(db=db, slug=item.product_slug)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Товара в наличии {product.stock} шт. Вы пытаетесь установить {item.quantity}"
             )
 
-        # Обновляем количество
-        existing_item.quantity = item.quantity
         await db.commit()
-        await db.refresh(existing_item)
+        cls._expire_items(db, cart)
+        if item.quantity == 0:
+            cart_item.quantity = 0
+        return cart_item
+
+    @classmethod
+    async def update_items(cls,
+                           db: AsyncSession,
+                           user: UserPrincipalSchema,
+                           cart: Cart,
+                           update_data: CartItemsUpdateSchema) -> list[CartItem]:
+        """
+        Приводит корзину к переданному списку позиций (или применяет изменения
+        количества) в одной транзакции: позиции корзины читаются с блокировкой,
+        остатки всех товаров проверяются одним запросом, затем выполняются
+        один DELETE и один INSERT ... ON CONFLICT DO UPDATE.
+
+        :param db: Сессия базы данных.
+        :param user: Текущий пользователь.
+        :param cart: Корзина пользователя.
+        :param update_data: Позиции и режим изменения.
+        :return: Позиции корзины после изменения.
+        """
+        # Проверка на принадлежность корзины пользователю
+        await cls._check_cart_owner(cart, user)
+
+        result = await db.execute(
+            select(CartItem).where(CartItem.cart_id == cart.id).with_for_update()
+        )
+        current_items = {cart_item.product_slug: cart_item for cart_item in result.scalars()}
+        target = update_data.target_quantities(
+            {slug: cart_item.quantity for slug, cart_item in current_items.items()}
+        )
+
+        # Блокировки позиций снимаются при закрытии сессии, если проверка не прошла
+        products = await cls._get_products_for_quantities(db=db, quantities=target)
+
+        try:
+            removed_slugs = [slug for slug in current_items if slug not in target]
+            if removed_slugs:
+                await db.execute(
+                    delete(CartItem).where(and_(
+                        CartItem.cart_id == cart.id, CartItem.product_slug.in_(removed_slugs)
+                    ))
+                )
+
+            changed_slugs = [
+                slug for slug, quantity in target.items()
+                if slug not in current_items or current_items[slug].quantity != quantity
+            ]
+            if changed_slugs:
+                stmt = insert(CartItem).values([
+                    {
+                        "cart_id": cart.id,
+                        "product_slug": slug,
+                        "product_name_snapshot": products[slug].name,
+                        "quantity": target[slug],
+                        "price_at_time": products[slug].price,
+                    }
+                    for slug in changed_slugs
+                ])
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=[CartItem.cart_id, CartItem.product_slug],
+                    set_={"quantity": stmt.excluded.quantity, "updated_at": func.now()},
+                ).returning(CartItem)
+                result = await db.execute(stmt, execution_options={"populate_existing": True})
+                current_items.update((cart_item.product_slug, cart_item) for cart_item in result.scalars())
+
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
 
-        return existing_item
+        cls._expire_items(db, cart)
+        return [current_items[slug] for slug in target]
 
     @classmethod
     async def del_item_from_cart(cls,
                                  db: AsyncSession,
                                  slug: str,
-                                 user: User,
+                                 user: UserPrincipalSchema,
                                  cart: Cart):
         """
         Удаляет товар из корзины по slug.
@@ -228,13 +363,14 @@ class CartDAO:
 
         await db.delete(existing_item)
         await db.commit()
+        cls._expire_items(db, cart)
 
         return {"detail": f"Товар с slug '{slug}' был удален из корзины."}
 
     @classmethod
     async def clear_cart(cls,
                          db: AsyncSession,
-                         user: User,
+                         user: UserPrincipalSchema,
                          cart: Cart) -> None:
         """
         Полностью очищает корзину пользователя (удаляет все товары).
@@ -249,4 +385,5 @@ class CartDAO:
         stmt = delete(CartItem).where(CartItem.cart_id == cart.id)
         await db.execute(stmt)
         await db.commit()
+        cls._expire_items(db, cart)
 
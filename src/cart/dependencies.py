@@ -3,15 +3,20 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.cart.models import Cart
+from src.dao.context import get_request_context
 from src.database import get_db
 from src.users.dependencies import get_user_using_token
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
 
 
 async def get_cart_info(
         db: AsyncSession = Depends(get_db),
-        user: User = Depends(get_user_using_token),
+        user: UserPrincipalSchema = Depends(get_user_using_token),
 ) -> Cart:
+    context = get_request_context(db)
+    if context is not None and user.id in context.carts:
+        return context.carts[user.id]
+
     stmt = select(Cart).where(Cart.user_id == user.id)
     result = await db.execute(stmt)
     cart = result.scalar_one_or_none()
@@ -23,4 +28,6 @@ async def get_cart_info(
         await db.commit()
         await db.refresh(cart)
 
+    if context is not None:
+        context.carts[user.id] = cart
     return cart
@@ -1,6 +1,6 @@
 from decimal import Decimal
 
-from sqlalchemy import Integer, ForeignKey, String, DECIMAL
+from sqlalchemy import Integer, ForeignKey, String, DECIMAL, Index
 from sqlalchemy.orm import mapped_column, Mapped, relationship
 
 from src.database import Base
@@ -26,3 +26,8 @@ class CartItem(Base):
     price_at_time: Mapped[Decimal] = mapped_column(DECIMAL(10, 2), nullable=False)
 
     cart: Mapped["Cart"] = relationship("Cart", back_populates="cart_items")
+
+    __table_args__ = (
+        # Одна позиция на товар в корзине, цель ON CONFLICT при добавлении
+        Index("ix_cart_items_cart_id_product_slug", "cart_id", "product_slug", unique=True),
+    )
@@ -3,13 +3,11 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, status, Path
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.cart.dao import CartDAO
-from src.cart.dependencies import get_cart_info
-from src.cart.models import Cart
-from src.cart.schemas import CartItemChangeSchema, CartItemSchema, CartOutSchema
+from src.cart.schemas import CartItemChangeSchema, CartItemSchema, CartItemsUpdateSchema, CartOutSchema
+from src.cart.storage import CartStorage, get_cart_storage
 from src.database import get_db
 from src.users.dependencies import get_user_using_token
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
 
 router = APIRouter(prefix="/cart", tags=["сart"])
 
@@ -17,53 +15,56 @@ router = APIRouter(prefix="/cart", tags=["сart"])
 @router.get("/", status_code=status.HTTP_200_OK)
 async def get_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
 ) -> CartOutSchema:
-    cart = await CartDAO.get_cart(db=db, user=user)
-
-    return CartOutSchema.model_validate(cart)
+    return await storage.get_cart(db=db, user=user)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def add_item_to_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
-        cart: Annotated[Cart, Depends(get_cart_info)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
         item: CartItemChangeSchema,
 ) -> CartItemSchema:
-    cart_item = await CartDAO.add_item_to_cart(db=db, user=user, cart=cart, item=item)
-    return CartItemSchema.model_validate(cart_item)
+    return await storage.add_item(db=db, user=user, item=item)
 
 
 @router.patch("/", status_code=status.HTTP_200_OK)
 async def change_item_in_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
-        cart: Annotated[Cart, Depends(get_cart_info)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
         item: CartItemChangeSchema,
 ) -> CartItemSchema:
-    cart_item = await CartDAO.change_item_in_cart(
-        db=db, user=user, cart=cart, item=item
-    )
+    return await storage.change_item(db=db, user=user, item=item)
 
-    return CartItemSchema.model_validate(cart_item)
+
+@router.put("/items", status_code=status.HTTP_200_OK)
+async def update_cart_items(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
+        update_data: CartItemsUpdateSchema,
+) -> CartOutSchema:
+    return await storage.update_items(db=db, user=user, update_data=update_data)
 
 
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
 async def del_item_in_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
-        cart: Annotated[Cart, Depends(get_cart_info)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
         slug: Annotated[str, Path()],
 ):
-    await CartDAO.del_item_from_cart(db=db, slug=slug, user=user, cart=cart)
+    await storage.remove_item(db=db, user=user, slug=slug)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
-        cart: Annotated[Cart, Depends(get_cart_info)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+        storage: Annotated[CartStorage, Depends(get_cart_storage)],
 ):
-    await CartDAO.clear_cart(db=db, user=user, cart=cart)
-
+    await storage.clear(db=db, user=user)
@@ -1,8 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
-from typing import Annotated, Optional
+from typing import Annotated, Literal, Optional
 
-from pydantic import Field, BaseModel, ConfigDict
+from pydantic import Field, BaseModel, ConfigDict, model_validator
 
 
 class CartSchema(BaseModel):
@@ -39,3 +39,34 @@ class CartItemChangeSchema(BaseModel):
     quantity: Annotated[int, Field(default=1, ge=0, description="Количество товара для добавления в корзину")]
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class CartItemQuantitySchema(BaseModel):
+    product_slug: Annotated[str, Field(..., description='Slug товара')]
+    quantity: Annotated[int, Field(..., description="Количество товара (в режиме delta — изменение количества)")]
+
+
+class CartItemsUpdateSchema(BaseModel):
+    mode: Annotated[
+        Literal["replace", "delta"],
+        Field(default="replace", description="replace — items задаёт всё содержимое корзины, "
+                                             "delta — items прибавляется к текущему количеству")
+    ]
+    items: Annotated[list[CartItemQuantitySchema], Field(..., max_length=1000, description="Позиции корзины")]
+
+    @model_validator(mode="after")
+    def check_quantities(self) -> "CartItemsUpdateSchema":
+        if self.mode == "replace" and any(item.quantity < 0 for item in self.items):
+            raise ValueError("В режиме replace количество не может быть отрицательным")
+        return self
+
+    def target_quantities(self, current: dict[str, int]) -> dict[str, int]:
+        """
+        Итоговое количество по slug товара; товары с количеством 0 удаляются из корзины.
+
+        :param current: Текущее количество товаров в корзине по slug.
+        """
+        target = {} if self.mode == "replace" else dict(current)
+        for item in self.items:
+            target[item.product_slug] = target.get(item.product_slug, 0) + item.quantity
+        return {slug: quantity for slug, quantity in target.items() if quantity > 0}
@@ -0,0 +1,479 @@
+import abc
+import asyncio
+import json
+import logging
+from datetime import datetime, UTC
+from typing import Any, Callable, Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import WatchError
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cart.dao import CartDAO
+from src.cart.dependencies import get_cart_info
+from src.cart.schemas import CartItemChangeSchema, CartItemSchema, CartItemsUpdateSchema, CartOutSchema
+from src.users.schemas import UserPrincipalSchema
+
+logger = logging.getLogger(__name__)
+
+
+class CartStorage(abc.ABC):
+    """
+    Хранилище корзин, которое использует роутер корзины и оформление заказа.
+    Выбирается настройкой CART_STORAGE.
+    """
+
+    @abc.abstractmethod
+    async def get_cart(self, db: AsyncSession, user: UserPrincipalSchema) -> CartOutSchema:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def add_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def change_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def update_items(self, db: AsyncSession, user: UserPrincipalSchema, update_data: CartItemsUpdateSchema) -> CartOutSchema:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def remove_item(self, db: AsyncSession, user: UserPrincipalSchema, slug: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def clear(self, db: AsyncSession, user: UserPrincipalSchema) -> None:
+        raise NotImplementedError
+
+    async def checkout_items(self, db: AsyncSession, user: UserPrincipalSchema) -> Optional[list[tuple[str, int]]]:
+        """
+        Позиции корзины для оформления заказа как пары (slug, количество).
+        None — позиции читаются из таблицы cart_items прямо в запросе оформления.
+        """
+        return None
+
+    async def after_checkout(self, user: UserPrincipalSchema, items: Optional[list[tuple[str, int]]]) -> None:
+        """
+        Вызывается после оформления заказа из позиций checkout_items.
+        """
+        return None
+
+
+class SqlCartStorage(CartStorage):
+    """
+    Корзины только в PostgreSQL, через CartDAO.
+    """
+
+    async def get_cart(self, db: AsyncSession, user: UserPrincipalSchema) -> CartOutSchema:
+        cart = await CartDAO.get_cart(db=db, user=user)
+        return CartOutSchema.model_validate(cart)
+
+    async def add_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        cart = await get_cart_info(db=db, user=user)
+        cart_item = await CartDAO.add_item_to_cart(db=db, user=user, cart=cart, item=item)
+        return CartItemSchema.model_validate(cart_item)
+
+    async def change_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        cart = await get_cart_info(db=db, user=user)
+        cart_item = await CartDAO.change_item_in_cart(db=db, user=user, cart=cart, item=item)
+        return CartItemSchema.model_validate(cart_item)
+
+    async def update_items(self, db: AsyncSession, user: UserPrincipalSchema, update_data: CartItemsUpdateSchema) -> CartOutSchema:
+        cart = await get_cart_info(db=db, user=user)
+        cart_items = await CartDAO.update_items(db=db, user=user, cart=cart, update_data=update_data)
+        return CartOutSchema(
+            id=cart.id,
+            user_id=cart.user_id,
+            updated_at=cart.updated_at,
+            cart_items=[CartItemSchema.model_validate(cart_item) for cart_item in cart_items],
+        )
+
+    async def remove_item(self, db: AsyncSession, user: UserPrincipalSchema, slug: str) -> None:
+        cart = await get_cart_info(db=db, user=user)
+        await CartDAO.del_item_from_cart(db=db, slug=slug, user=user, cart=cart)
+
+    async def clear(self, db: AsyncSession, user: UserPrincipalSchema) -> None:
+        cart = await get_cart_info(db=db, user=user)
+        await CartDAO.clear_cart(db=db, user=user, cart=cart)
+
+
+# Запись грязных корзин: корзины создаются для существующих пользователей,
+# позиции корзин заменяются текущим содержимым из Redis
+FLUSH_CARTS_SQL = text("""
+INSERT INTO carts (user_id)
+SELECT id FROM users WHERE id = ANY(CAST(:user_ids AS integer[]))
+ON CONFLICT (user_id) DO NOTHING
+""")
+FLUSH_DELETE_ITEMS_SQL = text("""
+DELETE FROM cart_items
+USING carts
+WHERE cart_items.cart_id = carts.id AND carts.user_id = ANY(CAST(:user_ids AS integer[]))
+""")
+FLUSH_INSERT_ITEMS_SQL = text("""
+INSERT INTO cart_items (cart_id, product_slug, product_name_snapshot, quantity, price_at_time, created_at)
+SELECT carts.id, items.slug, items.name, items.quantity, items.price, items.created_at
+FROM unnest(
+    CAST(:user_ids AS integer[]), CAST(:slugs AS varchar[]), CAST(:names AS varchar[]),
+    CAST(:quantities AS integer[]), CAST(:prices AS numeric[]), CAST(:created_at AS timestamptz[])
+) AS items(user_id, slug, name, quantity, price, created_at)
+JOIN carts ON carts.user_id = items.user_id
+""")
+
+
+# Заполняет хеш корзины снимком из БД, только если его ещё никто не создал:
+# параллельная загрузка не затирает уже сделанные в Redis изменения
+LOAD_CART_LUA = """
+if redis.call('HEXISTS', KEYS[1], ARGV[2]) == 0 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return redis.call('HGETALL', KEYS[1])
+"""
+
+# Уменьшает количество оформленных позиций на заказанное и удаляет позицию,
+# только если больше ничего не осталось: добавленное в корзину во время
+# оформления сохраняется. ARGV: user_id, затем пары slug, количество
+CHECKOUT_CART_LUA = """
+for i = 2, #ARGV, 2 do
+    local qty_field = 'qty:' .. ARGV[i]
+    if redis.call('HEXISTS', KEYS[1], qty_field) == 1 then
+        if redis.call('HINCRBY', KEYS[1], qty_field, -tonumber(ARGV[i + 1])) <= 0 then
+            redis.call('HDEL', KEYS[1], 'item:' .. ARGV[i], qty_field)
+        end
+    end
+end
+redis.call('SADD', KEYS[2], ARGV[1])
+"""
+
+
+class RedisCartStorage(CartStorage):
+    """
+    Активные корзины в Redis с отложенной записью в PostgreSQL.
+
+    Корзина пользователя — хеш "{prefix}:{user_id}": поле "meta" (id корзины
+    в БД), "item:{slug}" (снимок товара, JSON) и "qty:{slug}" (количество,
+    меняется HINCRBY). При первом обращении хеш заполняется из БД.
+    Изменённые корзины попадают во множество "{prefix}:dirty", фоновая
+    задача run_flusher пачками переписывает их позиции в cart_items.
+    Позиции, ещё не записанные в БД, имеют id 0.
+
+    Принимает любой клиент с API redis.asyncio и поддержкой EVAL: загрузка
+    корзины и оформление заказа выполняются Lua-скриптами, поэтому fakeredis
+    подходит только с установленным lupa (fakeredis[lua]).
+    """
+
+    META = "meta"
+    # Попыток update_items, если корзину меняют параллельно
+    UPDATE_ATTEMPTS = 5
+
+    def __init__(
+        self,
+        redis,
+        session_factory: Callable[[], AsyncSession],
+        prefix: str = "cart",
+        ttl: int = 30 * 24 * 60 * 60,
+    ):
+        self.redis = redis
+        self.session_factory = session_factory
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def cart_key(self, user_id: int) -> str:
+        return f"{self.prefix}:{user_id}"
+
+    @property
+    def dirty_key(self) -> str:
+        return f"{self.prefix}:dirty"
+
+    @staticmethod
+    def _decode(value: Any) -> str:
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _parse(self, user_id: int, data: dict) -> CartOutSchema:
+        fields = {self._decode(key): self._decode(value) for key, value in data.items()}
+        meta = json.loads(fields[self.META])
+
+        items = []
+        for field, value in fields.items():
+            if not field.startswith("item:"):
+                continue
+            slug = field.removeprefix("item:")
+            quantity = int(fields.get(f"qty:{slug}", 0))
+            if quantity > 0:
+                items.append(CartItemSchema.model_validate({**json.loads(value), "quantity": quantity}))
+
+        items.sort(key=lambda cart_item: cart_item.created_at)
+        return CartOutSchema(
+            id=meta["cart_id"],
+            user_id=user_id,
+            updated_at=max((cart_item.updated_at for cart_item in items if cart_item.updated_at), default=None),
+            cart_items=items,
+        )
+
+    def _has_meta(self, data: dict) -> bool:
+        return self.META in data or self.META.encode() in data
+
+    async def _load(self, db: AsyncSession, user: UserPrincipalSchema) -> CartOutSchema:
+        key = self.cart_key(user.id)
+        data = await self.redis.hgetall(key)
+        if self._has_meta(data):
+            return self._parse(user.id, data)
+
+        cart = CartOutSchema.model_validate(await CartDAO.get_cart(db=db, user=user))
+        mapping = [self.META, json.dumps({"cart_id": cart.id})]
+        for cart_item in cart.cart_items:
+            mapping += [
+                f"item:{cart_item.product_slug}", cart_item.model_dump_json(exclude={"quantity"}),
+                f"qty:{cart_item.product_slug}", cart_item.quantity,
+            ]
+        data = await self.redis.eval(LOAD_CART_LUA, 1, key, self.ttl, *mapping)
+        return self._parse(user.id, dict(zip(data[::2], data[1::2])))
+
+    async def _write(self, user_id: int, cart_item: CartItemSchema, quantity_delta: Optional[int] = None) -> int:
+        """
+        Сохраняет снимок позиции и её количество: прибавляет quantity_delta
+        или, если он не задан, устанавливает cart_item.quantity.
+        Возвращает итоговое количество.
+        """
+        key = self.cart_key(user_id)
+        slug = cart_item.product_slug
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, f"item:{slug}", cart_item.model_dump_json(exclude={"quantity"}))
+            if quantity_delta is None:
+                pipe.hset(key, f"qty:{slug}", cart_item.quantity)
+            else:
+                pipe.hincrby(key, f"qty:{slug}", quantity_delta)
+            pipe.expire(key, self.ttl)
+            pipe.sadd(self.dirty_key, user_id)
+            _, quantity, *_ = await pipe.execute()
+        return cart_item.quantity if quantity_delta is None else int(quantity)
+
+    async def _remove(self, user_id: int, slugs: list[str]) -> None:
+        if not slugs:
+            return
+        key = self.cart_key(user_id)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(key, *(f"{prefix}:{slug}" for slug in slugs for prefix in ("item", "qty")))
+            pipe.sadd(self.dirty_key, user_id)
+            await pipe.execute()
+
+    @staticmethod
+    def _find(cart: CartOutSchema, slug: str) -> Optional[CartItemSchema]:
+        return next((cart_item for cart_item in cart.cart_items if cart_item.product_slug == slug), None)
+
+    async def get_cart(self, db: AsyncSession, user: UserPrincipalSchema) -> CartOutSchema:
+        return await self._load(db, user)
+
+    async def add_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        cart = await self._load(db, user)
+        product = await CartDAO._get_product(db=db, slug=item.product_slug)
+        existing_item = self._find(cart, item.product_slug)
+
+        total_quantity = item.quantity + (existing_item.quantity if existing_item else 0)
+        if total_quantity > product.stock:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Товара в наличии {product.stock} шт. Вы пытаетесь заказать {total_quantity}"
+            )
+
+        now = datetime.now(UTC)
+        cart_item = existing_item or CartItemSchema(
+            id=0,
+            cart_id=cart.id,
+            product_slug=item.product_slug,
+            product_name_snapshot=product.name,
+            price_at_time=product.price,
+            quantity=0,
+            created_at=now,
+        )
+        cart_item = cart_item.model_copy(update={"updated_at": now})
+        quantity = await self._write(user.id, cart_item, quantity_delta=item.quantity)
+        return cart_item.model_copy(update={"quantity": quantity})
+
+    async def change_item(self, db: AsyncSession, user: UserPrincipalSchema, item: CartItemChangeSchema) -> CartItemSchema:
+        cart = await self._load(db, user)
+        existing_item = self._find(cart, item.product_slug)
+        if existing_item is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Товар '{item.product_slug}' не найден в корзине."
+            )
+
+        if item.quantity == 0:
+            await self._remove(user.id, [item.product_slug])
+            return existing_item.model_copy(update={"quantity": 0})
+
+        product = await CartDAO._get_product(db=db, slug=item.product_slug)
+        if item.quantity > product.stock:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Товара в наличии {product.stock} шт. Вы пытаетесь установить {item.quantity}"
+            )
+
+        cart_item = existing_item.model_copy(
+            update={"quantity": item.quantity, "updated_at": datetime.now(UTC)}
+        )
+        await self._write(user.id, cart_item)
+        return cart_item
+
+    async def update_items(self, db: AsyncSession, user: UserPrincipalSchema, update_data: CartItemsUpdateSchema) -> CartOutSchema:
+        await self._load(db, user)
+        key = self.cart_key(user.id)
+        # Разница считается от прочитанного хеша и записывается под WATCH:
+        # если корзину изменили между чтением и записью (add_item, оформление
+        # заказа), транзакция отменяется и пересчитывается заново
+        for _ in range(self.UPDATE_ATTEMPTS):
+            async with self.redis.pipeline(transaction=True) as pipe:
+                await pipe.watch(key)
+                data = await pipe.hgetall(key)
+                if not self._has_meta(data):
+                    # Хеш истёк между загрузкой и чтением
+                    await pipe.reset()
+                    await self._load(db, user)
+                    continue
+                cart = self._parse(user.id, data)
+                current_items = {cart_item.product_slug: cart_item for cart_item in cart.cart_items}
+                target = update_data.target_quantities(
+                    {slug: cart_item.quantity for slug, cart_item in current_items.items()}
+                )
+                products = await CartDAO._get_products_for_quantities(db=db, quantities=target)
+
+                now = datetime.now(UTC)
+                pipe.multi()
+                removed_slugs = [slug for slug in current_items if slug not in target]
+                if removed_slugs:
+                    pipe.hdel(key, *(f"{prefix}:{slug}" for slug in removed_slugs for prefix in ("item", "qty")))
+                for slug, quantity in target.items():
+                    cart_item = current_items.get(slug)
+                    if cart_item is not None and cart_item.quantity == quantity:
+                        continue
+                    cart_item = (cart_item or CartItemSchema(
+                        id=0,
+                        cart_id=cart.id,
+                        product_slug=slug,
+                        product_name_snapshot=products[slug].name,
+                        price_at_time=products[slug].price,
+                        quantity=0,
+                        created_at=now,
+                    )).model_copy(update={"updated_at": now})
+                    pipe.hset(key, f"item:{slug}", cart_item.model_dump_json(exclude={"quantity"}))
+                    if update_data.mode == "delta":
+                        pipe.hincrby(key, f"qty:{slug}", quantity - cart_item.quantity)
+                    else:
+                        pipe.hset(key, f"qty:{slug}", quantity)
+                pipe.expire(key, self.ttl)
+                pipe.sadd(self.dirty_key, user.id)
+                try:
+                    await pipe.execute()
+                except WatchError:
+                    continue
+            return await self._load(db, user)
+
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Корзина изменилась во время обновления, повторите попытку",
+        )
+
+    async def remove_item(self, db: AsyncSession, user: UserPrincipalSchema, slug: str) -> None:
+        cart = await self._load(db, user)
+        if self._find(cart, slug) is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Такого товара в корзине не найдено"
+            )
+        await self._remove(user.id, [slug])
+
+    async def clear(self, db: AsyncSession, user: UserPrincipalSchema) -> None:
+        cart = await self._load(db, user)
+        # Хеш не удаляется целиком: иначе следующее чтение снова загрузило бы
+        # из БД позиции, которые ещё не успели удалить при записи
+        await self._remove(user.id, [cart_item.product_slug for cart_item in cart.cart_items])
+
+    async def checkout_items(self, db: AsyncSession, user: UserPrincipalSchema) -> list[tuple[str, int]]:
+        cart = await self._load(db, user)
+        return [(cart_item.product_slug, cart_item.quantity) for cart_item in cart.cart_items]
+
+    async def after_checkout(self, user: UserPrincipalSchema, items: Optional[list[tuple[str, int]]]) -> None:
+        if not items:
+            return
+        args = [arg for slug, quantity in items for arg in (slug, quantity)]
+        await self.redis.eval(CHECKOUT_CART_LUA, 2, self.cart_key(user.id), self.dirty_key, user.id, *args)
+
+    async def flush(self, batch_size: int = 500) -> int:
+        """
+        Записывает в БД до batch_size изменённых корзин одной транзакцией.
+        При любой ошибке, в том числе отмене, корзины возвращаются во множество изменённых.
+        Возвращает число корзин, взятых из множества изменённых.
+        """
+        raw_ids = await self.redis.spop(self.dirty_key, batch_size)
+        user_ids = sorted({int(self._decode(user_id)) for user_id in raw_ids or ()})
+        if not user_ids:
+            return 0
+
+        try:
+            carts: dict[int, CartOutSchema] = {}
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.hgetall(self.cart_key(user_id))
+                for user_id, data in zip(user_ids, await pipe.execute()):
+                    # Истёкшую корзину не с чем сверять: в БД остаётся последняя записанная
+                    if self._has_meta(data):
+                        carts[user_id] = self._parse(user_id, data)
+
+            items = [
+                (user_id, cart_item)
+                for user_id, cart in carts.items()
+                for cart_item in cart.cart_items
+            ]
+            params = {
+                "user_ids": [user_id for user_id, _ in items],
+                "slugs": [cart_item.product_slug for _, cart_item in items],
+                "names": [cart_item.product_name_snapshot for _, cart_item in items],
+                "quantities": [cart_item.quantity for _, cart_item in items],
+                "prices": [cart_item.price_at_time for _, cart_item in items],
+                "created_at": [cart_item.created_at for _, cart_item in items],
+            }
+            async with self.session_factory() as db:
+                await db.execute(FLUSH_CARTS_SQL, {"user_ids": list(carts)})
+                await db.execute(FLUSH_DELETE_ITEMS_SQL, {"user_ids": list(carts)})
+                if items:
+                    await db.execute(FLUSH_INSERT_ITEMS_SQL, params)
+                await db.commit()
+        except BaseException:
+            # Взятые SPOP корзины ещё не записаны: при любой ошибке, в том числе
+            # отмене при остановке, они возвращаются во множество изменённых
+            await self.redis.sadd(self.dirty_key, *user_ids)
+            raise
+        return len(user_ids)
+
+    async def run_flusher(self, interval: float, batch_size: int = 500) -> None:
+        """
+        Фоновая запись изменённых корзин в БД, запускается в lifespan.
+        """
+        while True:
+            try:
+                while await self.flush(batch_size) >= batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Cart flush failed, retrying later", exc_info=True)
+            await asyncio.sleep(interval)
+
+
+_cart_storage: CartStorage = SqlCartStorage()
+
+
+def set_cart_storage(storage: CartStorage) -> None:
+    global _cart_storage
+    _cart_storage = storage
+
+
+def get_cart_storage() -> CartStorage:
+    """
+    Зависимость FastAPI: хранилище корзин, выбранное в lifespan.
+    """
+    return _cart_storage
@@ -1,9 +1,11 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.cache.decorator import invalidate_tags
 from src.categories.models import Category
 from src.categories.schemas import CategorySchema
 from src.dao.base_dao import BaseDao
 from src.dependecies.dependencies import check_unique_slug
+from src.products.cache import PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG, category_tag
 
 
 class CategoryDAO(BaseDao):
@@ -30,5 +32,15 @@ class CategoryDAO(BaseDao):
             )
 
         updated_category = await cls.update(db=db, instance=category, **data)
+        await invalidate_tags(category_tag(updated_category.id))
 
         return updated_category
+
+    @classmethod
+    async def delete(cls, db: AsyncSession, obj: Category) -> None:
+        """
+        Удаляет категорию. Товары остаются без категории, поэтому
+        сбрасываются и зависящие от них списки.
+        """
+        await super().delete(db=db, obj=obj)
+        await invalidate_tags(category_tag(obj.id), PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG)
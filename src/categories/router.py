@@ -9,23 +9,24 @@ from src.categories.schemas import CategorySchema, CategoryOutSchema
 from src.database import get_db
 from src.dependecies.dependencies import get_instance_by_slug
 from src.users.dependencies import check_user_is_admin
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
+from src.utils.responses import json_response
 
 router = APIRouter(prefix="/categories", tags=["category"])
 
 
-@router.get("/", status_code=status.HTTP_200_OK)
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[CategoryOutSchema])
 async def get_all_categories(
     db: Annotated[AsyncSession, Depends(get_db)],
-) -> list[CategoryOutSchema]:
+) -> Response:
     categories = await CategoryDAO.get_all(db=db)
-    return [CategoryOutSchema.model_validate(category) for category in categories]
+    return json_response(list[CategoryOutSchema], categories)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_category(
     db: Annotated[AsyncSession, Depends(get_db)],
-    user: Annotated[User, Depends(check_user_is_admin)],
+    user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
     new_category: CategorySchema,
     response: Response,
 ) -> CategoryOutSchema:
@@ -39,7 +40,7 @@ async def create_category(
 @router.put("/{slug}", status_code=status.HTTP_200_OK)
 async def update_category(
     db: Annotated[AsyncSession, Depends(get_db)],
-    user: Annotated[User, Depends(check_user_is_admin)],
+    user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
     category: Annotated[Category, Depends(get_instance_by_slug(Category))],
     category_data: CategorySchema,
 ) -> CategoryOutSchema:
@@ -52,7 +53,7 @@ async def update_category(
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(
     db: Annotated[AsyncSession, Depends(get_db)],
-    user: Annotated[User, Depends(check_user_is_admin)],
+    user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
     category: Annotated[Category, Depends(get_instance_by_slug(Category))],
 ) -> None:
     await CategoryDAO.delete(db=db, obj=category)
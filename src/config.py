@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic import BaseModel
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -13,6 +14,53 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
 
+    REDIS_URL: str = "redis://localhost"
+    CACHE_PREFIX: str = "fastapi-cache"
+    # Локальный (в памяти воркера) уровень кэша перед Redis
+    CACHE_LOCAL_MAX_ENTRIES: int = 10_000
+    CACHE_LOCAL_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_LOCAL_TTL: int = 60
+    # Сколько секунд после истечения записи каталога отдавать её устаревшую копию
+    CACHE_STALE_TTL: int = 300
+
+    # Хранилище корзин: "sql" — только PostgreSQL, "redis" — Redis с отложенной записью в БД
+    CART_STORAGE: Literal["sql", "redis"] = "sql"
+    CART_REDIS_PREFIX: str = "cart"
+    CART_REDIS_TTL: int = 30 * 24 * 60 * 60
+    CART_FLUSH_INTERVAL: float = 5.0
+    CART_FLUSH_BATCH: int = 500
+
+    # Запоминать пользователя, корзину и товары в пределах одного запроса
+    REQUEST_IDENTITY_CACHE: bool = True
+
+    # Кэш аутентифицированных пользователей по хешу токена
+    PRINCIPAL_CACHE_ENABLED: bool = True
+    PRINCIPAL_CACHE_TTL: int = 60
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10_000
+    PRINCIPAL_CACHE_REDIS: bool = False
+    # Класть is_admin в токен: проверка прав без БД, но смена прав
+    # через set-admin применяется только к новым токенам
+    JWT_EMBED_IS_ADMIN: bool = False
+
+    # Стоимость bcrypt; хеши с другой стоимостью пересчитываются при входе
+    BCRYPT_ROUNDS: int = 12
+    # Потоки для bcrypt и предел одновременных операций, сверх которого — 503
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Загрузка картинок товаров: предел размера файла, ширины уменьшенных
+    # копий для srcset, качество WebP и число процессов конвертации
+    IMAGE_MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    IMAGE_WIDTHS: list[int] = [320, 640, 1280]
+    IMAGE_WEBP_QUALITY: int = 80
+    IMAGE_PROCESS_WORKERS: int = 2
+    # Уменьшенные копии для /images/{name}: каталог кэша, предел его размера,
+    # допустимые ширины и качества (запрошенные округляются до них)
+    IMAGE_CACHE_DIR: Path = BASE_DIR / "image_cache"
+    IMAGE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    IMAGE_RESIZE_WIDTHS: list[int] = [160, 320, 480, 640, 960, 1280, 1920]
+    IMAGE_RESIZE_QUALITIES: list[int] = [60, 80]
+
     @property
     def base_url(self):
         return f"postgresql+asyncpg://{self.DB_USERNAME}:{self.DB_PASSWORD}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
@@ -39,6 +87,12 @@ class AuthJWT(BaseModel):
     public_key_path: Path = BASE_DIR / "certificates" / "jwt-public.pem"
     algorithm: str = "RS256"
     access_token_expire_minutes: int = 30
+    # kid текущей пары ключей, пишется в заголовок токена
+    key_id: str = "main"
+    # Открытые ключи прежних пар по kid: токены, подписанные ими, принимаются до истечения
+    previous_public_key_paths: dict[str, Path] = {}
+    # Сколько проверенных токенов запоминать до их истечения
+    verified_cache_size: int = 10_000
 
 
 settings = Settings()
@@ -0,0 +1,58 @@
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+CONTEXT_KEY = "request_context"
+
+
+@dataclass
+class RequestContext:
+    """
+    Контекст одного запроса, хранится в session.info сессии из get_db.
+
+    Запоминает пользователя, корзину и товары, уже загруженные зависимостями
+    и DAO, чтобы повторные обращения в том же запросе не ходили в БД,
+    и считает запросы, выполненные через сессию. После отката транзакции
+    объекты сессии просрочены, поэтому запомненное сбрасывается.
+    """
+    enabled: bool = True
+    users: dict[int, Any] = field(default_factory=dict)
+    # Корзины по user_id
+    carts: dict[int, Any] = field(default_factory=dict)
+    # Товары по slug
+    products: dict[str, Any] = field(default_factory=dict)
+    queries: int = 0
+
+    def clear(self) -> None:
+        self.users.clear()
+        self.carts.clear()
+        self.products.clear()
+
+    def _count_query(self, orm_execute_state) -> None:
+        self.queries += 1
+
+
+def attach_request_context(session: AsyncSession, enabled: bool = True) -> RequestContext:
+    """
+    Создаёт контекст запроса для сессии.
+
+    :param enabled: запоминать ли сущности (запросы считаются всегда).
+    """
+    context = RequestContext(enabled=enabled)
+    session.info[CONTEXT_KEY] = context
+    event.listen(session.sync_session, "do_orm_execute", context._count_query)
+    event.listen(session.sync_session, "after_rollback", lambda _: context.clear())
+    return context
+
+
+def get_request_context(session: AsyncSession) -> Optional[RequestContext]:
+    """
+    Контекст запроса сессии или None, если сессия создана не в get_db
+    или запоминание выключено.
+    """
+    context = session.info.get(CONTEXT_KEY)
+    if context is None or not context.enabled:
+        return None
+    return context
@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, Asyn
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 from src.config import settings
+from src.dao.context import attach_request_context
 
 async_engine = create_async_engine(
     settings.base_url, echo=True, pool_size=5, max_overflow=10
@@ -21,6 +22,7 @@ async_session = async_sessionmaker(
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
+        attach_request_context(session, enabled=settings.REQUEST_IDENTITY_CACHE)
         yield session
 
 
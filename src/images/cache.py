@@ -0,0 +1,188 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from functools import partial
+from pathlib import Path
+from typing import Optional
+
+from src.config import settings
+from src.images.processing import get_image_executor, resize_to_webp
+
+# Размер куска при хешировании исходного файла
+DIGEST_CHUNK_SIZE = 1024 * 1024
+# Столько секунд после выдачи копия не вытесняется: путь уже отдан
+# запросу, и файл ещё должен открыть FileResponse
+EVICT_GRACE_SECONDS = 10
+# Временные файлы старше этого остались от прерванной конвертации;
+# более свежие может прямо сейчас писать другой воркер
+STALE_TMP_SECONDS = 3600
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(DIGEST_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ImageVariantCache:
+    """
+    Дисковый кэш уменьшенных копий картинок.
+
+    Копия адресуется по содержимому: ключ — sha256 от хеша исходного файла,
+    ширины и качества, файл лежит в "{directory}/{ключ[:2]}/{ключ}.webp".
+    Одинаковые исходники делят копии, а ключ служит сильным ETag.
+    Хеш исходника запоминается по (mtime, размер) и пересчитывается
+    только при изменении файла.
+
+    Суммарный размер ограничен max_bytes: сверх него удаляются давно
+    не запрошенные копии (LRU), кроме выданных за последние
+    EVICT_GRACE_SECONDS. Порядок восстанавливается при первом
+    обращении по времени доступа файлов. Одновременные запросы одной
+    копии ждут одну конвертацию.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int, max_sources: int = 10_000):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_sources = max_sources
+        # ключ -> (размер файла, когда выдан), от давно запрошенных к недавним
+        self._entries: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self._size = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._pending: dict[str, asyncio.Future] = {}
+        # путь исходника -> (mtime_ns, размер, sha256)
+        self._sources: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evicted = 0
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.webp"
+
+    def _scan(self) -> list[tuple[float, str, int]]:
+        entries = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        for path in self.directory.glob("*/*"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Удалена другим воркером
+                continue
+            if path.suffix == ".tmp":
+                if stat.st_mtime < now - STALE_TMP_SECONDS:
+                    path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_atime, path.stem, stat.st_size))
+        return sorted(entries)
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for _, key, size in await asyncio.to_thread(self._scan):
+                self._entries[key] = (size, 0.0)
+                self._size += size
+            self._loaded = True
+            self._evict()
+
+    async def _source_digest(self, source: Path) -> str:
+        stat = await asyncio.to_thread(source.stat)
+        cached = self._sources.get(str(source))
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            self._sources.move_to_end(str(source))
+            return cached[2]
+
+        digest = await asyncio.to_thread(file_digest, source)
+        self._sources[str(source)] = (stat.st_mtime_ns, stat.st_size, digest)
+        self._sources.move_to_end(str(source))
+        while len(self._sources) > self.max_sources:
+            self._sources.popitem(last=False)
+        return digest
+
+    def _evict(self) -> None:
+        grace = time.monotonic() - EVICT_GRACE_SECONDS
+        while self._size > self.max_bytes and self._entries:
+            key, (size, served_at) = next(iter(self._entries.items()))
+            # Дальше по порядку только выданные ещё позже
+            if served_at > grace:
+                break
+            del self._entries[key]
+            self._size -= size
+            self.evicted += 1
+            # Удаление синхронное: если отложить его, оно может удалить
+            # копию, заново сконвертированную за это время
+            self._path(key).unlink(missing_ok=True)
+
+    async def _render(self, source: Path, key: str, width: Optional[int], quality: int) -> None:
+        size = await asyncio.get_running_loop().run_in_executor(
+            get_image_executor(settings.IMAGE_PROCESS_WORKERS),
+            partial(resize_to_webp, str(source), str(self._path(key)), width, quality),
+        )
+        self._entries[key] = (size, time.monotonic())
+        self._size += size
+        self._evict()
+
+    def _forget_pending(self, key: str, task: asyncio.Future) -> None:
+        self._pending.pop(key, None)
+        # Ошибку уже получили ожидающие; без этого при отменённых
+        # ожидающих asyncio пишет "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    async def get(self, source: Path, width: Optional[int], quality: int) -> tuple[Path, str]:
+        """
+        Путь к копии source шириной width и качеством quality, конвертирует при промахе.
+
+        :return: путь к файлу и ключ копии (для ETag).
+        """
+        await self._ensure_loaded()
+        source_digest = await self._source_digest(source)
+        key = hashlib.sha256(f"{source_digest}:{width}:{quality}".encode()).hexdigest()
+        path = self._path(key)
+
+        if key in self._entries:
+            if path.exists():
+                self._entries[key] = (self._entries[key][0], time.monotonic())
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return path, key
+            # Файл удалили в обход кэша
+            self._size -= self._entries.pop(key)[0]
+
+        task = self._pending.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._render(source, key, width, quality))
+            self._pending[key] = task
+            task.add_done_callback(partial(self._forget_pending, key))
+        else:
+            self.coalesced += 1
+        # Отключение одного клиента не отменяет конвертацию для остальных
+        await asyncio.shield(task)
+        return path, key
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evicted": self.evicted,
+        }
+
+
+image_cache = ImageVariantCache(
+    directory=settings.IMAGE_CACHE_DIR,
+    max_bytes=settings.IMAGE_CACHE_MAX_BYTES,
+)
@@ -0,0 +1,90 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+# Больше пикселей Pillow не декодирует (защита от «бомб» распаковки)
+MAX_IMAGE_PIXELS = 40_000_000
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_image_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Пул процессов для конвертации картинок, создаётся при первой загрузке.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def convert_to_webp(
+    source: str, target_dir: str, name: str, widths: tuple[int, ...], quality: int
+) -> list[tuple[int, str]]:
+    """
+    Выполняется в процессе пула: декодирует загруженный файл, сохраняет его
+    в WebP исходного размера ("{name}.webp") и уменьшенные копии
+    "{name}-{width}w.webp" для ширин меньше исходной.
+
+    :return: пары (ширина, имя файла), от большей ширины к меньшей.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    target = Path(target_dir)
+
+    with Image.open(source) as original:
+        # Поворот по EXIF, иначе фото с телефона окажутся повёрнутыми
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        filename = f"{name}.webp"
+        image.save(target / filename, "WEBP", quality=quality, method=4)
+        variants = [(image.width, filename)]
+
+        for width in sorted(set(widths), reverse=True):
+            if width >= image.width:
+                continue
+            height = max(round(image.height * width / image.width), 1)
+            filename = f"{name}-{width}w.webp"
+            image.resize((width, height), Image.Resampling.LANCZOS).save(
+                target / filename, "WEBP", quality=quality, method=4
+            )
+            variants.append((width, filename))
+
+    return variants
+
+
+def resize_to_webp(source: str, target: str, width: Optional[int], quality: int) -> int:
+    """
+    Выполняется в процессе пула: сохраняет картинку шириной width
+    (без увеличения; None — исходная ширина) в WebP по пути target.
+    Файл пишется во временный и переименовывается, так что читатели
+    не видят недописанных файлов. Имя временного файла включает pid:
+    одну копию могут одновременно писать несколько воркеров.
+
+    :return: размер записанного файла в байтах.
+    """
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    target_path = Path(target)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target_path.with_name(f"{target_path.name}.{os.getpid()}.tmp")
+
+    try:
+        with Image.open(source) as original:
+            image = ImageOps.exif_transpose(original)
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            if width is not None and width < image.width:
+                height = max(round(image.height * width / image.width), 1)
+                image = image.resize((width, height), Image.Resampling.LANCZOS)
+            image.save(tmp_path, "WEBP", quality=quality, method=4)
+        os.replace(tmp_path, target_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return target_path.stat().st_size
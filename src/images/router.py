@@ -1,28 +1,142 @@
-import shutil
-import aiofiles
-from typing import Annotated
+import asyncio
+import re
+from functools import partial
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, UploadFile, File, Depends
+import aiofiles
+from PIL import Image, UnidentifiedImageError
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query, Header, Response, status
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.config import BASE_DIR
-from src.images.utils import generate_safe_filename
-from src.users.models import User
+from src.config import BASE_DIR, settings
+from src.database import get_db
+from src.images.cache import image_cache
+from src.images.processing import convert_to_webp, get_image_executor
+from src.images.utils import UploadLimitRoute, generate_safe_filename
+from src.products.dao import ProductDAO
+from src.products.schemas import ProductUpdateSchema
+from src.users.schemas import UserPrincipalSchema
 from src.users.dependencies import check_user_is_admin
 
-router = APIRouter(prefix="/images", tags=["Загрузка картинки"])
+router = APIRouter(prefix="/images", tags=["Загрузка картинки"], route_class=UploadLimitRoute)
+
+IMAGES_DIR = BASE_DIR / "src" / "static" / "images"
+IMAGES_URL = "/static/images"
+
+# Размер куска при копировании загрузки на диск
+CHUNK_SIZE = 64 * 1024
+
+# Имена файлов из IMAGES_DIR, без каталогов
+IMAGE_NAME_RE = re.compile(r"^[\w-]+\.(webp|jpe?g|png)$")
+
+# Загруженные файлы не перезаписываются (имя — uuid), а ETag зависит
+# от содержимого, поэтому ответ можно кэшировать навсегда
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 @router.post("/products")
-async def add_product_img(user: Annotated[User, Depends(check_user_is_admin)],
-                          file: UploadFile = File(...)):
+async def add_product_img(db: Annotated[AsyncSession, Depends(get_db)],
+                          user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+                          file: UploadFile = File(...),
+                          product_slug: Annotated[Optional[str], Query(description="Товар, которому назначить картинку")] = None):
     image_name = generate_safe_filename(file)
-    file_path = BASE_DIR / "src" / "static" / "images" / f"{image_name}.webp"
+    # Товар проверяется до конвертации, чтобы не оставлять файлы для несуществующего slug
+    product = await ProductDAO.get_by_slug(db=db, slug=product_slug) if product_slug is not None else None
+    IMAGES_DIR.mkdir(parents=True, exist_ok=True)
+    upload_path = IMAGES_DIR / f"{image_name}.upload"
+
+    try:
+        # Загрузка копируется кусками, целиком в памяти не держится
+        size = 0
+        async with aiofiles.open(upload_path, "wb") as buffer:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.IMAGE_MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Файл больше {settings.IMAGE_MAX_UPLOAD_BYTES} байт",
+                    )
+                await buffer.write(chunk)
+
+        # Декодирование и кодирование в WebP нагружают CPU — в отдельных процессах
+        try:
+            variants = await asyncio.get_running_loop().run_in_executor(
+                get_image_executor(settings.IMAGE_PROCESS_WORKERS),
+                partial(
+                    convert_to_webp, str(upload_path), str(IMAGES_DIR), image_name,
+                    tuple(settings.IMAGE_WIDTHS), settings.IMAGE_WEBP_QUALITY,
+                ),
+            )
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не удалось прочитать картинку")
+    finally:
+        upload_path.unlink(missing_ok=True)
 
-    async with aiofiles.open(file_path, "wb+") as buffer:
-        await buffer.write(await file.read())
+    image_url = f"{IMAGES_URL}/{variants[0][1]}"
+    srcset = ", ".join(f"{IMAGES_URL}/{filename} {width}w" for width, filename in variants)
+
+    if product is not None:
+        try:
+            await ProductDAO.update_product(
+                db=db,
+                product_data=ProductUpdateSchema(image_url=image_url, image_srcset=srcset),
+                product=product,
+            )
+        except BaseException:
+            for _, filename in variants:
+                (IMAGES_DIR / filename).unlink(missing_ok=True)
+            raise
 
     return {
         "status": "success",
-        "filename": f"{image_name}.webp",
-        "path": str(file_path.relative_to(BASE_DIR))
+        "filename": variants[0][1],
+        "path": str((IMAGES_DIR / variants[0][1]).relative_to(BASE_DIR)),
+        "url": image_url,
+        "srcset": srcset,
     }
+
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+async def get_image_cache_stats(
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+) -> dict:
+    return image_cache.snapshot()
+
+
+def snap_width(width: Optional[int]) -> Optional[int]:
+    """
+    Ближайшая допустимая ширина не меньше запрошенной (или наибольшая):
+    иначе каждая произвольная ширина — отдельная конвертация и копия в кэше.
+    """
+    if width is None:
+        return None
+    widths = sorted(settings.IMAGE_RESIZE_WIDTHS)
+    return next((allowed for allowed in widths if allowed >= width), widths[-1])
+
+
+def snap_quality(quality: int) -> int:
+    return min(settings.IMAGE_RESIZE_QUALITIES, key=lambda allowed: (abs(allowed - quality), -allowed))
+
+
+@router.get("/{name}")
+async def get_image(name: str,
+                    w: Annotated[Optional[int], Query(gt=0, description="Ширина")] = None,
+                    q: Annotated[int, Query(ge=1, le=100, description="Качество WebP")] = settings.IMAGE_WEBP_QUALITY,
+                    if_none_match: Annotated[Optional[str], Header()] = None):
+    source = IMAGES_DIR / name
+    if not IMAGE_NAME_RE.match(name) or not source.is_file():
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Картинка не найдена")
+
+    try:
+        path, key = await image_cache.get(source, width=snap_width(w), quality=snap_quality(q))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Не удалось прочитать картинку")
+
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if if_none_match is not None and (
+        if_none_match.strip() == "*" or etag in (tag.strip() for tag in if_none_match.split(","))
+    ):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(path, media_type="image/webp", headers=headers)
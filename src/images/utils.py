@@ -1,8 +1,15 @@
 import uuid
 import re
 from pathlib import Path
+from typing import Callable, Awaitable
 
-from fastapi import HTTPException, UploadFile
+from fastapi import HTTPException, UploadFile, Request, Response, status
+from fastapi.routing import APIRoute
+
+from src.config import settings
+
+# Запас на заголовки частей и границы multipart сверх размера самого файла
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
 
 
 def generate_safe_filename(file: UploadFile) -> str:
@@ -16,3 +23,45 @@ def generate_safe_filename(file: UploadFile) -> str:
         return new_filename
     except Exception as e:
         raise HTTPException(500, f"Error uploading file: {str(e)}")
+
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Тело запроса больше {max_bytes} байт",
+    )
+
+
+class UploadLimitRoute(APIRoute):
+    """
+    Маршрут с пределом размера тела запроса. FastAPI разбирает multipart
+    и сохраняет файл во временный до вызова обработчика, поэтому предел
+    проверяется раньше: по Content-Length сразу, а без него (chunked) —
+    по мере чтения тела.
+    """
+    max_body_bytes = settings.IMAGE_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES
+
+    def get_route_handler(self) -> Callable[[Request], Awaitable[Response]]:
+        handler = super().get_route_handler()
+        max_bytes = self.max_body_bytes
+
+        async def limited_handler(request: Request) -> Response:
+            content_length = request.headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > max_bytes:
+                raise _too_large(max_bytes)
+
+            received = 0
+            receive = request.receive
+
+            async def limited_receive():
+                nonlocal received
+                message = await receive()
+                if message["type"] == "http.request":
+                    received += len(message.get("body", b""))
+                    if received > max_bytes:
+                        raise _too_large(max_bytes)
+                return message
+
+            return await handler(Request(request.scope, limited_receive))
+
+        return limited_handler
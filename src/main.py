@@ -1,28 +1,100 @@
+import asyncio
 from collections.abc import AsyncIterator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 import uvicorn
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
 from redis import asyncio as aioredis
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.cache.backends import TaggedRedisBackend, TwoTierBackend
+from src.cache.coder import CompactJsonCoder
+from src.cache.key_builder import ParamsKeyBuilder
+from src.cache.metrics import MeteredBackend, cache_stats
+from src.cache.router import router as cache_router
 from src.cart.router import router as cart_router
+from src.cart.storage import RedisCartStorage, SqlCartStorage, set_cart_storage
+from src.database import async_session
 from src.categories.router import router as category_router
+from src.images.router import router as images_router
+from src.config import settings
 from src.middleware.cash_lifetime_middleware import CashLifetimeMiddleware
 from src.orders.router import router as order_router
 from src.pages.router import router as pages_router
 from src.products.router import router as product_router
+from src.products.suggest import product_index
+from src.users.principal import principal_cache
 from src.users.router import router as auth_router
 
 
+async def stop_task(task: asyncio.Task) -> None:
+    """
+    Отменяет фоновую задачу и дожидается её завершения.
+    """
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
-    redis = aioredis.from_url("redis://localhost")
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    redis = aioredis.from_url(settings.REDIS_URL)
+    cache_backend = TwoTierBackend(
+        TaggedRedisBackend(redis, prefix=settings.CACHE_PREFIX),
+        channel=f"{settings.CACHE_PREFIX}:invalidate",
+        max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+        max_bytes=settings.CACHE_LOCAL_MAX_BYTES,
+        local_ttl=settings.CACHE_LOCAL_TTL,
+        stats=cache_stats,
+    )
+    FastAPICache.init(
+        MeteredBackend(cache_backend, prefix=settings.CACHE_PREFIX),
+        prefix=settings.CACHE_PREFIX,
+        key_builder=ParamsKeyBuilder(),
+        coder=CompactJsonCoder,
+    )
+    cache_listener = asyncio.create_task(cache_backend.listen())
+
+    principal_cache.enabled = settings.PRINCIPAL_CACHE_ENABLED
+    principal_cache.ttl = settings.PRINCIPAL_CACHE_TTL
+    principal_cache.max_entries = settings.PRINCIPAL_CACHE_MAX_ENTRIES
+    principal_listener = None
+    if settings.PRINCIPAL_CACHE_REDIS:
+        principal_cache.redis = redis
+        principal_listener = asyncio.create_task(principal_cache.listen())
+
+    cart_flusher = None
+    if settings.CART_STORAGE == "redis":
+        cart_storage = RedisCartStorage(
+            redis,
+            session_factory=async_session,
+            prefix=settings.CART_REDIS_PREFIX,
+            ttl=settings.CART_REDIS_TTL,
+        )
+        set_cart_storage(cart_storage)
+        cart_flusher = asyncio.create_task(
+            cart_storage.run_flusher(settings.CART_FLUSH_INTERVAL, settings.CART_FLUSH_BATCH)
+        )
+
+    async with async_session() as db:
+        await product_index.load(db)
+    # Изменения индекса автодополнения рассылаются остальным воркерам
+    product_index.redis = redis
+    product_index.channel = f"{settings.CACHE_PREFIX}:product-index"
+    index_listener = asyncio.create_task(product_index.listen(async_session))
     yield
+    await stop_task(cache_listener)
+    await stop_task(index_listener)
+    if principal_listener is not None:
+        await stop_task(principal_listener)
+    if cart_flusher is not None:
+        await stop_task(cart_flusher)
+        # Изменения, накопленные после последней записи, не теряются при остановке
+        while await cart_storage.flush(settings.CART_FLUSH_BATCH):
+            pass
+        set_cart_storage(SqlCartStorage())
 
 
 app = FastAPI(lifespan=lifespan)
@@ -67,6 +139,8 @@ app_v1.include_router(category_router)
 app_v1.include_router(product_router)
 app_v1.include_router(order_router)
 app_v1.include_router(cart_router)
+app_v1.include_router(cache_router)
+app_v1.include_router(images_router)
 
 
 @app.get("/")
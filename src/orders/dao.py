@@ -1,22 +1,100 @@
 from decimal import Decimal
+from typing import NoReturn, Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import select, update, case, and_
+from sqlalchemy import select, update, case, and_, values, column, func, text, String, Integer
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload, joinedload
 
 from src.dao.base_dao import BaseDao
 from src.orders.models import Order, OrderItem
-from src.orders.schemas import OrderCreateSchema, OrderEnum, OrderItemSchema
+from src.orders.schemas import OrderCreateSchema, OrderEnum, OrderOutSchema, OrderItemOutSchema
 from src.products.models import Product
-from src.users.models import User
-from src.cart.dao import CartDAO
+from src.users.schemas import UserPrincipalSchema
+from src.cart.models import Cart, CartItem
+from src.cart.storage import CartStorage, get_cart_storage
+
+# Позиции корзины из cart_items
+CART_ROWS_FROM_TABLE = """
+    SELECT cart_items.product_slug AS slug, sum(cart_items.quantity)::integer AS quantity
+    FROM cart_items
+    JOIN carts ON carts.id = cart_items.cart_id
+    WHERE carts.user_id = :user_id
+    GROUP BY cart_items.product_slug
+"""
+
+# Позиции корзины, переданные параметрами (корзина хранится вне cart_items)
+CART_ROWS_FROM_PARAMS = """
+    SELECT items.slug, sum(items.quantity)::integer AS quantity
+    FROM unnest(CAST(:slugs AS varchar[]), CAST(:quantities AS integer[])) AS items(slug, quantity)
+    GROUP BY items.slug
+"""
+
+# Оформление заказа из корзины одним запросом: позиции корзины (cart_rows)
+# списываются условным UPDATE (reserved); заказ создаётся, только если
+# списаны все позиции, затем вставляются его позиции и очищается корзина.
+# Строка base гарантирует хотя бы одну строку результата: при неудаче
+# поля заказа в ней NULL, а cart_size показывает, была ли корзина пустой.
+CHECKOUT_SQL_TEMPLATE = """
+WITH cart_rows AS ({cart_rows}),
+reserved AS (
+    UPDATE products
+    SET stock = products.stock - cart_rows.quantity
+    FROM cart_rows
+    WHERE products.slug = cart_rows.slug AND products.stock >= cart_rows.quantity
+    RETURNING products.slug, products.name, products.price, cart_rows.quantity
+),
+new_order AS (
+    INSERT INTO orders (user_id, total_price, status)
+    SELECT :user_id, sum(reserved.price * reserved.quantity), CAST(:status AS orderenum)
+    FROM reserved
+    HAVING count(*) > 0 AND count(*) = (SELECT count(*) FROM cart_rows)
+    RETURNING id, user_id, total_price, status, created_at, updated_at
+),
+new_items AS (
+    INSERT INTO orders_items (order_id, product_slug, product_name_snapshot, quantity, price_at_time)
+    SELECT new_order.id, reserved.slug, reserved.name, reserved.quantity, reserved.price
+    FROM new_order CROSS JOIN reserved
+    RETURNING id, order_id, product_slug, product_name_snapshot, quantity, price_at_time
+),
+cleared AS (
+    DELETE FROM cart_items
+    USING carts, new_order
+    WHERE cart_items.cart_id = carts.id AND carts.user_id = :user_id
+)
+SELECT
+    (SELECT count(*) FROM cart_rows) AS cart_size,
+    new_order.id, new_order.user_id, new_order.total_price, new_order.status::text AS status,
+    new_order.created_at, new_order.updated_at,
+    new_items.id AS item_id, new_items.product_slug, new_items.product_name_snapshot,
+    new_items.quantity, new_items.price_at_time
+FROM (SELECT 1) AS base
+LEFT JOIN new_order ON TRUE
+LEFT JOIN new_items ON new_items.order_id = new_order.id
+"""
+
+# Блокирует строки товаров корзины по порядку slug перед CHECKOUT_SQL_TEMPLATE:
+# UPDATE ... FROM берёт блокировки в порядке плана соединения, и два заказа
+# с общими товарами могли бы заблокировать друг друга
+LOCK_PRODUCTS_SQL_TEMPLATE = """
+SELECT products.slug
+FROM products
+WHERE products.slug IN (SELECT cart_rows.slug FROM ({cart_rows}) AS cart_rows)
+ORDER BY products.slug
+FOR UPDATE
+"""
+
+CHECKOUT_FROM_CART_SQL = text(CHECKOUT_SQL_TEMPLATE.format(cart_rows=CART_ROWS_FROM_TABLE))
+CHECKOUT_FROM_ITEMS_SQL = text(CHECKOUT_SQL_TEMPLATE.format(cart_rows=CART_ROWS_FROM_PARAMS))
+LOCK_CART_PRODUCTS_SQL = text(LOCK_PRODUCTS_SQL_TEMPLATE.format(cart_rows=CART_ROWS_FROM_TABLE))
+LOCK_ITEM_PRODUCTS_SQL = text(LOCK_PRODUCTS_SQL_TEMPLATE.format(cart_rows=CART_ROWS_FROM_PARAMS))
 
 
 class OrderDAO(BaseDao):
 
     @classmethod
-    async def get_all_order(cls, db: AsyncSession, user: User) -> list[Order]:
+    async def get_all_order(cls, db: AsyncSession, user: UserPrincipalSchema) -> list[Order]:
         if user.is_admin:
             stmt = select(Order)
         else:
@@ -32,7 +110,7 @@ class OrderDAO(BaseDao):
     @classmethod
     async def get_user_order_by_id(
             cls, db: AsyncSession,
-            user: User,
+            user: UserPrincipalSchema,
             object_id: int
     ) -> Order:
         if user.is_admin:
@@ -57,63 +135,130 @@ class OrderDAO(BaseDao):
         return order
 
     @classmethod
-    async def create_order(
-            cls, db: AsyncSession, user: User, new_order: OrderCreateSchema
-    ) -> Order:
+    async def reserve_stock(
+            cls, db: AsyncSession, quantities: dict[str, int]
+    ) -> dict[str, tuple[str, Decimal]]:
+        """
+        Списывает остатки одним условным UPDATE products ... FROM (VALUES ...):
+        строка товара меняется, только если stock >= запрошенного количества,
+        поэтому параллельные заказы не могут уйти в минус.
+        Перед UPDATE строки товаров блокируются SELECT ... ORDER BY slug FOR UPDATE:
+        порядок, в котором UPDATE берёт блокировки, зависит от плана запроса,
+        а одинаковый порядок у всех заказов исключает взаимоблокировки.
+
+        Если списаны не все позиции, транзакция откатывается и поднимается
+        ошибка 400 со списком ненайденных товаров или товаров с нехваткой остатка.
+
+        :param quantities: Количество по slug товара.
+        :return: (название, цена) по slug списанных товаров.
+        """
+        await db.execute(
+            select(Product.id)
+            .where(Product.slug.in_(quantities))
+            .order_by(Product.slug)
+            .with_for_update()
+        )
+        requested = values(
+            column("slug", String),
+            column("quantity", Integer),
+            name="requested",
+        ).data(list(quantities.items()))
+        stmt = (
+            update(Product)
+            .where(
+                Product.slug == requested.c.slug,
+                Product.stock >= requested.c.quantity,
+            )
+            .values(stock=Product.stock - requested.c.quantity)
+            .returning(Product.slug, Product.name, Product.price)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(stmt)
+        reserved = {row.slug: (row.name, row.price) for row in result}
 
-        order = Order(
-            user_id=user.id, total_price=Decimal("0.00"), status=OrderEnum.pending
+        if len(reserved) == len(quantities):
+            return reserved
+
+        await db.rollback()
+        await cls._raise_short_items(
+            db=db,
+            quantities={slug: qty for slug, qty in quantities.items() if slug not in reserved},
         )
 
-        db.add(order)
-        await db.flush()
+    @classmethod
+    async def _raise_short_items(cls, db: AsyncSession, quantities: dict[str, int]) -> NoReturn:
+        """
+        Поднимает ошибку 400 со списком ненайденных товаров или товаров,
+        которых не хватает для заказа. Вызывается после отката неудавшегося списания.
 
-        slugs = [item.product_slug for item in new_order.order_items]
-        stmt = select(Product).where(Product.slug.in_(slugs))
-        result = await db.execute(stmt)
-        products = {product.slug: product for product in result.scalars().all()}
+        :param quantities: Запрошенное количество по slug товара.
+        """
+        result = await db.execute(
+            select(Product.slug, Product.name, Product.stock).where(Product.slug.in_(quantities))
+        )
+        found = {row.slug: row for row in result}
 
-        missing_slugs = [
-            item.product_slug
-            for item in new_order.order_items
-            if item.product_slug not in products
-        ]
+        missing_slugs = [slug for slug in quantities if slug not in found]
         if missing_slugs:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Товары с такими slugs не найдены: {', '.join(missing_slugs)}",
             )
 
-        order_items = []
-        total_price = 0
+        short_slugs = [slug for slug in quantities if found[slug].stock < quantities[slug]]
+        if not short_slugs:
+            # Остаток успели вернуть параллельной отменой заказа
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Остатки изменились во время оформления заказа, повторите попытку",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Недостаточно товара в остатках: " + ", ".join(
+                f"{found[slug].name} (запрошено {quantities[slug]}, остаток {found[slug].stock})"
+                for slug in short_slugs
+            ),
+        )
 
-        for item in new_order.order_items:
+    @classmethod
+    async def create_order(
+            cls, db: AsyncSession, user: UserPrincipalSchema, new_order: OrderCreateSchema
+    ) -> Order:
 
-            product = products[item.product_slug]
+        quantities: dict[str, int] = {}
+        for item in new_order.order_items:
+            quantities[item.product_slug] = quantities.get(item.product_slug, 0) + item.quantity
 
-            if item.quantity > product.stock:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Недостаточно товара в остатках: {product.name}. Остаток {product.stock}",
-                )
+        reserved = await cls.reserve_stock(db=db, quantities=quantities)
 
-            product.stock -= item.quantity
-            total_price += item.quantity * product.price
+        order_items = []
+        total_price = Decimal("0.00")
 
-            order_item = OrderItem(
-                order_id=order.id,
-                product_slug=product.slug,
-                product_name_snapshot=product.name,
-                quantity=item.quantity,
-                price_at_time=product.price,
+        for item in new_order.order_items:
+            name, price = reserved[item.product_slug]
+            total_price += item.quantity * price
+
+            order_items.append(
+                OrderItem(
+                    product_slug=item.product_slug,
+                    product_name_snapshot=name,
+                    quantity=item.quantity,
+                    price_at_time=price,
+                )
             )
 
-            order_items.append(order_item)
-
-        order.total_price = total_price
-
-        db.add_all(order_items)
-        await db.commit()
+        order = Order(
+            user_id=user.id,
+            total_price=total_price,
+            status=OrderEnum.pending,
+            order_items=order_items,
+        )
+        db.add(order)
+        try:
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
 
         user_order = await cls.get_user_order_by_id(
             db=db, user=user, object_id=order.id
@@ -122,7 +267,7 @@ class OrderDAO(BaseDao):
         return user_order
 
     @classmethod
-    async def cancel_order(cls, db: AsyncSession, user: User, object_id: int):
+    async def cancel_order(cls, db: AsyncSession, user: UserPrincipalSchema, object_id: int):
         order = await cls.get_user_order_by_id(db=db, user=user, object_id=object_id)
 
         if order.status in {OrderEnum.cancelled, OrderEnum.completed}:
@@ -162,29 +307,80 @@ class OrderDAO(BaseDao):
         return order
 
     @classmethod
-    async def create_order_from_cart(cls, db: AsyncSession, user: User):
-        """
-        Создание заказа на основе сформированной корзины пользователя
+    async def create_order_from_cart(
+            cls, db: AsyncSession, user: UserPrincipalSchema, cart_storage: Optional[CartStorage] = None
+    ) -> OrderOutSchema:
         """
-        # Получаем корзину пользователя с подгруженными товарами
-        cart = await CartDAO.get_cart(db=db, user=user)
+        Создание заказа на основе сформированной корзины пользователя.
 
-        if not cart.cart_items:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Корзина пуста")
+        Списание остатков, создание заказа и его позиций и очистка корзины
+        выполняются одним запросом CHECKOUT_FROM_CART_SQL в одной транзакции,
+        ответ собирается из RETURNING без повторного чтения заказа. Перед ним
+        строки товаров блокируются по порядку slug, как в reserve_stock.
+        Если хранилище корзин отдаёт позиции само (Redis), они передаются
+        в запрос параметрами и убираются из хранилища после фиксации.
 
-        # Создаем список схем OrderItemSchema для создания заказа
-        order_items = [
-            OrderItemSchema(
-                product_slug=cart_item.product_slug,
-                quantity=cart_item.quantity
-            )
-            for cart_item in cart.cart_items
-        ]
-        # Создаем схему OrderCreateSchema для создания заказа
-        new_order = OrderCreateSchema(order_items=order_items)
-        # Создаем заказ
-        order = await cls.create_order(db=db, user=user, new_order=new_order)
-        # Очищаем корзину после заказа
-        await CartDAO.clear_cart(db=db, user=user, cart=cart)
-
-        return order
+        :param cart_storage: хранилище корзин, по умолчанию выбранное в настройках
+        """
+        cart_storage = cart_storage or get_cart_storage()
+        items = await cart_storage.checkout_items(db=db, user=user)
+        params = {"user_id": user.id, "status": OrderEnum.pending.name}
+        if items is None:
+            await db.execute(LOCK_CART_PRODUCTS_SQL, {"user_id": user.id})
+            result = await db.execute(CHECKOUT_FROM_CART_SQL, params)
+        else:
+            item_params = {
+                "slugs": [slug for slug, _ in items],
+                "quantities": [quantity for _, quantity in items],
+            }
+            await db.execute(LOCK_ITEM_PRODUCTS_SQL, item_params)
+            result = await db.execute(CHECKOUT_FROM_ITEMS_SQL, {**params, **item_params})
+        rows = result.all()
+        cart_size = rows[0].cart_size
+
+        if rows[0].id is None:
+            await db.rollback()
+            if not cart_size:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Корзина пуста")
+
+            if items is None:
+                result = await db.execute(
+                    select(CartItem.product_slug, func.sum(CartItem.quantity))
+                    .join(Cart, Cart.id == CartItem.cart_id)
+                    .where(Cart.user_id == user.id)
+                    .group_by(CartItem.product_slug)
+                )
+                quantities = dict(result.tuples().all())
+            else:
+                quantities = {}
+                for slug, quantity in items:
+                    quantities[slug] = quantities.get(slug, 0) + quantity
+            await cls._raise_short_items(db=db, quantities=quantities)
+
+        try:
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
+        await cart_storage.after_checkout(user=user, items=items)
+
+        order = rows[0]
+        return OrderOutSchema(
+            id=order.id,
+            user_id=order.user_id,
+            total_price=order.total_price,
+            status=OrderEnum[order.status],
+            created_at=order.created_at,
+            updated_at=order.updated_at,
+            order_items=[
+                OrderItemOutSchema(
+                    id=row.item_id,
+                    order_id=order.id,
+                    product_slug=row.product_slug,
+                    product_name_snapshot=row.product_name_snapshot,
+                    quantity=row.quantity,
+                    price_at_time=row.price_at_time,
+                )
+                for row in rows
+            ],
+        )
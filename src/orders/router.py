@@ -1,31 +1,32 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, status, Path
+from fastapi import APIRouter, Depends, status, Path, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database import get_db
 from src.orders.dao import OrderDAO
 from src.orders.schemas import OrderCreateSchema, OrderOutSchema, OrderShortOutSchema
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
 from src.users.dependencies import get_user_using_token
+from src.utils.responses import json_response
 
 router = APIRouter(prefix="/orders", tags=["orders"])
 
 
-@router.get("/", status_code=status.HTTP_200_OK)
+@router.get("/", status_code=status.HTTP_200_OK, response_model=list[OrderShortOutSchema])
 async def get_orders(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
-) -> list[OrderShortOutSchema]:
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+) -> Response:
     orders = await OrderDAO.get_all_order(db=db, user=user)
 
-    return list(OrderShortOutSchema.model_validate(order) for order in orders)
+    return json_response(list[OrderShortOutSchema], orders)
 
 
 @router.get("/{object_id}", status_code=status.HTTP_200_OK)
 async def get_order(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
         object_id: Annotated[int, Path(..., description="ID заказа")],
 ) -> OrderOutSchema:
     order = await OrderDAO.get_user_order_by_id(db=db, user=user, object_id=object_id)
@@ -36,7 +37,7 @@ async def get_order(
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_order(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
         new_order: OrderCreateSchema,
 ) -> OrderOutSchema:
     order = await OrderDAO.create_order(db=db, user=user, new_order=new_order)
@@ -47,7 +48,7 @@ async def create_order(
 @router.post("/{object_id}/cancel", status_code=status.HTTP_200_OK)
 async def cancel_order(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
         object_id: Annotated[int, Path(..., ge=0, description="ID заказа")],
 ) -> OrderOutSchema:
     order = await OrderDAO.cancel_order(db=db, user=user, object_id=object_id)
@@ -57,7 +58,7 @@ async def cancel_order(
 @router.delete("/{object_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_order(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
         object_id: Annotated[int, Path(..., ge=0, description="ID заказа")],
 ) -> None:
     order = await OrderDAO.get_user_order_by_id(db=db, user=user, object_id=object_id)
@@ -67,7 +68,7 @@ async def delete_order(
 @router.post('/from-cart', status_code=status.HTTP_201_CREATED)
 async def create_order_from_cart(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(get_user_using_token)]
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)]
 ) -> OrderOutSchema:
     order = await OrderDAO.create_order_from_cart(db=db, user=user)
     return OrderOutSchema.model_validate(order)
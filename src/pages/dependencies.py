@@ -0,0 +1,30 @@
+from typing import Annotated
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.categories.dao import CategoryDAO
+from src.categories.schemas import CategoryOutSchema
+from src.database import get_db
+from src.orders.dao import OrderDAO
+from src.orders.schemas import OrderShortOutSchema
+from src.users.dependencies import get_user_using_token
+from src.users.schemas import UserPrincipalSchema
+
+# Списочные маршруты API отдают готовый JSON (Response), поэтому
+# страницы получают данные напрямую из DAO.
+
+
+async def get_categories(
+        db: Annotated[AsyncSession, Depends(get_db)],
+) -> list[CategoryOutSchema]:
+    categories = await CategoryDAO.get_all(db=db)
+    return [CategoryOutSchema.model_validate(category) for category in categories]
+
+
+async def get_user_orders(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
+) -> list[OrderShortOutSchema]:
+    orders = await OrderDAO.get_all_order(db=db, user=user)
+    return [OrderShortOutSchema.model_validate(order) for order in orders]
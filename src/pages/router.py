@@ -5,13 +5,13 @@ from fastapi.responses import HTMLResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.cart.schemas import CartOutSchema
-from src.categories.router import get_all_categories
 from src.categories.schemas import CategoryOutSchema
 from src.database import get_db
-from src.orders.router import get_order, get_orders
-from src.orders.schemas import OrderOutSchema
+from src.orders.router import get_order
+from src.orders.schemas import OrderOutSchema, OrderShortOutSchema
+from src.pages.dependencies import get_categories, get_user_orders
 from src.products.router import get_all_products, get_product, products_by_category
-from src.products.schemas import ProductOutSchema
+from src.products.schemas import ProductOutSchema, ProductPageSchema
 from src.templates import templates
 from src.users.dependencies import get_access_token
 from src.users.router import get_user_using_token
@@ -28,16 +28,18 @@ async def index(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
 
 @router.get('/categories', response_class=HTMLResponse)
 async def show_categories(request: Request,
-                          categories: list[CategoryOutSchema] = Depends(get_all_categories)):
+                          categories: list[CategoryOutSchema] = Depends(get_categories)):
     return templates.TemplateResponse("categories.html",
                                       context={"request": request, "categories": categories})
 
 
 @router.get("/products", response_class=HTMLResponse)
 async def show_products(request: Request,
-                        products: list[ProductOutSchema] = Depends(get_all_products)):
+                        page: ProductPageSchema = Depends(get_all_products)):
     return templates.TemplateResponse("products.html",
-                                      context={"request": request, "products": products})
+                                      context={"request": request,
+                                               "products": page.items,
+                                               "next_cursor": page.next_cursor})
 
 
 @router.get("/products/{slug}", response_class=HTMLResponse)
@@ -48,9 +50,11 @@ async def show_product(request: Request,
 
 
 @router.get("/categories/{slug}", response_class=HTMLResponse)
-async def show_filter_products(request: Request, products: list[ProductOutSchema] = Depends(products_by_category)):
+async def show_filter_products(request: Request, page: ProductPageSchema = Depends(products_by_category)):
     return templates.TemplateResponse("products.html",
-                                      context={"request": request, "products": products})
+                                      context={"request": request,
+                                               "products": page.items,
+                                               "next_cursor": page.next_cursor})
 
 
 @router.get("/registration", response_class=HTMLResponse)
@@ -78,7 +82,7 @@ async def show_profile(request: Request, db: Annotated[AsyncSession, Depends(get
 
 
 @router.get('/orders', response_class=HTMLResponse)
-async def show_orders(request: Request, orders: list[OrderOutSchema] = Depends(get_orders)):
+async def show_orders(request: Request, orders: list[OrderShortOutSchema] = Depends(get_user_orders)):
     return templates.TemplateResponse("orders.html", request=request, context={"request": request, "orders": orders})
 
 
@@ -1,30 +1,85 @@
-from fastapi_cache import KeyBuilder
-from fastapi_cache.decorator import cache
-from typing import Optional, Union, Any, Awaitable, Dict, Tuple
-from fastapi import Response, Request
-
-
-class SlugKeyBuilder(KeyBuilder):
-    def __call__(
-            self,
-            func: Any,
-            namespace: str = "",
-            *,
-            request: Optional[Request] = None,
-            response: Optional[Response] = None,
-            args: Tuple[Any, ...],
-            kwargs: Dict[str, Any],
-    ) -> Union[Awaitable[str], str]:
-        # Если в kwargs есть slug, используем его для ключа
-        if 'slug' in kwargs:
-            return f"{namespace}:{kwargs['slug']}"
-
-        # Если slug передается как часть пути (args)
-        # Проверяем позиционные аргументы (обычно для path параметров)
-        if args and len(args) > 0:
-            # Предполагаем, что slug - первый аргумент после self
-            return f"{namespace}:{args[0]}"
-
-        # Если slug не найден, используем стандартный ключ
-        return f"{namespace}:default"
+from typing import Any, Dict, Iterator
 
+from src.cache.key_builder import ParamsKeyBuilder
+from src.products.schemas import CategoryProductPageSchema, ProductOutSchema, ProductPageSchema
+
+
+class SlugKeyBuilder(ParamsKeyBuilder):
+    """
+    Ключ товара по slug: "{namespace}:{slug}".
+    """
+
+    def __init__(self):
+        super().__init__(params=("slug",))
+
+    def format_key(self, params: list[tuple[str, str]]) -> str:
+        if not params:
+            return "default"
+        return params[0][1]
+
+
+class FiltersKeyBuilder(ParamsKeyBuilder):
+    """
+    Ключ из значений ProductFilters. Приводятся только поля, которые БД
+    сравнивает без учёта регистра: q (полнотекстовый и триграммный поиск
+    не зависят ни от регистра, ни от пробелов по краям) и name (ILIKE,
+    пробелы значимы). category_slug сравнивается точно и не меняется.
+    """
+
+    def __init__(self):
+        super().__init__(params=("product_filters",))
+
+    def _flatten(self, values: Dict[str, Any], prefix: str = "") -> Iterator[tuple[str, Any]]:
+        for name, value in super()._flatten(values, prefix=prefix):
+            field = name.rsplit(".", 1)[-1]
+            if field == "q":
+                value = value.strip().lower()
+            elif field == "name":
+                value = value.lower()
+            yield name, value
+
+
+# Теги записей кэша каталога
+PRODUCT_LIST_TAG = "products:list"
+PRODUCT_FACETS_TAG = "products:facets"
+
+
+def product_tag(product_id: int) -> str:
+    return f"product:{product_id}"
+
+
+def category_tag(category_id: int) -> str:
+    return f"category:{category_id}"
+
+
+def product_detail_tags(product: ProductOutSchema) -> set[str]:
+    """
+    Карточка товара зависит от самого товара и вложенной категории.
+    """
+    tags = {product_tag(product.id)}
+    if product.category_id is not None:
+        tags.add(category_tag(product.category_id))
+    return tags
+
+
+def product_page_tags(page: ProductPageSchema) -> set[str]:
+    """
+    Страница списка зависит от всех товаров на ней и от состава каталога в целом:
+    новый или переименованный товар может попасть на любую страницу.
+    """
+    tags = {PRODUCT_LIST_TAG}
+    for product in page.items:
+        tags |= product_detail_tags(product)
+    return tags
+
+
+def category_page_tags(page: CategoryProductPageSchema) -> set[str]:
+    """
+    Страница категории зависит и от самой категории: после её переименования
+    старый slug должен отдавать 404, даже если товаров на странице нет.
+    """
+    return product_page_tags(page) | {category_tag(page.category_id)}
+
+
+def product_facets_tags(_: Any) -> set[str]:
+    return {PRODUCT_FACETS_TAG}
@@ -1,30 +1,84 @@
+from typing import AsyncIterator, Any
+
 from fastapi import HTTPException, status
-from sqlalchemy import select
+from sqlalchemy import (
+    select, Select, func, case, tuple_, Integer, String, Boolean, text, update, values, column, inspect,
+)
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
+from src.cache.decorator import invalidate_tags
 from src.categories.models import Category
 from src.dao.base_dao import BaseDao
+from src.dao.context import get_request_context
 from src.dependecies.dependencies import check_unique_slug
+from src.products.cache import PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG, product_tag, category_tag
 from src.products.models import Product
-from src.products.schemas import ProductSchema, ProductFilters, ProductUpdateSchema
+from src.products.schemas import (
+    ProductSchema,
+    ProductFilters,
+    ProductUpdateSchema,
+    ProductBulkUpdateItemSchema,
+    EXPORT_PRODUCT_FIELDS,
+)
+from src.products.search import search_condition, search_rank
+from src.products.suggest import product_index
+from src.utils.pagination import PaginationParams, paginate_by_keyset
 
 
 class ProductDAO(BaseDao):
     model = Product
 
+    # Границы ценовых интервалов для фасетов
+    price_facet_bounds = (500, 1000, 5000, 10000)
+
+    # Ключ keyset-пагинации каталога: сортировка по имени, id делает порядок строгим
+    page_key = (Product.name, Product.id)
+
+    # Сколько строк массового обновления уходит в один UPDATE ... FROM VALUES
+    bulk_update_chunk = 1000
+
+    # Временная таблица и колонки массового импорта (copy_insert)
+    import_table = "products_import"
+    import_columns = (
+        "name", "slug", "description", "price", "image_url",
+        "stock", "rating", "category_id", "is_active",
+    )
+
     @classmethod
-    async def get_all(cls, db: AsyncSession) -> list[Product]:
+    async def get_all(
+        cls, db: AsyncSession, pagination: PaginationParams
+    ) -> tuple[list[Product], str | None]:
         """
-        Получить все товары с подгрузкой категории.
-        Возвращает список отсортированных по имени товаров.
+        Получить страницу товаров с подгрузкой категории.
+        Товары отсортированы по имени, возвращается также курсор следующей страницы.
         """
-        stmt = (
-            select(Product).options(joinedload(Product.category)).order_by(Product.name)
-        )
+        stmt = select(Product).options(joinedload(Product.category))
+        return await paginate_by_keyset(db, stmt, cls.page_key, pagination)
+
+    @classmethod
+    async def get_by_slug(cls, db: AsyncSession, slug: str) -> Product:
+        """
+        Получить товар по slug с подгрузкой категории. Если товар не найден — ошибка 404.
+        """
+        context = get_request_context(db)
+        product = context.products.get(slug) if context is not None else None
+        if product is not None and "category" not in inspect(product).unloaded:
+            return product
+
+        stmt = select(Product).options(joinedload(Product.category)).where(Product.slug == slug)
         result = await db.execute(stmt)
-        products = result.scalars().all()
-        return list(products)
+        product = result.scalar_one_or_none()
+
+        if product is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Product with slug '{slug}' not found",
+            )
+        if context is not None:
+            context.products[slug] = product
+        return product
 
     @classmethod
     async def create_product(
@@ -43,14 +97,128 @@ class ProductDAO(BaseDao):
         result = await db.execute(stmt)
         product_with_category = result.scalar_one()
 
+        await product_index.sync_product(product_with_category)
+        await invalidate_tags(PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG)
+
         return product_with_category
 
+    @classmethod
+    async def get_all_slugs(cls, db: AsyncSession) -> set[str]:
+        """
+        Все занятые slug товаров одним запросом — для проверки уникальности в памяти.
+        """
+        result = await db.execute(select(Product.slug))
+        return set(result.scalars())
+
+    @classmethod
+    async def copy_insert(
+        cls, db: AsyncSession, records: list[tuple]
+    ) -> list[tuple[str, str, bool]]:
+        """
+        Вставляет пачку товаров через COPY во временную таблицу и один
+        INSERT ... SELECT из неё. Строки со slug, который успел занять
+        параллельный запрос, пропускаются.
+
+        :param records: Кортежи значений в порядке import_columns.
+        :return: (slug, name, is_active) вставленных товаров.
+        """
+        columns = ", ".join(cls.import_columns)
+        connection = await db.connection()
+        raw_connection = await connection.get_raw_connection()
+        try:
+            # Типы колонок как в products, но без ограничений и значений по умолчанию
+            await db.execute(text(
+                f"CREATE TEMP TABLE {cls.import_table} ON COMMIT DROP AS "
+                f"SELECT {columns} FROM products WITH NO DATA"
+            ))
+            await raw_connection.driver_connection.copy_records_to_table(
+                cls.import_table, records=records, columns=cls.import_columns
+            )
+            result = await db.execute(text(
+                f"INSERT INTO products ({columns}) "
+                f"SELECT {columns} FROM {cls.import_table} "
+                f"ON CONFLICT (slug) DO NOTHING "
+                f"RETURNING slug, name, is_active"
+            ))
+            inserted = [tuple(row) for row in result]
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
+        return inserted
+
+    @classmethod
+    async def bulk_update(
+        cls, db: AsyncSession, items: list[ProductBulkUpdateItemSchema]
+    ) -> tuple[int, list[str]]:
+        """
+        Обновляет цену, остаток и активность многих товаров по slug.
+
+        Каждые bulk_update_chunk строк применяются одним
+        UPDATE products ... FROM (VALUES ...) — неуказанные поля сохраняют
+        текущее значение через COALESCE. Все куски выполняются в одной транзакции,
+        кэш сбрасывается одним вызовом в конце.
+
+        :return: Число обновлённых товаров и список ненайденных slug.
+        """
+        # При повторе slug побеждает последняя строка
+        by_slug = {item.slug: item for item in items}
+        rows = [
+            (item.slug, item.price, item.stock, item.is_active)
+            for item in by_slug.values()
+        ]
+        changes_activity = any(item.is_active is not None for item in by_slug.values())
+
+        updated: list[Any] = []
+        try:
+            for start in range(0, len(rows), cls.bulk_update_chunk):
+                new_values = values(
+                    column("slug", String),
+                    column("price", Product.price.type),
+                    column("stock", Integer),
+                    column("is_active", Boolean),
+                    name="new_values",
+                ).data(rows[start:start + cls.bulk_update_chunk])
+                stmt = (
+                    update(Product)
+                    .where(Product.slug == new_values.c.slug)
+                    .values(
+                        # NULL без приведения типа в VALUES Postgres считает текстом
+                        price=func.coalesce(new_values.c.price.cast(Product.price.type), Product.price),
+                        stock=func.coalesce(new_values.c.stock.cast(Integer), Product.stock),
+                        is_active=func.coalesce(new_values.c.is_active.cast(Boolean), Product.is_active),
+                        updated_at=func.now(),
+                    )
+                    .returning(Product.id, Product.slug, Product.name, Product.is_active, Product.category_id)
+                    .execution_options(synchronize_session=False)
+                )
+                result = await db.execute(stmt)
+                updated.extend(result.all())
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            raise
+
+        tags = {PRODUCT_FACETS_TAG} | {product_tag(row.id) for row in updated}
+        if changes_activity:
+            tags.add(PRODUCT_LIST_TAG)
+            tags |= {category_tag(row.category_id) for row in updated if row.category_id is not None}
+            await product_index.apply(
+                added=[(row.slug, row.name) for row in updated if row.is_active],
+                removed=[row.slug for row in updated if not row.is_active],
+            )
+        if updated:
+            await invalidate_tags(*tags)
+
+        updated_slugs = {row.slug for row in updated}
+        return len(updated), [slug for slug in by_slug if slug not in updated_slugs]
+
     @classmethod
     async def get_products_by_category(
-        cls, db: AsyncSession, category_slug: str
-    ) -> list[Product]:
+        cls, db: AsyncSession, category_slug: str, pagination: PaginationParams
+    ) -> tuple[Category, list[Product], str | None]:
         """
-        Получить товары по slug категории. Если категория не найдена — ошибка 404.
+        Получить категорию по slug и страницу её товаров. Если категория не найдена — ошибка 404.
         """
         stmt = select(Category).where(Category.slug == category_slug)
         result = await db.execute(stmt)
@@ -66,21 +234,46 @@ class ProductDAO(BaseDao):
             .options(joinedload(Product.category))
             .where(Product.category_id == category.id)
         )
-        result = await db.execute(stmt)
-        products = result.scalars().all()
-
-        return list(products)
+        products, next_cursor = await paginate_by_keyset(db, stmt, cls.page_key, pagination)
+        return category, products, next_cursor
 
     @classmethod
-    async def get_filtered_products(
-        cls, db: AsyncSession, product_filters: ProductFilters
-    ) -> list[Product]:
+    async def stream_export_rows(
+        cls, db: AsyncSession, batch_size: int = 1000
+    ) -> AsyncIterator[dict[str, Any]]:
         """
-        Получить отфильтрованные товары по нескольким полям:
-        имя, диапазон цен, категория, наличие, активность и рейтинг.
+        Построчно отдаёт весь каталог через серверный курсор.
+        Категории загружаются одним запросом заранее, поэтому строки товаров
+        читаются без join и без создания ORM-объектов.
         """
-        stmt = select(Product).options(joinedload(Product.category))
+        result = await db.execute(select(Category.id, Category.name, Category.slug))
+        categories = {row.id: (row.name, row.slug) for row in result}
+
+        columns = [
+            getattr(Product, field)
+            for field in EXPORT_PRODUCT_FIELDS
+            if field not in ("category_name", "category_slug")
+        ]
+        stmt = (
+            select(*columns)
+            .order_by(Product.id)
+            .execution_options(yield_per=batch_size)
+        )
+        stream = await db.stream(stmt)
+
+        async for partition in stream.partitions():
+            for row in partition:
+                data = row._asdict()
+                data["category_name"], data["category_slug"] = categories.get(
+                    row.category_id, (None, None)
+                )
+                yield data
 
+    @classmethod
+    def _apply_filters(cls, stmt: Select, product_filters: ProductFilters) -> Select:
+        """
+        Добавляет к запросу условия из ProductFilters.
+        """
         if product_filters.name:
             stmt = stmt.where(Product.name.ilike(f"%{product_filters.name}%"))
         if product_filters.min_price:
@@ -88,18 +281,102 @@ class ProductDAO(BaseDao):
         if product_filters.max_price:
             stmt = stmt.where(Product.price <= product_filters.max_price)
         if product_filters.category_slug:
-            stmt = stmt.where(Product.category.slug == product_filters.category_slug)
+            stmt = stmt.where(
+                Product.category.has(Category.slug == product_filters.category_slug)
+            )
         if product_filters.in_stock is not None:
-            stmt = stmt.where(Product.stock > 0)
+            stmt = stmt.where(
+                Product.stock > 0 if product_filters.in_stock else Product.stock <= 0
+            )
         if product_filters.is_active is not None:
             stmt = stmt.where(Product.is_active == product_filters.is_active)
         if product_filters.min_rating:
             stmt = stmt.where(Product.rating >= product_filters.min_rating)
 
+        return stmt
+
+    @classmethod
+    async def get_filtered_products(
+        cls,
+        db: AsyncSession,
+        product_filters: ProductFilters,
+        pagination: PaginationParams,
+    ) -> tuple[list[Product], str | None]:
+        """
+        Получить страницу отфильтрованных товаров по нескольким полям:
+        имя, диапазон цен, категория, наличие, активность и рейтинг.
+        При заданном поисковом запросе q товары упорядочены по релевантности.
+        """
+        stmt = select(Product).options(joinedload(Product.category))
+        stmt = cls._apply_filters(stmt, product_filters)
+
+        if product_filters.q:
+            stmt = stmt.where(search_condition(product_filters.q))
+            return await paginate_by_keyset(
+                db,
+                stmt,
+                (search_rank(product_filters.q), Product.id),
+                pagination,
+                descending=True,
+            )
+
+        return await paginate_by_keyset(db, stmt, cls.page_key, pagination)
+
+    @classmethod
+    async def get_facets(
+        cls, db: AsyncSession, product_filters: ProductFilters
+    ) -> dict[str, Any]:
+        """
+        Посчитать фасеты каталога для текущих фильтров одним запросом:
+        количество товаров по категориям, ценовым интервалам, рейтингу и наличию.
+        """
+        bounds = cls.price_facet_bounds
+        price_bucket = case(
+            *[
+                (Product.price < upper, f"{lower}-{upper}")
+                for lower, upper in zip((0, *bounds), bounds)
+            ],
+            else_=f"{bounds[-1]}+",
+        )
+
+        facets = (
+            select(
+                Category.slug.label("category"),
+                price_bucket.label("price"),
+                func.floor(func.coalesce(Product.rating, 0)).cast(Integer).label("rating"),
+                (Product.stock > 0).label("in_stock"),
+            )
+            .select_from(Product)
+            .outerjoin(Category, Category.id == Product.category_id)
+        )
+        facets = cls._apply_filters(facets, product_filters)
+        if product_filters.q:
+            facets = facets.where(search_condition(product_filters.q))
+        facets = facets.subquery()
+
+        columns = (facets.c.category, facets.c.price, facets.c.rating, facets.c.in_stock)
+        stmt = select(*columns, func.count(), func.grouping(*columns)).group_by(
+            func.grouping_sets(*(tuple_(column) for column in columns), tuple_())
+        )
         result = await db.execute(stmt)
-        products = result.scalars().all()
 
-        return list(products)
+        # Бит GROUPING равен 1 для колонки, не входящей в набор группировки;
+        # старший бит соответствует первой колонке.
+        names = [column.name for column in columns]
+        full_mask = (1 << len(names)) - 1
+        counts: dict[str, Any] = {name: [] for name in names}
+        counts["total"] = 0
+        for *facet_values, count, grouping in result.tuples():
+            if grouping == full_mask:
+                counts["total"] = count
+                continue
+            index = next(
+                i for i in range(len(names))
+                if not grouping & (1 << (len(names) - 1 - i))
+            )
+            counts[names[index]].append({"value": facet_values[index], "count": count})
+
+        return counts
 
     @classmethod
     async def update_product(
@@ -113,6 +390,13 @@ class ProductDAO(BaseDao):
         Обновляет slug при изменении имени и сохраняет изменения в БД.
         """
         data = product_data.model_dump(exclude_unset=True)
+        old_slug = product.slug
+        old_category_id = product.category_id
+        # Изменения, после которых товар может сменить место в списках
+        moves_in_lists = any(
+            field in data and data[field] != getattr(product, field)
+            for field in ("name", "category_id", "is_active")
+        )
 
         if "name" in data and data["name"] != product.name:
             data["slug"] = await check_unique_slug(
@@ -121,4 +405,25 @@ class ProductDAO(BaseDao):
 
         updated_product = await cls.update(db=db, instance=product, **data)
 
+        await product_index.sync_product(updated_product, old_slug=old_slug)
+
+        tags = {product_tag(updated_product.id), PRODUCT_FACETS_TAG}
+        if moves_in_lists:
+            tags.add(PRODUCT_LIST_TAG)
+            tags |= {
+                category_tag(category_id)
+                for category_id in (old_category_id, updated_product.category_id)
+                if category_id is not None
+            }
+        await invalidate_tags(*tags)
+
         return updated_product
+
+    @classmethod
+    async def delete(cls, db: AsyncSession, obj: Product) -> None:
+        """
+        Удалить товар. Только для администратора.
+        """
+        await super().delete(db=db, obj=obj)
+        await product_index.apply(removed=[obj.slug])
+        await invalidate_tags(product_tag(obj.id), PRODUCT_FACETS_TAG)
@@ -0,0 +1,52 @@
+import csv
+import io
+from typing import AsyncIterator, Literal
+
+from pydantic_core import to_json
+
+from src.database import async_session
+from src.products.dao import ProductDAO
+from src.products.schemas import EXPORT_PRODUCT_FIELDS
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES: dict[str, str] = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# Сколько строк собирается в один отправляемый клиенту кусок
+CHUNK_ROWS = 500
+
+
+async def iter_catalog_export(export_format: ExportFormat) -> AsyncIterator[bytes]:
+    """
+    Генератор выгрузки каталога кусками по CHUNK_ROWS строк.
+
+    Открывает собственную сессию: StreamingResponse читает генератор уже после
+    выхода из зависимостей запроса, и сессия из get_db к этому моменту закрыта.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_PRODUCT_FIELDS)
+    rows_in_chunk = 0
+
+    if export_format == "csv":
+        writer.writeheader()
+
+    async with async_session() as db:
+        async for row in ProductDAO.stream_export_rows(db):
+            if export_format == "csv":
+                writer.writerow(row)
+            else:
+                buffer.write(to_json(row).decode())
+                buffer.write("\n")
+
+            rows_in_chunk += 1
+            if rows_in_chunk >= CHUNK_ROWS:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+                rows_in_chunk = 0
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
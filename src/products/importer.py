@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import csv
+import json
+from typing import Any, Iterable, Iterator, Optional
+
+from fastapi import HTTPException, status
+
+from pydantic import ValidationError
+from slugify import slugify
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.cache.decorator import invalidate_tags
+from src.categories.models import Category
+from src.database import async_session
+from src.products.cache import PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG
+from src.products.dao import ProductDAO
+from src.products.export import ExportFormat
+from src.products.schemas import ProductSchema, ProductImportReportSchema, ImportRowErrorSchema
+from src.products.suggest import product_index
+
+# Сколько строк проверяется и записывается за один COPY
+BATCH_ROWS = 1000
+
+# Сколько ошибок попадает в отчёт; остальные только считаются
+MAX_REPORTED_ERRORS = 1000
+
+
+class ProductImporter:
+    """
+    Массовый импорт товаров из CSV/NDJSON.
+
+    Строки проверяются ProductSchema пачками по BATCH_ROWS. slug генерируется
+    так же, как при создании товара, и проверяется на уникальность по множеству
+    slug, загруженному из БД один раз. Чтение и проверка пачки идут в потоке,
+    не блокируя цикл событий. Каждая пачка пишется через
+    ProductDAO.copy_insert, кэш каталога сбрасывается один раз в конце.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.report = ProductImportReportSchema(received=0, created=0, failed=0)
+        self._slugs: set[str] = set()
+        self._category_ids: set[int] = set()
+
+    def _error(self, line: int, error: str, slug: str | None = None) -> None:
+        self.report.failed += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(ImportRowErrorSchema(line=line, slug=slug, error=error))
+
+    @staticmethod
+    def _format_validation_error(exc: ValidationError) -> str:
+        return "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in exc.errors()
+        )
+
+    @staticmethod
+    def parse_rows(lines: Iterable[str], import_format: ExportFormat) -> Iterator[tuple[int, Any]]:
+        """
+        Отдаёт пары (номер строки, данные строки). Пустые значения CSV
+        заменяются значением по умолчанию поля или None для обязательных полей.
+        """
+        if import_format == "csv":
+            reader = csv.DictReader(lines)
+            for row in reader:
+                data = {}
+                for key, value in row.items():
+                    field = ProductSchema.model_fields.get(key)
+                    if value == "" and field is not None:
+                        if not field.is_required():
+                            continue
+                        value = None
+                    data[key] = value
+                yield reader.line_num, data
+            return
+
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                yield line_number, exc
+
+    def _prepare(self, line: int, data: Any) -> tuple | None:
+        """
+        Проверяет строку и возвращает кортеж для COPY или None, если строка отклонена.
+        """
+        if isinstance(data, Exception):
+            self._error(line, f"invalid JSON: {data}")
+            return None
+        try:
+            product = ProductSchema.model_validate(data)
+        except ValidationError as exc:
+            self._error(line, self._format_validation_error(exc))
+            return None
+
+        slug = slugify(product.name)
+        if slug in self._slugs:
+            self._error(line, f"Product with slug '{slug}' already exists.", slug=slug)
+            return None
+        if product.category_id is not None and product.category_id not in self._category_ids:
+            self._error(line, f"Category {product.category_id} not found", slug=slug)
+            return None
+
+        self._slugs.add(slug)
+        return (
+            product.name, slug, product.description, product.price, product.image_url,
+            product.stock, float(product.rating), product.category_id, product.is_active,
+        )
+
+    def _read_batch(self, rows: Iterator[tuple[int, Any]]) -> Optional[list[tuple[int, tuple]]]:
+        """
+        Выполняется в потоке: читает и проверяет до BATCH_ROWS строк.
+        Возвращает принятые строки или None, если файл закончился.
+        """
+        batch: list[tuple[int, tuple]] = []
+        for read, (line, data) in enumerate(rows, start=1):
+            self.report.received += 1
+            record = self._prepare(line, data)
+            if record is not None:
+                batch.append((line, record))
+            if read >= BATCH_ROWS:
+                return batch
+        return batch or None
+
+    async def _write(self, batch: list[tuple[int, tuple]]) -> None:
+        inserted = await ProductDAO.copy_insert(self.db, [record for _, record in batch])
+        self.report.created += len(inserted)
+        await product_index.apply(added=[(slug, name) for slug, name, is_active in inserted if is_active])
+
+        if len(inserted) < len(batch):
+            inserted_slugs = {slug for slug, _, _ in inserted}
+            for line, record in batch:
+                if record[1] not in inserted_slugs:
+                    self._error(line, f"Product with slug '{record[1]}' already exists.", slug=record[1])
+
+    async def run(self, lines: Iterable[str], import_format: ExportFormat) -> ProductImportReportSchema:
+        self._slugs = await ProductDAO.get_all_slugs(self.db)
+        result = await self.db.execute(select(Category.id))
+        self._category_ids = set(result.scalars())
+
+        rows = self.parse_rows(lines, import_format)
+        try:
+            while (batch := await asyncio.to_thread(self._read_batch, rows)) is not None:
+                if batch:
+                    await self._write(batch)
+        except UnicodeDecodeError:
+            # Предыдущие пачки уже записаны, об этом нужно сообщить
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=(
+                    f"File must be UTF-8 encoded: decoding failed after {self.report.received} rows, "
+                    f"{self.report.created} products were already imported"
+                ),
+            )
+        finally:
+            if self.report.created:
+                await invalidate_tags(PRODUCT_LIST_TAG, PRODUCT_FACETS_TAG)
+        return self.report
+
+
+async def import_products(
+    db: AsyncSession, lines: Iterable[str], import_format: ExportFormat
+) -> ProductImportReportSchema:
+    """
+    Импортирует товары из строк файла CSV (с заголовком) или NDJSON.
+    """
+    return await ProductImporter(db).run(lines, import_format)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Массовый импорт товаров из CSV/NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="ndjson")
+    args = parser.parse_args()
+
+    with open(args.path, encoding="utf-8", newline="") as file:
+        async with async_session() as db:
+            report = await import_products(db, file, args.format)
+    print(report.model_dump_json(indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,7 +2,8 @@ from decimal import Decimal
 from decimal import Decimal
 from typing import Optional
 
-from sqlalchemy import Integer, String, Text, ForeignKey, Float, DECIMAL, Boolean, text
+from sqlalchemy import Integer, String, Text, ForeignKey, Float, DECIMAL, Boolean, text, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.database import Base
@@ -17,6 +18,8 @@ class Product(Base):
     description: Mapped[str | None] = mapped_column(Text, nullable=True)
     price: Mapped[Decimal] = mapped_column(DECIMAL(10, 2), nullable=False)
     image_url: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    # Значение атрибута srcset: уменьшенные копии картинки в WebP с их шириной
+    image_srcset: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     stock: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
     rating: Mapped[float] = mapped_column(Float, nullable=True, default=0.0)
     category_id: Mapped[Optional[int]] = mapped_column(
@@ -26,6 +29,34 @@ class Product(Base):
         Boolean, default=True, server_default=text("TRUE")
     )
 
+    # Поисковый вектор поддерживается самой БД: имя с весом A в русской и английской
+    # конфигурациях, описание с весом B. Не загружается вместе с товаром.
+    search_vector: Mapped[Optional[str]] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+            "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True,
+        ),
+        deferred=True,
+    )
+
     category: Mapped["Category"] = relationship(
         "Category", back_populates="products", passive_deletes=True
     )
+
+    __table_args__ = (
+        # Индексы под keyset-пагинацию каталога по (name, id)
+        Index("ix_products_name_id", "name", "id"),
+        Index("ix_products_category_id_name_id", "category_id", "name", "id"),
+        # Полнотекстовый и нечёткий (pg_trgm) поиск по названию
+        Index("ix_products_search_vector", "search_vector", postgresql_using="gin"),
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
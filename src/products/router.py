@@ -1,123 +1,211 @@
 from typing import Annotated
 import asyncio
+import io
 
-from fastapi import APIRouter, status, Depends, Body, Path
-from fastapi_cache import FastAPICache
-from fastapi_cache.decorator import cache
+from fastapi import APIRouter, status, Depends, Body, Path, Query, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
 
+from src.cache.decorator import cache
+from src.config import settings
 from src.database import get_db
 from src.dependecies.dependencies import get_instance_by_slug
-from src.products.cache import SlugKeyBuilder
+from src.products.cache import (
+    SlugKeyBuilder,
+    FiltersKeyBuilder,
+    product_detail_tags,
+    product_page_tags,
+    category_page_tags,
+    product_facets_tags,
+)
 from src.products.dao import ProductDAO
+from src.products.export import ExportFormat, MEDIA_TYPES, iter_catalog_export
+from src.products.importer import import_products as run_import
 from src.products.models import Product
 from src.products.schemas import (
     ProductSchema,
     ProductOutSchema,
     ProductFilters,
     ProductUpdateSchema,
+    ProductPageSchema,
+    CategoryProductPageSchema,
+    ProductSuggestSchema,
+    ProductFacetsSchema,
+    ProductImportReportSchema,
+    ProductBulkUpdateItemSchema,
+    ProductBulkUpdateResultSchema,
 )
+from src.products.suggest import product_index
 from src.users.dependencies import check_user_is_admin
-from src.users.models import User
+from src.users.schemas import UserPrincipalSchema
+from src.utils.pagination import PaginationParams
+from src.utils.responses import json_response
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
 @router.get("/", status_code=status.HTTP_200_OK)
-@cache(expire=60 * 30, namespace='products')
+@cache(expire=60 * 30, namespace='products', tags=product_page_tags,
+       stale_ttl=settings.CACHE_STALE_TTL, raw=True)
 async def get_all_products(
         db: Annotated[AsyncSession, Depends(get_db)],
-) -> list[ProductOutSchema]:
-    products = await ProductDAO.get_all(db)
-    return [ProductOutSchema.model_validate(product) for product in products]
+        pagination: PaginationParams = Depends(),
+) -> ProductPageSchema:
+    products, next_cursor = await ProductDAO.get_all(db, pagination=pagination)
+    return ProductPageSchema(
+        items=[ProductOutSchema.model_validate(product) for product in products],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/filter", status_code=status.HTTP_200_OK, response_model=ProductPageSchema)
+async def filter_products(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        product_filters: ProductFilters = Depends(),
+        pagination: PaginationParams = Depends(),
+) -> Response:
+    products, next_cursor = await ProductDAO.get_filtered_products(
+        db=db, product_filters=product_filters, pagination=pagination
+    )
+
+    return json_response(ProductPageSchema, {"items": products, "next_cursor": next_cursor})
+
+
+@router.get("/facets", status_code=status.HTTP_200_OK)
+@cache(expire=60 * 5, namespace='product_facets', key_builder=FiltersKeyBuilder(),
+       tags=product_facets_tags, raw=True)
+async def get_product_facets(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        product_filters: ProductFilters = Depends(),
+) -> ProductFacetsSchema:
+    facets = await ProductDAO.get_facets(db=db, product_filters=product_filters)
+    return ProductFacetsSchema.model_validate(facets)
+
+
+@router.get("/suggest", status_code=status.HTTP_200_OK)
+async def suggest_products(
+        prefix: Annotated[str, Query(..., min_length=1, max_length=100, description="Начало названия товара")],
+        limit: Annotated[int, Query(ge=1, le=20)] = 10,
+) -> list[ProductSuggestSchema]:
+    return [
+        ProductSuggestSchema(slug=slug, name=name)
+        for slug, name in product_index.search(prefix, limit=limit)
+    ]
+
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_products(
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+        export_format: Annotated[ExportFormat, Query(alias="format")] = "ndjson",
+) -> StreamingResponse:
+    return StreamingResponse(
+        iter_catalog_export(export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="products.{export_format}"'
+        },
+    )
 
 
 @router.get("/{slug}", status_code=status.HTTP_200_OK)
-@cache(expire=60 * 15, namespace=f'product', key_builder=SlugKeyBuilder())
+@cache(expire=60 * 15, namespace='product', key_builder=SlugKeyBuilder(),
+       tags=product_detail_tags, stale_ttl=settings.CACHE_STALE_TTL, raw=True)
 async def get_product(
         db: Annotated[AsyncSession, Depends(get_db)],
-        product: Annotated[Product, Depends(get_instance_by_slug(model=Product,
-                                                                 load_strategy=joinedload,
-                                                                 relationship='category'))],
+        slug: Annotated[str, Path(..., description="Slug товара")],
 ) -> ProductOutSchema:
+    product = await ProductDAO.get_by_slug(db=db, slug=slug)
     return ProductOutSchema.model_validate(product)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_product(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(check_user_is_admin)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
         new_product: ProductSchema,
 ) -> ProductOutSchema:
     product = await ProductDAO.create_product(db=db, new_product=new_product)
 
-    await FastAPICache.clear(namespace="products", key=f"product:{product.slug}")
-
     return ProductOutSchema.model_validate(product)
 
 
+@router.post("/import", status_code=status.HTTP_200_OK)
+async def import_products(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+        file: Annotated[UploadFile, File(..., description="CSV с заголовком или NDJSON")],
+        import_format: Annotated[ExportFormat, Query(alias="format")] = "ndjson",
+) -> ProductImportReportSchema:
+    lines = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    return await run_import(db=db, lines=lines, import_format=import_format)
+
+
 @router.get("/categories/{slug}", status_code=status.HTTP_200_OK)
-@cache(expire=60 * 60, namespace='category_products')
+@cache(expire=60 * 60, namespace='category_products', tags=category_page_tags,
+       stale_ttl=settings.CACHE_STALE_TTL, raw=True)
 async def products_by_category(
         db: Annotated[AsyncSession, Depends(get_db)],
         slug: Annotated[str, Path(...,
                                   min_length=3,
                                   max_length=255,
                                   description='Категория товара')],
-) -> list[ProductOutSchema]:
-    products = await ProductDAO.get_products_by_category(db=db, category_slug=slug)
-
-    return [ProductOutSchema.model_validate(product) for product in products]
-
-
-@router.get("/filter", status_code=status.HTTP_200_OK)
-async def filter_products(
-        db: Annotated[AsyncSession, Depends(get_db)],
-        product_filters: ProductFilters = Depends(),
-) -> list[ProductOutSchema]:
-    products = await ProductDAO.get_filtered_products(
-        db=db, product_filters=product_filters
+        pagination: PaginationParams = Depends(),
+) -> CategoryProductPageSchema:
+    category, products, next_cursor = await ProductDAO.get_products_by_category(
+        db=db, category_slug=slug, pagination=pagination
     )
 
-    return [ProductOutSchema.model_validate(product) for product in products]
+    return CategoryProductPageSchema(
+        items=[ProductOutSchema.model_validate(product) for product in products],
+        next_cursor=next_cursor,
+        category_id=category.id,
+    )
 
 
 @router.put("/{slug}")
 async def update_product(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(check_user_is_admin)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
         product_data: Annotated[ProductSchema, Body()],
         product: Annotated[Product, Depends(get_instance_by_slug(Product))],
 ) -> ProductOutSchema:
     product = await ProductDAO.update_product(
         db=db, product_data=product_data, product=product
     )
-    await FastAPICache.clear(namespace='product', key=f'product:{product.slug}')
 
     return ProductOutSchema.model_validate(product)
 
 
+@router.patch("/bulk", status_code=status.HTTP_200_OK)
+async def bulk_update_products(
+        db: Annotated[AsyncSession, Depends(get_db)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+        items: Annotated[
+            list[ProductBulkUpdateItemSchema],
+            Body(..., min_length=1, max_length=50_000, description="Изменения цены, остатка и активности по slug"),
+        ],
+) -> ProductBulkUpdateResultSchema:
+    updated, unknown_slugs = await ProductDAO.bulk_update(db=db, items=items)
+    return ProductBulkUpdateResultSchema(updated=updated, unknown_slugs=unknown_slugs)
+
+
 @router.patch("/{slug}")
 async def update_product_partition(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(check_user_is_admin)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
         product_data: ProductUpdateSchema,
         product: Annotated[Product, Depends(get_instance_by_slug(Product))],
 ) -> ProductOutSchema:
     product = await ProductDAO.update_product(
         db=db, product_data=product_data, product=product
     )
-    await FastAPICache.clear(namespace="product", key=f"product:{product.slug}")
     return ProductOutSchema.model_validate(product)
 
 
 @router.delete("/{slug}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(check_user_is_admin)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
         product: Product = Depends(get_instance_by_slug(Product)),
 ) -> None:
     await ProductDAO.delete(db=db, obj=product)
-    await FastAPICache.clear(namespace='products')
-    await FastAPICache.clear(namespace="product", key=f"product:{product.slug}")
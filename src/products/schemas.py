@@ -35,14 +35,88 @@ class ProductOutSchema(ProductSchema):
         Optional[datetime], Field(default=None, title="Дата обновления")
     ]
 
+    image_srcset: Annotated[Optional[str], Field(default=None, title="srcset картинки товара")]
+
     category: Annotated[CategoryOutSchema | None, Field(default=None, title="Категория")]
 
     model_config = ConfigDict(from_attributes=True)
 
 
+# Поля выгрузки каталога: плоский набор полей ProductOutSchema,
+# вложенная категория заменена на её имя и slug
+EXPORT_PRODUCT_FIELDS = [
+    field for field in ProductOutSchema.model_fields if field != "category"
+] + ["category_name", "category_slug"]
+
+
+class ProductPageSchema(BaseModel):
+    items: Annotated[list[ProductOutSchema], Field(title="Товары на странице")]
+    next_cursor: Annotated[
+        Optional[str],
+        Field(default=None, title="Курсор следующей страницы, null на последней"),
+    ]
+
+
+class CategoryProductPageSchema(ProductPageSchema):
+    category_id: Annotated[int, Field(title="ID категории")]
+
+
+class ProductBulkUpdateItemSchema(BaseModel):
+    slug: Annotated[str, Field(..., title="slug товара", min_length=2, max_length=255)]
+    price: Annotated[Optional[Decimal], Field(default=None, ge=0, title="Цена товара")]
+    stock: Annotated[Optional[int], Field(default=None, ge=0, title="Остаток товара")]
+    is_active: Annotated[Optional[bool], Field(default=None, title="Активен ли товар")]
+
+
+class ProductBulkUpdateResultSchema(BaseModel):
+    updated: Annotated[int, Field(..., title="Обновлено товаров")]
+    unknown_slugs: Annotated[list[str], Field(default_factory=list, title="Ненайденные slug")]
+
+
+class ImportRowErrorSchema(BaseModel):
+    line: Annotated[int, Field(..., title="Номер строки файла")]
+    slug: Annotated[Optional[str], Field(default=None, title="slug товара")]
+    error: Annotated[str, Field(..., title="Причина")]
+
+
+class ProductImportReportSchema(BaseModel):
+    received: Annotated[int, Field(..., title="Прочитано строк")]
+    created: Annotated[int, Field(..., title="Создано товаров")]
+    failed: Annotated[int, Field(..., title="Отклонено строк")]
+    errors: Annotated[
+        list[ImportRowErrorSchema],
+        Field(default_factory=list, title="Ошибки по строкам (не больше первой тысячи)"),
+    ]
+
+
+class ProductSuggestSchema(BaseModel):
+    slug: Annotated[str, Field(..., title="slug")]
+    name: Annotated[str, Field(..., title="Название товара")]
+
+
+class FacetCountSchema(BaseModel):
+    value: Annotated[str | int | bool | None, Field(title="Значение фасета")]
+    count: Annotated[int, Field(ge=0, title="Количество товаров")]
+
+
+class ProductFacetsSchema(BaseModel):
+    total: Annotated[int, Field(ge=0, title="Всего товаров по фильтру")]
+    category: Annotated[list[FacetCountSchema], Field(title="По slug категории")]
+    price: Annotated[list[FacetCountSchema], Field(title="По ценовым интервалам")]
+    rating: Annotated[list[FacetCountSchema], Field(title="По целой части рейтинга")]
+    in_stock: Annotated[list[FacetCountSchema], Field(title="По наличию на складе")]
+
+
 class ProductFilters:
     def __init__(
         self,
+        q: Optional[str] = Query(
+            None,
+            min_length=2,
+            max_length=255,
+            description="Поисковый запрос: полнотекстовый и нечёткий поиск, "
+            "результаты упорядочены по релевантности",
+        ),
         name: Optional[str] = Query(
             None, description="Фильтр по названию (частичное совпадение)"
         ),
@@ -57,6 +131,7 @@ class ProductFilters:
             None, ge=0, le=5, description="Минимальный рейтинг (от 0 до 5)"
         ),
     ):
+        self.q = q
         self.name = name
         self.min_price = min_price
         self.max_price = max_price
@@ -98,6 +173,14 @@ class ProductUpdateSchema(BaseModel):
             example="https://example.com/image.png",
         ),
     ]
+    image_srcset: Annotated[
+        Optional[str],
+        Field(
+            default=None,
+            title="srcset картинки товара",
+            example="/static/images/1.webp 1280w, /static/images/1-640w.webp 640w",
+        ),
+    ]
     stock: Annotated[
         Optional[int], Field(default=None, ge=0, title="Остаток товара", example=10)
     ]
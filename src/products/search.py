@@ -0,0 +1,38 @@
+from sqlalchemy import ColumnElement, Float, func, or_
+
+from src.products.models import Product
+
+# Конфигурации полнотекстового поиска, совпадают с выражением Product.search_vector
+SEARCH_CONFIGS = ("russian", "english")
+
+
+def _ts_query(q: str) -> ColumnElement:
+    """
+    Объединяет запрос пользователя, разобранный во всех конфигурациях поиска.
+    """
+    queries = [func.websearch_to_tsquery(config, q) for config in SEARCH_CONFIGS]
+    query = queries[0]
+    for other in queries[1:]:
+        query = query.op("||")(other)
+    return query
+
+
+def search_condition(q: str) -> ColumnElement[bool]:
+    """
+    Товар подходит, если совпал по полнотекстовому вектору (GIN-индекс)
+    или похож на запрос по триграммам названия (pg_trgm, оператор %).
+    """
+    return or_(
+        Product.search_vector.op("@@")(_ts_query(q)),
+        Product.name.op("%")(q),
+    )
+
+
+def search_rank(q: str) -> ColumnElement[float]:
+    """
+    Релевантность товара: ранг полнотекстового совпадения плюс триграммное сходство названия.
+    """
+    return (
+        func.ts_rank_cd(Product.search_vector, _ts_query(q), type_=Float)
+        + func.similarity(Product.name, q, type_=Float)
+    ).label("search_rank")
@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import uuid
+from bisect import bisect_left, insort
+from typing import Iterable, Optional
+
+from slugify import slugify
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.products.models import Product
+
+logger = logging.getLogger(__name__)
+
+
+class ProductPrefixIndex:
+    """
+    Индекс префиксов названий товаров для автодополнения без обращения к БД.
+
+    Ключи хранятся в отсортированном списке, поиск выполняется через bisect.
+    Названия нормализуются через slugify, поэтому кириллица и её латинская
+    транслитерация дают одни и те же ключи. Для каждого товара индексируются
+    все хвосты слов названия и slug, чтобы «14 pro» находило «iPhone 14 Pro».
+
+    Индекс живёт в памяти процесса: каждый воркер строит свой при старте.
+    Изменения товаров через ProductDAO применяются методом apply, который,
+    если задан redis, рассылает их остальным воркерам через pub/sub (см. listen).
+    """
+
+    def __init__(self, channel: str = "product-index") -> None:
+        self._keys: list[tuple[str, str]] = []
+        self._slug_keys: dict[str, set[str]] = {}
+        self._names: dict[str, str] = {}
+        self.channel = channel
+        self.redis = None
+        self.node_id = uuid.uuid4().hex
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return slugify(text)
+
+    @classmethod
+    def _keys_for(cls, name: str, slug: str) -> set[str]:
+        keys = set()
+        for source in (cls.normalize(name), slug):
+            words = [word for word in source.split("-") if word]
+            for start in range(len(words)):
+                keys.add("-".join(words[start:]))
+        return keys
+
+    def add(self, slug: str, name: str) -> None:
+        """
+        Добавляет товар в индекс или заменяет его ключи, если он уже есть.
+        """
+        self.remove(slug)
+        keys = self._keys_for(name, slug)
+        for key in keys:
+            insort(self._keys, (key, slug))
+        self._slug_keys[slug] = keys
+        self._names[slug] = name
+
+    def remove(self, slug: str) -> None:
+        for key in self._slug_keys.pop(slug, ()):
+            position = bisect_left(self._keys, (key, slug))
+            if position < len(self._keys) and self._keys[position] == (key, slug):
+                del self._keys[position]
+        self._names.pop(slug, None)
+
+    def build(self, products: Iterable[tuple[str, str]]) -> None:
+        """
+        Полностью перестраивает индекс по парам (slug, name).
+        """
+        keys: list[tuple[str, str]] = []
+        slug_keys: dict[str, set[str]] = {}
+        names: dict[str, str] = {}
+        for slug, name in products:
+            slug_keys[slug] = self._keys_for(name, slug)
+            names[slug] = name
+            keys.extend((key, slug) for key in slug_keys[slug])
+        keys.sort()
+
+        self._keys, self._slug_keys, self._names = keys, slug_keys, names
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Строит индекс по всем активным товарам из БД.
+        """
+        stmt = select(Product.slug, Product.name).where(Product.is_active.is_(True))
+        result = await db.execute(stmt)
+        self.build(result.tuples())
+
+    def _apply_local(self, added: Iterable[tuple[str, str]], removed: Iterable[str]) -> None:
+        for slug in removed:
+            self.remove(slug)
+        for slug, name in added:
+            self.add(slug, name)
+
+    async def apply(self, added: Iterable[tuple[str, str]] = (), removed: Iterable[str] = ()) -> None:
+        """
+        Применяет изменения к индексу и рассылает их другим воркерам.
+
+        :param added: пары (slug, name) добавленных или изменённых товаров.
+        :param removed: slug удалённых, скрытых или переименованных товаров.
+        """
+        added, removed = list(added), list(removed)
+        self._apply_local(added, removed)
+        if self.redis is None or not (added or removed):
+            return
+        message = json.dumps({"node": self.node_id, "added": added, "removed": removed})
+        try:
+            await self.redis.publish(self.channel, message)
+        except Exception:
+            logger.warning("Error publishing product index update", exc_info=True)
+
+    async def sync_product(self, product: Product, old_slug: Optional[str] = None) -> None:
+        """
+        Приводит индекс в соответствие с сохранённым товаром.
+
+        :param old_slug: slug товара до изменения, если он мог смениться.
+        """
+        removed = [old_slug] if old_slug is not None and old_slug != product.slug else []
+        if product.is_active:
+            await self.apply(added=[(product.slug, product.name)], removed=removed)
+        else:
+            await self.apply(removed=[*removed, product.slug])
+
+    async def listen(self, session_factory) -> None:
+        """
+        Слушает канал изменений индекса и применяет изменения других воркеров.
+        Запускается фоновой задачей в lifespan.
+
+        :param session_factory: фабрика сессий для перестроения индекса по БД.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Пока не было подписки, изменения могли быть пропущены
+                async with session_factory() as db:
+                    await self.load(db)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = json.loads(message["data"])
+                    if data.get("node") != self.node_id:
+                        self._apply_local(
+                            [tuple(pair) for pair in data.get("added") or ()], data.get("removed") or ()
+                        )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Product index listener failed, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+    def search(self, prefix: str, limit: int = 10) -> list[tuple[str, str]]:
+        """
+        Возвращает до limit пар (slug, name), ключи которых начинаются с prefix.
+        """
+        normalized = self.normalize(prefix)
+        if not normalized:
+            return []
+
+        found: list[tuple[str, str]] = []
+        seen: set[str] = set()
+        position = bisect_left(self._keys, (normalized, ""))
+        while position < len(self._keys) and len(found) < limit:
+            key, slug = self._keys[position]
+            if not key.startswith(normalized):
+                break
+            if slug not in seen:
+                seen.add(slug)
+                found.append((slug, self._names[slug]))
+            position += 1
+
+        return found
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+
+product_index = ProductPrefixIndex()
@@ -1,34 +1,126 @@
+import hashlib
+import time
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
+from typing import Any, Optional
 
 import bcrypt
 import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.types import PrivateKeyTypes, PublicKeyTypes
 
-from src.config import auth_jwt
+from src.config import auth_jwt, AuthJWT
+
+
+class JWTKeyManager:
+    """
+    Ключи JWT, разобранные один раз в объекты cryptography.
+
+    PyJWT, получив PEM-строку, разбирает ключ при каждом вызове; объекты
+    ключей используются как есть. Токены подписываются текущим ключом и
+    получают его kid в заголовке, проверяются ключом по kid (токены без kid —
+    текущим ключом). rotate меняет ключ подписи, прежний открытый ключ
+    остаётся в списке проверки до remove_verification_key.
+
+    Успешные проверки запоминаются по хешу токена до его exp, не более
+    cache_size записей.
+    """
+
+    def __init__(self, algorithm: str, cache_size: int = 10_000):
+        self.algorithm = algorithm
+        self.cache_size = cache_size
+        self.key_id: Optional[str] = None
+        self._private_key: Optional[PrivateKeyTypes] = None
+        self._public_keys: dict[str, PublicKeyTypes] = {}
+        # hash токена -> (exp, payload)
+        self._verified: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config: AuthJWT) -> "JWTKeyManager":
+        manager = cls(algorithm=config.algorithm, cache_size=config.verified_cache_size)
+        for kid, path in config.previous_public_key_paths.items():
+            manager.add_verification_key(kid, path.read_bytes())
+        manager.rotate(
+            config.key_id,
+            config.private_key_path.read_bytes(),
+            config.public_key_path.read_bytes(),
+        )
+        return manager
+
+    def add_verification_key(self, kid: str, public_pem: bytes) -> None:
+        self._public_keys[kid] = serialization.load_pem_public_key(public_pem)
+
+    def remove_verification_key(self, kid: str) -> None:
+        """
+        Перестаёт принимать токены, подписанные ключом kid.
+        """
+        if kid == self.key_id:
+            raise ValueError("Нельзя удалить ключ, которым подписываются токены")
+        self._public_keys.pop(kid, None)
+        self._verified.clear()
+
+    def rotate(self, kid: str, private_pem: bytes, public_pem: bytes) -> None:
+        """
+        Делает пару ключей kid текущей для подписи.
+        """
+        private_key = serialization.load_pem_private_key(private_pem, password=None)
+        self.add_verification_key(kid, public_pem)
+        self._private_key = private_key
+        self.key_id = kid
+
+    def encode(self, payload: dict) -> str:
+        return jwt.encode(
+            payload, key=self._private_key, algorithm=self.algorithm, headers={"kid": self.key_id}
+        )
+
+    def decode(self, token: str | bytes) -> dict[str, Any]:
+        token_hash = hashlib.sha256(token if isinstance(token, bytes) else token.encode()).hexdigest()
+        cached = self._verified.get(token_hash)
+        if cached is not None:
+            if cached[0] > time.time():
+                self._verified.move_to_end(token_hash)
+                return dict(cached[1])
+            del self._verified[token_hash]
+
+        if len(self._public_keys) == 1:
+            # Ключ один — заголовок не разбирается отдельно, jwt.decode
+            # всё равно разбирает токен целиком
+            public_key = self._public_keys[self.key_id]
+        else:
+            kid = jwt.get_unverified_header(token).get("kid", self.key_id)
+            public_key = self._public_keys.get(kid)
+            if public_key is None:
+                raise jwt.InvalidKeyError(f"Unknown key id: {kid}")
+        payload = jwt.decode(token, key=public_key, algorithms=[self.algorithm])
+
+        # Без exp токен бессрочный, такие не запоминаются
+        if "exp" in payload:
+            self._verified[token_hash] = (float(payload["exp"]), payload)
+            while len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return dict(payload)
+
+
+key_manager = JWTKeyManager.from_config(auth_jwt)
 
 
 def encode_jwt(
     payload: dict,
-    private_key: str = auth_jwt.private_key_path.read_text(),
-    algorithm: str = auth_jwt.algorithm,
     expire_minutes: int = auth_jwt.access_token_expire_minutes,
 ) -> str:
     to_encode = payload.copy()
     to_encode["exp"] = datetime.now(timezone.utc) + timedelta(minutes=expire_minutes)
-    encoded = jwt.encode(to_encode, key=private_key, algorithm=algorithm)
+    encoded = key_manager.encode(to_encode)
     return encoded
 
 
-def decode_jwt(
-    token: str | bytes,
-    public_key: str = auth_jwt.public_key_path.read_text(),
-    algorithm: str = auth_jwt.algorithm,
-):
-    decoded = jwt.decode(token, key=public_key, algorithms=[algorithm])
+def decode_jwt(token: str | bytes):
+    decoded = key_manager.decode(token)
     return decoded
 
 
-def hash_password(password: str) -> str:
-    hashed_password = bcrypt.hashpw(password.encode(), salt=bcrypt.gensalt())
+def hash_password(password: str, rounds: int = 12) -> str:
+    hashed_password = bcrypt.hashpw(password.encode(), salt=bcrypt.gensalt(rounds=rounds))
     return hashed_password.decode()
 
 
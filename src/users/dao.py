@@ -3,9 +3,11 @@ from pydantic import EmailStr
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.dao.context import get_request_context
 from src.users.models import User
-from src.users.schemas import UserRegisterSchema
-from src.users.auth import hash_password, validate_password
+from src.users.principal import principal_cache
+from src.users.schemas import UserRegisterSchema, UserPrincipalSchema
+from src.users.hashing import password_hasher
 
 
 class UserDao:
@@ -28,9 +30,15 @@ class UserDao:
         db: AsyncSession,
         user_id: int,
     ) -> User | None:
+        context = get_request_context(db)
+        if context is not None and user_id in context.users:
+            return context.users[user_id]
+
         stmt = select(User).where(User.id == user_id)
         result = await db.execute(stmt)
         user = result.scalar_one_or_none()
+        if context is not None and user is not None:
+            context.users[user_id] = user
         return user
 
     @classmethod
@@ -47,7 +55,7 @@ class UserDao:
                 detail=f"User with email: {user_data.email} already exists",
             )
 
-        hashed_password = hash_password(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
 
         user = User(
             **user_data.model_dump(exclude={"password"}),
@@ -69,19 +77,28 @@ class UserDao:
     ) -> User:
         user = await cls.get_user_by_email(db=db, user_email=email)
 
-        if not user or not validate_password(password, user.hashed_password):
+        if not user or not await password_hasher.verify(password, user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Wrong email or password",
             )
 
+        # Хеш со старой стоимостью пересчитывается, пока известен пароль
+        if password_hasher.needs_rehash(user.hashed_password):
+            try:
+                user.hashed_password = await password_hasher.hash(password)
+                await db.commit()
+            except HTTPException:
+                # Пул занят: пересчёт подождёт следующего входа
+                pass
+
         return user
 
     @classmethod
     async def set_admin(
         cls,
         db: AsyncSession,
-        user: User,
+        user: UserPrincipalSchema,
         user_id: int,
     ) -> User:
         user_to_update = await cls.get_user_by_id(db=db, user_id=user_id)
@@ -102,5 +119,6 @@ class UserDao:
 
         await db.commit()
         await db.refresh(user_to_update)
+        await principal_cache.invalidate_user(user_to_update.id)
 
         return user_to_update
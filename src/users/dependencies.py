@@ -5,10 +5,12 @@ from fastapi import HTTPException, status, Depends, Request
 from jwt import PyJWTError
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import settings
 from src.database import get_db
 from src.users.auth import decode_jwt
 from src.users.dao import UserDao
-from src.users.models import User
+from src.users.principal import principal_cache
+from src.users.schemas import UserPrincipalSchema
 
 
 def get_access_token(request: Request) -> str:
@@ -23,7 +25,16 @@ def get_access_token(request: Request) -> str:
 async def get_user_using_token(
     db: Annotated[AsyncSession, Depends(get_db)],
     token: Annotated[str, Depends(get_access_token)],
-):
+) -> UserPrincipalSchema:
+    """
+    Пользователь по токену доступа в виде снимка UserPrincipalSchema.
+    Повторные запросы с тем же токеном берут снимок из principal_cache
+    без проверки подписи и обращения к БД.
+    """
+    principal = await principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = decode_jwt(token)
     except PyJWTError:
@@ -44,17 +55,24 @@ async def get_user_using_token(
             detail="User ID not found in Access token",
         )
 
-    user = await UserDao.get_user_by_id(db, int(user_id))
-
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+    if settings.JWT_EMBED_IS_ADMIN and "is_admin" in payload:
+        principal = UserPrincipalSchema(
+            id=int(user_id), email=payload.get("email"), is_admin=bool(payload["is_admin"])
         )
+    else:
+        user = await UserDao.get_user_by_id(db, int(user_id))
 
-    return user
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
+            )
+        principal = UserPrincipalSchema.model_validate(user)
+
+    await principal_cache.set(token, payload, principal)
+    return principal
 
 
-def check_user_is_admin(user: User = Depends(get_user_using_token)) -> User:
+def check_user_is_admin(user: UserPrincipalSchema = Depends(get_user_using_token)) -> UserPrincipalSchema:
     if not user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
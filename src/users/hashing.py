@@ -0,0 +1,84 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from src.config import settings
+from src.users.auth import hash_password, validate_password
+
+
+class PasswordHasher:
+    """
+    bcrypt вне цикла событий: хеширование и проверка паролей выполняются
+    в пуле из workers потоков (bcrypt отпускает GIL на время вычисления).
+
+    Одновременно принимается не больше max_pending операций, включая
+    выполняемые; сверх этого запрос сразу получает 503, а не ждёт в очереди,
+    пока остальные запросы воркера продолжают обслуживаться.
+    """
+
+    def __init__(self, rounds: int, workers: int, max_pending: int):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def _run(self, func, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Сервер перегружен, повторите попытку позже",
+                headers={"Retry-After": "1"},
+            )
+        loop = asyncio.get_running_loop()
+        future = self._executor.submit(func, *args)
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        # Счётчик уменьшается, когда поток действительно освободился, а не когда
+        # ожидающий запрос отменён: отменённый bcrypt всё равно досчитывается
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._finish))
+        return await asyncio.wrap_future(future, loop=loop)
+
+    def _finish(self) -> None:
+        self.pending -= 1
+        self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._run(validate_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """
+        Хеш посчитан с другой стоимостью, чем BCRYPT_ROUNDS ("$2b$<rounds>$...").
+        """
+        try:
+            return int(hashed_password.split("$")[2]) != self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    def snapshot(self) -> dict[str, int]:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "running": min(self.pending, self.workers),
+            "queued": max(self.pending - self.workers, 0),
+            "max_pending_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+from src.users.schemas import UserPrincipalSchema
+
+logger = logging.getLogger(__name__)
+
+
+class PrincipalCache:
+    """
+    Кэш аутентифицированных пользователей по хешу токена доступа.
+
+    Хранит проверенные claims токена и снимок пользователя
+    (UserPrincipalSchema), чтобы get_user_using_token не проверял подпись
+    и не ходил в БД на каждый запрос. Запись живёт не дольше ttl и не дольше
+    срока действия токена. Локальный LRU ограничен max_entries; если задан
+    redis, записи дополнительно хранятся в Redis и общие для воркеров.
+
+    invalidate_user удаляет записи пользователя у себя, в Redis и рассылает
+    удаление другим воркерам через pub/sub (см. listen).
+    """
+
+    def __init__(self, ttl: int = 60, max_entries: int = 10_000, prefix: str = "principal"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self.enabled = True
+        self.redis = None
+        # hash токена -> (истекает в, claims, снимок пользователя)
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any], UserPrincipalSchema]] = OrderedDict()
+        self._by_user: dict[int, set[str]] = {}
+
+    @staticmethod
+    def token_hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    @property
+    def channel(self) -> str:
+        return f"{self.prefix}:invalidate"
+
+    def _redis_key(self, token_hash: str) -> str:
+        return f"{self.prefix}:{token_hash}"
+
+    def _user_key(self, user_id: int) -> str:
+        return f"{self.prefix}:user:{user_id}"
+
+    def _store_local(
+        self, token_hash: str, expires_at: float, claims: dict[str, Any], principal: UserPrincipalSchema
+    ) -> None:
+        self._entries[token_hash] = (expires_at, claims, principal)
+        self._entries.move_to_end(token_hash)
+        self._by_user.setdefault(principal.id, set()).add(token_hash)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, token_hash: str) -> None:
+        entry = self._entries.pop(token_hash, None)
+        if entry is None:
+            return
+        hashes = self._by_user.get(entry[2].id)
+        if hashes is not None:
+            hashes.discard(token_hash)
+            if not hashes:
+                del self._by_user[entry[2].id]
+
+    def _evict_user(self, user_id: int) -> None:
+        for token_hash in list(self._by_user.get(user_id, ())):
+            self._drop(token_hash)
+
+    async def get(self, token: str) -> Optional[UserPrincipalSchema]:
+        if not self.enabled:
+            return None
+        token_hash = self.token_hash(token)
+        now = time.time()
+
+        entry = self._entries.get(token_hash)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(token_hash)
+                return entry[2]
+            self._drop(token_hash)
+
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self._redis_key(token_hash))
+        except Exception:
+            logger.warning("Error reading principal cache", exc_info=True)
+            return None
+        if raw is None:
+            return None
+
+        data = json.loads(raw)
+        expires_at = min(now + self.ttl, data["claims"].get("exp", now + self.ttl))
+        if expires_at <= now:
+            return None
+        principal = UserPrincipalSchema.model_validate(data["user"])
+        self._store_local(token_hash, expires_at, data["claims"], principal)
+        return principal
+
+    async def set(self, token: str, claims: dict[str, Any], principal: UserPrincipalSchema) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        expires_at = min(now + self.ttl, claims.get("exp", now + self.ttl))
+        if expires_at <= now:
+            return
+        token_hash = self.token_hash(token)
+        self._store_local(token_hash, expires_at, claims, principal)
+
+        if self.redis is None:
+            return
+        value = json.dumps({"claims": claims, "user": principal.model_dump(mode="json")})
+        expire = max(int(expires_at - now), 1)
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(self._redis_key(token_hash), value, ex=expire)
+                pipe.sadd(self._user_key(principal.id), token_hash)
+                pipe.expire(self._user_key(principal.id), self.ttl)
+                await pipe.execute()
+        except Exception:
+            logger.warning("Error writing principal cache", exc_info=True)
+
+    async def invalidate_user(self, user_id: int) -> None:
+        """
+        Удаляет записи пользователя после изменения его прав.
+        """
+        self._evict_user(user_id)
+        if self.redis is None:
+            return
+        try:
+            hashes = await self.redis.smembers(self._user_key(user_id))
+            keys = [self._redis_key(h.decode() if isinstance(h, bytes) else h) for h in hashes]
+            await self.redis.delete(*keys, self._user_key(user_id))
+            await self.redis.publish(self.channel, json.dumps({"user_id": user_id}))
+        except Exception:
+            logger.warning("Error invalidating principal cache", exc_info=True)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._by_user.clear()
+
+    async def listen(self) -> None:
+        """
+        Слушает канал инвалидации и удаляет локальные записи пользователей,
+        права которых изменили другие воркеры. Запускается фоновой задачей в lifespan.
+        """
+        while True:
+            pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                # Пока не было подписки, сообщения могли быть пропущены
+                self.clear()
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    self._evict_user(int(json.loads(message["data"])["user_id"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Principal invalidation listener failed, reconnecting", exc_info=True)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.reset()
+
+
+principal_cache = PrincipalCache()
@@ -1,16 +1,17 @@
 from typing import Annotated
 
-from fastapi import APIRouter, status, Depends, Response, Form, Path, Header
+from fastapi import APIRouter, status, Depends, Response, Form, Path, Header, HTTPException
 from fastapi.responses import RedirectResponse
 from pydantic import EmailStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.config import settings
 from src.database import get_db
 from src.users.auth import encode_jwt
 from src.users.dao import UserDao
 from src.users.dependencies import get_user_using_token, check_user_is_admin
-from src.users.models import User
-from src.users.schemas import UserRegisterSchema, UserOutSchema
+from src.users.hashing import password_hasher
+from src.users.schemas import UserRegisterSchema, UserOutSchema, UserPrincipalSchema
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
@@ -37,6 +38,8 @@ async def login_user(
     user = await UserDao.validate_user(db=db, email=email, password=password)
 
     payload = {"sub": str(user.id), "email": user.email}
+    if settings.JWT_EMBED_IS_ADMIN:
+        payload["is_admin"] = user.is_admin
 
     token = encode_jwt(payload)
     response.set_cookie(
@@ -48,7 +51,7 @@ async def login_user(
 
 @router.post("/logout", status_code=status.HTTP_303_SEE_OTHER)
 async def logout_user(
-        user: Annotated[User, Depends(get_user_using_token)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
         response: Response
 ) -> Response:
     response = RedirectResponse(url="/pages/", status_code=303)
@@ -58,15 +61,21 @@ async def logout_user(
 
 @router.get("/me", status_code=status.HTTP_200_OK)
 async def get_user_info(
-        user: Annotated[User, Depends(get_user_using_token)],
+        db: Annotated[AsyncSession, Depends(get_db)],
+        user: Annotated[UserPrincipalSchema, Depends(get_user_using_token)],
 ) -> UserOutSchema:
+    # В снимке из claims токена нет полей профиля
+    if user.first_name is None:
+        user = await UserDao.get_user_by_id(db, user.id)
+        if user is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     return UserOutSchema.model_validate(user)
 
 
 @router.post("/set-admin/{user_id}", status_code=status.HTTP_200_OK)
 async def set_admin(
         db: Annotated[AsyncSession, Depends(get_db)],
-        user: Annotated[User, Depends(check_user_is_admin)],
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
         user_id: int = Path(gt=0),
 ) -> dict:
     user_to_update = await UserDao.set_admin(db=db, user=user, user_id=user_id)
@@ -75,3 +84,10 @@ async def set_admin(
         "message": f"User {user_to_update.email} is now {'an admin' if user_to_update.is_admin else 'not an admin'}",
         "user": UserOutSchema.model_validate(user_to_update),
     }
+
+
+@router.get("/hashing-stats", status_code=status.HTTP_200_OK)
+async def get_hashing_stats(
+        user: Annotated[UserPrincipalSchema, Depends(check_user_is_admin)],
+) -> dict:
+    return password_hasher.snapshot()
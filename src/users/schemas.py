@@ -1,4 +1,5 @@
 import re
+from typing import Optional
 
 from pydantic import BaseModel, Field, EmailStr, field_validator, ConfigDict
 
@@ -77,3 +78,18 @@ class UserOutSchema(BaseModel):
     )
 
     model_config = ConfigDict(from_attributes=True)
+
+
+class UserPrincipalSchema(BaseModel):
+    """
+    Снимок аутентифицированного пользователя, который отдаёт get_user_using_token.
+    Если права взяты из claim is_admin токена, полей профиля в нём нет.
+    """
+    id: int = Field(..., gt=0, description="User ID")
+    email: Optional[str] = Field(default=None, description="Электронная почта")
+    phone_number: Optional[str] = Field(default=None, description="Номер телефона")
+    first_name: Optional[str] = Field(default=None, description="Имя")
+    last_name: Optional[str] = Field(default=None, description="Фамилия")
+    is_admin: bool = Field(default=False, description="Администратор")
+
+    model_config = ConfigDict(from_attributes=True)
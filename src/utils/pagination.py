@@ -0,0 +1,124 @@
+import base64
+import json
+from typing import Any, Optional, Sequence
+
+from fastapi import HTTPException, Query, status
+from sqlalchemy import Select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Пределы bigint: большее число в курсоре Postgres не примет
+MIN_CURSOR_INT = -2 ** 63
+MAX_CURSOR_INT = 2 ** 63 - 1
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Кодирует значения ключа последней строки страницы в непрозрачный курсор.
+    """
+    raw = json.dumps(list(values), separators=(",", ":"), ensure_ascii=False)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _python_type(column: Any) -> Optional[type]:
+    try:
+        return column.type.python_type
+    except (AttributeError, NotImplementedError):
+        return None
+
+
+def _valid_cursor_value(value: Any, expected: Optional[type]) -> bool:
+    """
+    Подходит ли значение из курсора к типу колонки сортировки. Для колонок
+    без известного типа допускаются строки и числа.
+    """
+    if isinstance(value, bool):
+        return expected is bool
+    if isinstance(value, int):
+        return expected in (int, float, None) and MIN_CURSOR_INT <= value <= MAX_CURSOR_INT
+    if isinstance(value, float):
+        return expected in (float, None)
+    if isinstance(value, str):
+        # NUL в тексте Postgres не принимает
+        return expected in (str, None) and "\x00" not in value
+    return False
+
+
+def decode_cursor(cursor: str, key_columns: Sequence[Any]) -> list[Any]:
+    """
+    Декодирует курсор, выданный encode_cursor, и проверяет, что значения
+    подходят к колонкам сортировки key_columns.
+
+    :raises HTTPException: 400, если курсор повреждён или не подходит к сортировке.
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, UnicodeDecodeError):
+        values = None
+
+    if (
+        not isinstance(values, list)
+        or len(values) != len(key_columns)
+        or not all(
+            _valid_cursor_value(value, _python_type(column))
+            for value, column in zip(values, key_columns)
+        )
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor"
+        )
+    return values
+
+
+class PaginationParams:
+    def __init__(
+        self,
+        cursor: Optional[str] = Query(
+            None, description="Курсор следующей страницы из поля next_cursor"
+        ),
+        limit: int = Query(
+            DEFAULT_PAGE_SIZE,
+            ge=1,
+            le=MAX_PAGE_SIZE,
+            description="Количество записей на странице",
+        ),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+async def paginate_by_keyset(
+    db: AsyncSession,
+    stmt: Select,
+    key_columns: Sequence[Any],
+    pagination: PaginationParams,
+    descending: bool = False,
+) -> tuple[list[Any], str | None]:
+    """
+    Возвращает одну страницу запроса stmt и курсор следующей страницы.
+
+    Страница выбирается условием по ключу сортировки, а не OFFSET,
+    поэтому её стоимость не зависит от глубины листания. Последняя колонка
+    key_columns должна быть уникальной (обычно id), чтобы порядок был строгим.
+    """
+    key = tuple_(*key_columns)
+
+    if pagination.cursor:
+        values = decode_cursor(pagination.cursor, key_columns)
+        stmt = stmt.where(key < tuple_(*values) if descending else key > tuple_(*values))
+
+    order_by = [column.desc() if descending else column for column in key_columns]
+    stmt = stmt.order_by(None).order_by(*order_by).limit(pagination.limit + 1)
+
+    result = await db.execute(stmt.add_columns(*key_columns))
+    rows = result.all()
+
+    next_cursor = None
+    if len(rows) > pagination.limit:
+        rows = rows[: pagination.limit]
+        next_cursor = encode_cursor(rows[-1][1:])
+
+    return [row[0] for row in rows], next_cursor
@@ -0,0 +1,30 @@
+from functools import lru_cache
+from typing import Any
+
+from fastapi import Response, status
+from pydantic import TypeAdapter
+
+
+@lru_cache(maxsize=None)
+def get_type_adapter(type_: Any) -> TypeAdapter:
+    """
+    TypeAdapter строится один раз на тип: сборка валидатора и сериализатора дорогая.
+    """
+    return TypeAdapter(type_)
+
+
+def json_response(type_: Any, value: Any, status_code: int = status.HTTP_200_OK) -> Response:
+    """
+    Валидирует значение (в том числе ORM-объекты) схемой type_ за один проход
+    и сразу кодирует его в JSON.
+
+    Ответ-Response FastAPI не валидирует и не сериализует повторно, поэтому
+    схема ответа для OpenAPI задаётся в маршруте через response_model.
+
+    :param type_: Схема ответа, например list[CategoryOutSchema].
+    :param value: Значение или ORM-объекты, подходящие под схему.
+    :param status_code: Код ответа.
+    """
+    adapter = get_type_adapter(type_)
+    body = adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+    return Response(content=body, media_type="application/json", status_code=status_code)